@@ -0,0 +1,210 @@
+"""
+Headless verwerking van veel klantbestanden tegelijk, zonder Streamlit.
+
+Gebruik:
+    python cli.py --schema codeschema.xlsx klanten/ "seizoen2025/*.xlsx"
+    python cli.py --schema codeschema.xlsx klanten/ --workers 8 --concurrency 4 --output-mode patch
+    python cli.py --schema codeschema.xlsx groot.xlsx --execution batch   # batch-endpoint, tot 24 uur
+    python cli.py --schema codeschema.xlsx klanten/ --cascade openai:gpt-4o-mini:0.8,openai:gpt-4o
+
+Elk klantbestand wordt in een eigen proces verwerkt (`--workers`, standaard het aantal cores),
+zodat inlezen, prompts bouwen en wegschrijven alle cores benutten; binnen een proces lopen de
+LLM-calls gelijktijdig (`--concurrency`). Het codeschema wordt één keer ingelezen en via de
+schema-cache gedeeld; de antwoord-cache en checkpoint-journalen (SQLite/JSONL in `CACHE_DIR`)
+zijn gedeeld tussen de processen. De uitvoer komt naast de invoer: `<naam>_coderingsvoorstel.xlsx`.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import BATCH_POLL_SECONDS, DEFAULT_CONCURRENCY, DEFAULT_HEADER_ROWS, DEFAULT_MODEL, USE_MAPPINGS
+from llm_providers.registry import available_providers
+from loaders.schema_cache import load_codeschema_cached
+from logic.cascade import parse_cascade
+from utils.files import OUTPUT_SUFFIX, atomic_write_bytes, output_path
+
+_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def find_workbooks(inputs: List[str], suffix: str = OUTPUT_SUFFIX, exclude: Sequence[str] = ()) -> List[str]:
+    """
+    Klantbestanden uit mappen (niet recursief), glob-patronen en losse paden; zonder eerdere
+    uitvoer en zonder de paden in `exclude` (het codeschema).
+    """
+    skip = {os.path.abspath(path) for path in exclude}
+    found: Dict[str, None] = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, name) for name in os.listdir(item))
+        else:
+            paths = sorted(glob.glob(item)) or [item]
+        for path in paths:
+            base = os.path.basename(path)
+            stem, ext = os.path.splitext(base)
+            if ext.lower() not in _EXTENSIONS or base.startswith("~$") or stem.endswith(suffix):
+                continue  # geen Excel, Office-lockbestand of eerdere uitvoer
+            if os.path.abspath(path) not in skip:
+                found.setdefault(os.path.abspath(path), None)
+    return list(found)
+
+
+def _init_worker(schema_path: str) -> None:
+    # Schema eenmalig per proces (uit het JSON-artefact dat het hoofdproces al schreef)
+    load_codeschema_cached(schema_path)
+
+
+def _process_one(path: str, schema_path: str, options: Dict[str, Any], suffix: str) -> Dict[str, Any]:
+    # Import in de worker: het hoofdproces heeft de provider- en writer-modules niet nodig
+    from utils.run_report import RunReport
+    from writers.excel_writer import process_workbook
+
+    report = RunReport()
+    started = time.perf_counter()
+    summary: Dict[str, Any] = {"file": path, "output": None, "error": None}
+    try:
+        out = process_workbook(customer_file=path, schema_file=schema_path, report=report, **options)
+        target = output_path(path, options["output_mode"], suffix)
+        atomic_write_bytes(target, out.getvalue())
+        summary["output"] = target
+    except Exception as exc:
+        summary["error"] = f"{type(exc).__name__}: {exc}"
+    summary["seconds"] = time.perf_counter() - started
+    summary.update(report.as_dict())
+    return summary
+
+
+def _parse_header_rows(values: List[str]) -> Dict[str, int]:
+    header_rows = dict(DEFAULT_HEADER_ROWS)
+    for value in values:
+        name, sep, row = value.rpartition("=")
+        if not sep or not row.isdigit():
+            raise argparse.ArgumentTypeError(f"Verwacht 'tabblad=rij', kreeg '{value}'")
+        header_rows[name.strip().lower()] = int(row)
+    return header_rows
+
+
+def format_summary(results: List[Dict[str, Any]]) -> str:
+    """Samenvattingstabel (één regel per bestand plus totaal)."""
+    columns = [("Bestand", "file"), ("Rijen", "rows"), ("Calls", "llm_calls"), ("Cache", "cache_hits"),
+               ("Tokens", "total_tokens"), ("Fallb.", "fallbacks"), ("Tijd (s)", "seconds"), ("Status", "error")]
+    lines: List[List[str]] = []
+    for r in results:
+        lines.append([
+            os.path.basename(r["file"]), str(r.get("rows", 0)), str(r.get("llm_calls", 0)),
+            str(r.get("cache_hits", 0)), str(r.get("total_tokens", 0)), str(r.get("fallbacks", 0)),
+            f"{r.get('seconds', 0.0):.1f}", "FOUT: " + r["error"] if r["error"] else "ok",
+        ])
+    failures = sum(1 for r in results if r["error"])
+    lines.append([
+        f"Totaal ({len(results)})", *(str(sum(r.get(key, 0) for r in results)) for _, key in columns[1:6]),
+        f"{sum(r.get('seconds', 0.0) for r in results):.1f}", f"{failures} mislukt" if failures else "ok",
+    ])
+    widths = [max(len(title), *(len(line[i]) for line in lines)) for i, (title, _) in enumerate(columns)]
+
+    def fmt(cells: List[str]) -> str:
+        # Tekstkolommen links, getallen rechts uitgelijnd
+        return "  ".join(c.ljust(w) if i in (0, 7) else c.rjust(w) for i, (c, w) in enumerate(zip(cells, widths))).rstrip()
+
+    rule = "  ".join("-" * w for w in widths)
+    return "\n".join([fmt([t for t, _ in columns]), rule, *(fmt(line) for line in lines[:-1]), rule, fmt(lines[-1])])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vul de AI-codering in voor een reeks klantbestanden.")
+    parser.add_argument("inputs", nargs="+", help="Klantbestanden, mappen of glob-patronen")
+    parser.add_argument("--schema", required=True, help="Codeschema (Excel)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Aantal processen (standaard: aantal cores)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Gelijktijdige LLM-calls per bestand")
+    parser.add_argument("--provider", default="openai", choices=available_providers())
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--cascade", default="", metavar="PROVIDER:MODEL:DREMPEL,...",
+                        help="Model-cascade, bijv. 'openai:gpt-4o-mini:0.8,openai:gpt-4o' (vervangt --provider/--model)")
+    parser.add_argument("--temperature", type=float, default=0.1)
+    parser.add_argument("--language", choices=["nl", "en"], default="nl")
+    parser.add_argument("--top-k", type=int, default=0, help="Max. kandidaat-codes per rij (0 = volledig schema)")
+    parser.add_argument("--token-budget", type=int, default=0, help="Token-budget kandidaten per rij (0 = geen limiet)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Rijen per LLM-call")
+    parser.add_argument("--output-mode", choices=["openpyxl", "patch"], default="patch")
+    parser.add_argument("--execution", choices=["interactive", "batch"], default="interactive",
+                        help="'batch': alle prompts via het batch-endpoint van de provider (goedkoper, tot 24 uur)")
+    parser.add_argument("--batch-poll", type=float, default=BATCH_POLL_SECONDS, help="Seconden tussen statuscontroles (batch)")
+    parser.add_argument("--header-row", action="append", default=[], metavar="TABBLAD=RIJ",
+                        help="Header-rij per tabblad, bijv. 'oplegger kosten=4' (herhaalbaar)")
+    parser.add_argument("--suffix", default=OUTPUT_SUFFIX, help="Achtervoegsel van de uitvoerbestanden")
+    parser.add_argument("--dry-run", action="store_true", help="Offline heuristiek, geen LLM")
+    parser.add_argument("--local-model", action="store_true",
+                        help="Lokaal model trainen op bestaande coderingen en zekere rijen direct coderen")
+    parser.add_argument("--no-cache", action="store_true", help="Antwoord-cache niet gebruiken")
+    parser.add_argument("--no-dedup", action="store_true", help="Gelijke rijen niet ontdubbelen")
+    parser.add_argument("--no-resume", action="store_true", help="Checkpoint-journaal niet gebruiken")
+    parser.add_argument("--mappings", action=argparse.BooleanOptionalAction, default=USE_MAPPINGS,
+                        help="Goedgekeurde coderingen opnemen en hergebruiken (standaard: %(default)s)")
+    args = parser.parse_args(argv)
+
+    paths = find_workbooks(args.inputs, args.suffix, exclude=[args.schema])
+    if not paths:
+        print("Geen klantbestanden gevonden.", file=sys.stderr)
+        return 2
+    try:
+        header_rows = _parse_header_rows(args.header_row)
+        cascade = parse_cascade(args.cascade) or None
+    except (argparse.ArgumentTypeError, ValueError) as exc:
+        parser.error(str(exc))
+    unknown = sorted({tier.provider for tier in cascade or []} - set(available_providers()))
+    if unknown:
+        parser.error(f"Onbekende provider in --cascade: {', '.join(unknown)}")
+
+    # Schema één keer inlezen; de workers laden daarna het gecachete artefact
+    schema_path = os.path.abspath(args.schema)
+    load_codeschema_cached(schema_path)
+
+    options: Dict[str, Any] = dict(
+        header_rows=header_rows,
+        provider_name=args.provider,
+        model=args.model,
+        temperature=args.temperature,
+        top_k_codes=args.top_k,
+        candidate_token_budget=args.token_budget,
+        dry_run=args.dry_run,
+        language=args.language,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        deduplicate=not args.no_dedup,
+        batch_size=args.batch_size,
+        output_mode=args.output_mode,
+        execution_mode=args.execution,
+        cascade=cascade,
+        local_model=args.local_model,
+        use_mappings=args.mappings,
+        batch_poll_seconds=args.batch_poll,
+        resume=not args.no_resume,
+    )
+
+    workers = max(1, min(args.workers, len(paths)))
+    print(f"{len(paths)} bestand(en), {workers} proces(sen), {args.concurrency} LLM-calls per bestand", file=sys.stderr)
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema_path,)) as pool:
+        futures = {pool.submit(_process_one, path, schema_path, options, args.suffix): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as exc:  # bijv. een gecrasht worker-proces
+                result = {"file": futures[future], "output": None, "error": f"{type(exc).__name__}: {exc}", "seconds": 0.0}
+            results.append(result)
+            status = "FOUT" if result["error"] else "ok"
+            print(f"[{len(results)}/{len(paths)}] {os.path.basename(result['file'])}: {status} "
+                  f"({result.get('seconds', 0.0):.1f}s)", file=sys.stderr)
+
+    results.sort(key=lambda r: paths.index(r["file"]))
+    print(format_summary(results))
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,31 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 # Standaard model (kan in UI worden aangepast)
 DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
+# Maximaal aantal gelijktijdige LLM-calls (wordt automatisch verlaagd bij rate-limits)
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+
+# Lokale cache-map (o.a. voor de LLM-antwoordcache)
+CACHE_DIR = os.getenv("TOEDELING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "200000"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "90"))
+
+# Achtergrond-jobs: max. aantal runs tegelijk per server (overige jobs wachten in de rij)
+# en hoe lang afgeronde jobs (met resultaat) bewaard blijven
+MAX_PARALLEL_JOBS = int(os.getenv("TOEDELING_MAX_JOBS", "2"))
+JOB_RETENTION_HOURS = float(os.getenv("TOEDELING_JOB_RETENTION_HOURS", "6"))
+# Resultaten groter dan dit (MB) worden naar `CACHE_DIR/results` geschreven in plaats van in het geheugen bewaard
+RESULT_SPILL_MB = float(os.getenv("TOEDELING_RESULT_SPILL_MB", "25"))
+
+# Batch-modus (provider-batch-endpoint): seconden tussen statuscontroles
+BATCH_POLL_SECONDS = float(os.getenv("TOEDELING_BATCH_POLL_SECONDS", "30"))
+# Max. grootte van één batch-verzoekbestand (MB); OpenAI accepteert tot 200 MB, dit houdt marge
+BATCH_MAX_FILE_MB = float(os.getenv("TOEDELING_BATCH_MAX_FILE_MB", "180"))
+
 # Mapping van sheetnaam -> type codes
 SHEET_CODEMAP = {
     "oplegger pil": "formatie",
@@ -31,6 +51,59 @@ TARGET_COLUMNS = {
     "opmerkingen": "Opmerkingen/aannames vanuit Berenschot",
 }
 
+# Kolommen die per categorie bepalen welke code een rij krijgt. Rijen met gelijke
+# (genormaliseerde) waarden in deze kolommen worden één keer geclassificeerd.
+DEDUP_KEY_COLUMNS = {
+    "formatie": ["Functienaam", "Afdeling / locatie", "Team", "Kostenplaatsomschrijving", "Overhead of primair proces?"],
+    "kosten": ["Grootboekrekening", "Omschrijving kosten"],
+    "opbrengsten": ["Grootboekrekening", "Omschrijving opbrengsten"],
+}
+
+# Gedeelde mapping-store van goedgekeurde coderingen (over klantbestanden heen): per categorie de
+# kolom met de omschrijving / functienaam en de grootboekkolom (None = geen) die samen de sleutel
+# vormen, en de kolom waaruit goedgekeurde codes worden overgenomen
+MAPPING_KEY_COLUMNS = {
+    "formatie": ("Functienaam", None),
+    "kosten": ("Omschrijving kosten", "Grootboekrekening"),
+    "opbrengsten": ("Omschrijving opbrengsten", "Grootboekrekening"),
+}
+APPROVED_CODE_COLUMN = "Codering definitief"
+# Standaard voor het hergebruik van goedgekeurde coderingen, gelijk voor library, UI en CLI
+USE_MAPPINGS = os.getenv("TOEDELING_USE_MAPPINGS", "1") != "0"
+
+# Markeringen in de instructies van een code waardoor die altijd in de shortlist komt
+MANDATORY_INSTRUCTION_MARKERS = ("[verplicht]",)
+
+# Fractie van de rijen met een shortlist die toch met het volledige schema wordt
+# geclassificeerd, om te meten hoe vaak de gekozen code in de shortlist zat (recall).
+SHORTLIST_AUDIT_RATE = float(os.getenv("SHORTLIST_AUDIT_RATE", "0.05"))
+
+# Lokaal model: kolommen met bestaande coderingen die als trainingslabel dienen (in volgorde
+# van voorkeur) en de drempels voor het direct overnemen van een voorspelling
+LABEL_COLUMNS = ["Codering definitief", "Codering concept", "Codering eerdere deelname"]
+LOCAL_MODEL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MODEL_MIN_CONFIDENCE", "0.9"))  # gekalibreerde kans
+LOCAL_MODEL_MIN_EXAMPLES = int(os.getenv("LOCAL_MODEL_MIN_EXAMPLES", "50"))
+LOCAL_MODEL_MAX_EXAMPLES = int(os.getenv("LOCAL_MODEL_MAX_EXAMPLES", "50000"))
+# Fractie van de zekere voorspellingen die toch naar het LLM gaat (meting van de overeenstemming)
+LOCAL_MODEL_AUDIT_RATE = float(os.getenv("LOCAL_MODEL_AUDIT_RATE", "0.05"))
+
+# Indicatieve API-prijzen in USD per 1 miljoen tokens (invoer, uitvoer) voor de kostenraming
+# van de preview; het langste passende voorvoegsel van de modelnaam telt.
+MODEL_PRICING_USD_PER_1M = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "o4-mini": (1.10, 4.40),
+}
+# Aannames voor de raming: uitvoertokens per geclassificeerde rij en seconden per LLM-call
+# (als de steekproef geen eigen meting oplevert)
+COMPLETION_TOKENS_PER_ROW = int(os.getenv("ESTIMATE_COMPLETION_TOKENS_PER_ROW", "60"))
+ESTIMATED_SECONDS_PER_CALL = float(os.getenv("ESTIMATE_SECONDS_PER_CALL", "2.0"))
+# Korting van het batch-endpoint t.o.v. losse calls (OpenAI Batch API: 50%)
+BATCH_PRICE_FACTOR = float(os.getenv("ESTIMATE_BATCH_PRICE_FACTOR", "0.5"))
+
 # Kolomnamen die vaak context geven (heuristiek)
 COMMON_CONTEXT_COLS = [
     # PIL
@@ -45,13 +118,33 @@ COMMON_CONTEXT_COLS = [
     "Codering concept", "Codering definitief", "Codering-naam",
 ]
 
+@dataclass
+class CascadeTier:
+    """Eén tier van de model-cascade: antwoorden met `confidence` < `threshold` gaan naar de volgende tier."""
+    provider: str
+    model: str
+    threshold: float = 0.0  # genegeerd voor de laatste tier (die beslist altijd)
+
+
 @dataclass
 class AppSettings:
     provider_name: str = "openai"
     model: str = DEFAULT_MODEL
     temperature: float = 0.1
     top_k_codes: int = 15
+    candidate_token_budget: int = 0  # max. geschatte tokens voor de kandidaten per rij (0 = geen limiet)
+    concurrency: int = DEFAULT_CONCURRENCY
     dry_run: bool = False
+    use_cache: bool = True
+    deduplicate: bool = True
+    batch_size: int = 1  # aantal rijen per LLM-call (1 = per rij)
+    resume: bool = True  # checkpoint-journaal: ongewijzigde rijen van eerdere runs overslaan
+    profile_run: bool = False  # run onder cProfile (prestatieanalyse)
+    output_mode: str = "openpyxl"  # "openpyxl" of "patch" (alleen doelkolommen herschrijven)
+    execution_mode: str = "interactive"  # "interactive" (losse calls) of "batch" (batch-endpoint, tot 24 uur)
+    cascade: Optional[List[CascadeTier]] = None  # model-cascade (goedkoop model eerst); None = alleen `model`
+    local_model: bool = False  # lokaal model (getraind op bestaande coderingen) vóór het LLM
+    use_mappings: bool = USE_MAPPINGS  # goedgekeurde coderingen van eerdere klantbestanden direct overnemen
     max_rows_preview: int = 30
     system_language: str = "nl"  # nl of en
     header_rows_override: Optional[dict] = None
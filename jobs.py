@@ -0,0 +1,242 @@
+"""
+Achtergrond-jobs voor `process_workbook`: een run draait in een worker-thread van een
+procesbrede `JobManager`, zodat de Streamlit-sessie niet blokkeert en een rerun van het
+script de run niet afbreekt. De UI pollt de `RunProgress` van de job; meerdere gebruikers
+op één server delen de wachtrij (max. `MAX_PARALLEL_JOBS` runs tegelijk).
+
+Afgeronde jobs blijven tot `JOB_RETENTION_HOURS` bewaard; grote resultaten staan dan op
+schijf in plaats van in het geheugen. Met `input_key` herkent de UI een herhaalde run met
+dezelfde bestanden en instellingen en toont ze het bewaarde resultaat.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from config import CACHE_DIR, JOB_RETENTION_HOURS, MAX_PARALLEL_JOBS, RESULT_SPILL_MB
+from logic.estimate import RunEstimate, measured_seconds_per_call
+from utils.files import atomic_write_bytes, content_hash
+from utils.progress import RunCancelled, RunProgress
+from utils.run_report import RunReport, performance_report
+from utils.timing import ProfileCapture, StageTimings
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+
+
+def input_key(customer_bytes: bytes, schema_bytes: bytes, settings: Dict[str, Any]) -> str:
+    """Sleutel van een run: inhoud van beide bestanden plus alle instellingen voor `JobManager.submit`."""
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    parts = (content_hash(customer_bytes), content_hash(schema_bytes), content_hash(payload.encode("utf-8")))
+    return content_hash("|".join(parts).encode("utf-8"))
+
+
+@dataclass
+class Job:
+    id: str
+    owner: str                     # werkruimte (Streamlit: `?werkruimte=` in de URL) die de job startte
+    label: str                     # bestandsnaam van het klantbestand
+    customer_bytes: bytes
+    settings: Dict[str, Any]       # keyword-argumenten voor `process_workbook`
+    profile: bool = False          # run onder cProfile (job- en worker-threads; één tegelijk)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    status: str = QUEUED
+    progress: RunProgress = field(default_factory=RunProgress)
+    report: RunReport = field(default_factory=RunReport)
+    timings: StageTimings = field(default_factory=StageTimings)
+    result: Optional[bytes] = None
+    result_path: Optional[str] = None  # resultaat op schijf (groter dan `RESULT_SPILL_MB`)
+    error: Optional[str] = None
+    profile_text: Optional[str] = None
+    profile_raw: Optional[bytes] = None
+    estimate: Optional[RunEstimate] = None  # alleen bij een preview (steekproef)
+    future: Optional[Future] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def reusable(self) -> bool:
+        """Loopt nog of is geslaagd met een resultaat dat nog beschikbaar is."""
+        if self.status == DONE:
+            return self.result is not None or (self.result_path is not None and os.path.exists(self.result_path))
+        return self.active
+
+    def cancel(self) -> None:
+        """Vraag annulering aan; een lopende run stopt na de calls die al onderweg zijn."""
+        self.progress.cancel()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    def _store_result(self, data: bytes, directory: str) -> None:
+        if len(data) > RESULT_SPILL_MB * 1024 * 1024:
+            path = os.path.join(directory, f"{self.id}.xlsx")
+            atomic_write_bytes(path, data)
+            self.result_path = path
+        else:
+            self.result = data
+
+    def _discard_result(self) -> None:
+        if self.result_path is not None and os.path.exists(self.result_path):
+            os.remove(self.result_path)
+        self.result, self.result_path = None, None
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+
+    def performance(self) -> Dict[str, Any]:
+        """Prestatierapport (tijden per fase en per tabblad, tokens, retries, cache) van deze job."""
+        settings = {k: v for k, v in self.settings.items() if not isinstance(v, (bytes, bytearray))}
+        meta = {"job": self.id, "file": self.label, "status": self.status, "settings": settings,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.created_at))}
+        if self.preview:
+            meta["estimate"] = self.estimate_summary()
+        return performance_report(self.report, self.timings.as_dict(), meta)
+
+    @property
+    def preview(self) -> bool:
+        return self.estimate is not None
+
+    def estimate_summary(self) -> Dict[str, Any]:
+        """
+        Raming voor de volledige run; de looptijd gebruikt de in de steekproef gemeten duur per
+        LLM-call (als die zonder cache-hits gemeten kon worden) bij de ingestelde gelijktijdigheid.
+        """
+        per_call = measured_seconds_per_call(self.timings.as_dict()["seconds"].get("llm", 0.0),
+                                             self.report.llm_calls, self.report.cache_hits)
+        summary = self.estimate.as_dict(self.settings.get("concurrency", 1), per_call)
+        summary["seconds_per_call"] = per_call
+        return summary
+
+    def output(self) -> bytes:
+        """
+        Het (tot nu toe) ingevulde klantbestand. Zolang de run niet klaar is, worden de
+        tussenresultaten uit de voortgang in een kopie van het origineel gepatcht.
+        """
+        if self.result is not None:
+            return self.result
+        if self.result_path is not None:
+            with open(self.result_path, "rb") as fh:
+                return fh.read()
+        from writers.xlsx_patch import SheetPatch, patch_workbook
+
+        patches: Dict[str, SheetPatch] = {}
+        for sheet in self.progress.snapshot():
+            if not sheet.target_indices:
+                continue  # blad nog niet ingelezen
+            patch = patches[sheet.title] = SheetPatch()
+            for col_idx, title in sheet.new_headers.items():
+                patch.set(sheet.header_row, col_idx, title)
+            for row_idx, (_, code, argument, note) in sheet.outcomes.items():
+                patch.set(row_idx, sheet.target_indices["codering_ai"], code)
+                patch.set(row_idx, sheet.target_indices["argumentatie_ai"], argument)
+                patch.set(row_idx, sheet.target_indices["opmerkingen"], note)
+        return patch_workbook(self.customer_bytes, patches).getvalue()
+
+
+class JobManager:
+    """Procesbrede wachtrij van jobs met een begrensd aantal gelijktijdige runs."""
+
+    def __init__(self, max_parallel: int = MAX_PARALLEL_JOBS, retention_hours: float = JOB_RETENTION_HOURS,
+                 result_dir: str = os.path.join(CACHE_DIR, "results")):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="toedeling-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._retention = retention_hours * 3600
+        self._result_dir = result_dir
+
+    def submit(self, *, owner: str, label: str, customer_bytes: bytes, schema_bytes: bytes,
+               profile: bool = False, **settings: Any) -> Job:
+        """Zet een run in de wachtrij; `settings` zijn de overige argumenten van `process_workbook`."""
+        self._prune()
+        job = Job(id=uuid.uuid4().hex[:12], owner=owner, label=label, customer_bytes=customer_bytes,
+                  settings=dict(settings, schema_file=schema_bytes), profile=profile)
+        if settings.get("sample_rows"):
+            # De steekproef zelf altijd interactief; de raming rekent met de gekozen modus
+            job.estimate = RunEstimate(settings["model"], batch=settings.get("execution_mode") == "batch")
+            job.settings["execution_mode"] = "interactive"
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def jobs_for(self, owner: str) -> List[Job]:
+        with self._lock:
+            return sorted((j for j in self._jobs.values() if j.owner == owner), key=lambda j: j.created_at)
+
+    def queue_position(self, job: Job) -> int:
+        """Aantal jobs dat vóór deze job in de wachtrij staat (0 = draait of is als volgende aan de beurt)."""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == QUEUED and j.created_at < job.created_at)
+
+    def _run(self, job: Job) -> None:
+        if job.progress.cancelled:
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        # Pas bij de eerste run importeren (openpyxl, pandas, numpy): de pagina verschijnt sneller
+        from writers.excel_writer import process_workbook
+
+        capture = ProfileCapture() if job.profile else None
+        status = FAILED
+        try:
+            with capture if capture is not None else nullcontext():
+                out = process_workbook(
+                    customer_file=BytesIO(job.customer_bytes),
+                    journal_name=job.label,  # stabiel over sessies en leveringen; de flock scheidt gelijktijdige runs
+                    report=job.report,
+                    progress=job.progress,
+                    timings=job.timings,
+                    estimate=job.estimate,
+                    **job.settings,
+                )
+            job._store_result(out.getvalue(), self._result_dir)
+            status = DONE
+        except RunCancelled:
+            status = CANCELLED
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}\n{traceback.format_exc(limit=5)}"
+        if capture is not None:
+            job.profile_text, job.profile_raw = capture.text, capture.raw
+        job._finish(status)
+
+    def _prune(self) -> None:
+        """Vergeet afgeronde jobs ouder dan de bewaartermijn (geeft hun bytes en bestanden vrij)."""
+        cutoff = time.time() - self._retention
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if not j.active and (j.finished_at or 0) < cutoff]:
+                self._jobs.pop(job_id)._discard_result()
+        if os.path.isdir(self._result_dir):
+            # Resultaten van een eerder serverproces (deze manager kent die jobs niet meer)
+            for name in os.listdir(self._result_dir):
+                path = os.path.join(self._result_dir, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+
+_MANAGER: Optional[JobManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def job_manager() -> JobManager:
+    """De gedeelde `JobManager` van dit proces (blijft bestaan over Streamlit-reruns en -sessies heen)."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = JobManager()
+        return _MANAGER
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
 
 
 class LLMClient(ABC):
     name: str
+    # True als de provider het antwoord aan een JSON-schema kan binden (structured output)
+    supports_response_schema: bool = False
 
     @abstractmethod
-    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0) -> str:
-        """Voer een chat-achtige classificatie uit en retourneer de ruwe string-respons."""
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Voer een chat-achtige classificatie uit en retourneer de ruwe string-respons.
+        `response_schema` ({"name", "strict", "schema"}, zie `logic.structured_output`) wordt
+        afgedwongen door providers met `supports_response_schema`; andere providers negeren het.
+        """
         raise NotImplementedError
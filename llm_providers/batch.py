@@ -0,0 +1,249 @@
+"""
+Batch-modus: alle prompts van een run als JSONL-verzoekbestand naar een batch-endpoint van
+de provider (bij OpenAI: /v1/files + /v1/batches, tot 24 uur doorlooptijd tegen lagere
+kosten), pollen tot de batch klaar is en de antwoorden per `custom_id` teruggeven.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import BATCH_MAX_FILE_MB
+from utils.files import atomic_write_bytes
+from utils.progress import RunCancelled
+
+from .base import LLMClient
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS = 50_000        # limiet per batch-bestand bij OpenAI
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchRequestFailed(RuntimeError):
+    """Geen (geslaagd) antwoord voor deze prompt in de batch-uitvoer; de rij valt terug op de heuristiek."""
+
+
+class UnansweredClient(LLMClient):
+    """
+    Client voor de verwerking na een batch: alle antwoorden staan al in de `ResponseCache`
+    (via `CachedLLMClient`), dus elke call die hier aankomt is mislukt in de batch.
+    Neemt naam en structured-output-ondersteuning van de provider over (zelfde cache-sleutels).
+    """
+
+    def __init__(self, provider: LLMClient):
+        self.name = provider.name
+        self.supports_response_schema = provider.supports_response_schema
+
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        raise BatchRequestFailed("Geen antwoord in de batch-uitvoer")
+
+
+class BatchBackend(ABC):
+    """Batch-endpoint van een provider."""
+    name: str
+
+    @abstractmethod
+    def submit(self, path: str, metadata: Dict[str, str]) -> str:
+        """Upload het JSONL-verzoekbestand en start een batch; retourneert het batch-id."""
+
+    @abstractmethod
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        """Status: {"status", "completed", "failed", "total", "input_file_id", "output_file_id", "error_file_id"}."""
+
+    @abstractmethod
+    def download(self, file_id: str) -> str:
+        """Inhoud van een uitvoer- of foutbestand (JSONL)."""
+
+    @abstractmethod
+    def cancel(self, batch_id: str) -> None:
+        """Annuleer een lopende batch."""
+
+    def delete_file(self, file_id: str) -> None:
+        """Verwijder een geüpload bestand bij de provider (standaard: niets)."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API; met `OPENAI_BASE_URL` ook tegen de lokale stub-server."""
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: float = 300.0):
+        from .openai_provider import _pooled_client
+
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("Geen OpenAI API key gevonden. Stel OPENAI_API_KEY in via Streamlit secrets of env.")
+        self.client, _ = _pooled_client(api_key, base_url or os.getenv("OPENAI_BASE_URL") or None, timeout)
+
+    def submit(self, path: str, metadata: Dict[str, str]) -> str:
+        with open(path, "rb") as fh:
+            uploaded = self.client.files.create(file=fh, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window="24h", metadata=metadata)
+        return batch.id
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "completed": getattr(counts, "completed", 0) or 0,
+            "failed": getattr(counts, "failed", 0) or 0,
+            "total": getattr(counts, "total", 0) or 0,
+            "input_file_id": batch.input_file_id,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+        }
+
+    def download(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
+
+    def cancel(self, batch_id: str) -> None:
+        self.client.batches.cancel(batch_id)
+
+    def delete_file(self, file_id: str) -> None:
+        self.client.files.delete(file_id)
+
+
+def chat_request(custom_id: str, *, model: str, temperature: float, system_prompt: str, user_prompt: str,
+                 response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Eén regel van het verzoekbestand: dezelfde body als een losse call van `OpenAIClient`."""
+    body: Dict[str, Any] = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+    }
+    if response_schema is not None:
+        body["response_format"] = {"type": "json_schema", "json_schema": response_schema}
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_results(text: str) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """(antwoord per custom_id, tokenverbruik) uit een uitvoerbestand; mislukte regels ontbreken."""
+    answers: Dict[str, str] = {}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if entry.get("error") or response.get("status_code") != 200:
+                continue
+            body = response["body"]
+            content = body["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            continue
+        if content:
+            answers[entry["custom_id"]] = content
+            for key in usage:
+                usage[key] += int((body.get("usage") or {}).get(key) or 0)
+    return answers, usage
+
+
+def _chunk_lines(requests: List[Dict[str, Any]], max_bytes: int) -> List[List[bytes]]:
+    """JSONL-regels van `requests`, verdeeld over blokken binnen het maximum aan verzoeken en bytes."""
+    chunks: List[List[bytes]] = [[]]
+    size = 0
+    for request in requests:
+        line = (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+        if chunks[-1] and (len(chunks[-1]) >= BATCH_MAX_REQUESTS or size + len(line) > max_bytes):
+            chunks.append([])
+            size = 0
+        chunks[-1].append(line)
+        size += len(line)
+    return chunks
+
+
+def _cleanup(backend: BatchBackend, states: Dict[str, Dict[str, Any]], manifest_path: str) -> None:
+    """Manifest weg en de geüploade verzoekbestanden bij de provider verwijderen (best effort)."""
+    os.remove(manifest_path)
+    for state in states.values():
+        if state.get("input_file_id"):
+            try:
+                backend.delete_file(state["input_file_id"])
+            except Exception:
+                pass  # alleen opruimen: de antwoorden zijn al binnen of de run is geannuleerd
+
+
+def run_batch(
+    requests: List[Dict[str, Any]],
+    backend: BatchBackend,
+    *,
+    workdir: str,
+    label: str = "",
+    poll_seconds: float = 30.0,
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_status: Optional[Callable[[str], None]] = None,
+    max_file_bytes: int = int(BATCH_MAX_FILE_MB * 1024 * 1024),
+) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Schrijf `requests` (zie `chat_request`) als JSONL naar `workdir`, dien ze in per blok van
+    hoogstens `BATCH_MAX_REQUESTS` verzoeken en `max_file_bytes` (elke regel bevat de volledige
+    system-prompt, dus de bestandsgrootte is meestal de echte grens), poll tot alle batches
+    klaar zijn en retourneer (antwoord per custom_id, tokenverbruik). Mislukte of verlopen
+    verzoeken ontbreken in het resultaat.
+
+    De batch-id's staan in een manifest in `workdir`: een herstart met dezelfde verzoeken pollt
+    de lopende batches verder in plaats van opnieuw in te dienen. Na `should_stop()` worden de
+    batches geannuleerd en volgt `RunCancelled`. Lokale verzoekbestanden verdwijnen direct na de
+    upload, de geüploade bestanden bij de provider samen met het manifest.
+    """
+    if not requests:
+        return {}, {"prompt_tokens": 0, "completion_tokens": 0}
+    os.makedirs(workdir, exist_ok=True)
+    digest = hashlib.sha256("\n".join(sorted(r["custom_id"] for r in requests)).encode("utf-8")).hexdigest()[:16]
+    manifest_path = os.path.join(workdir, f"{digest}.json")
+    chunks = _chunk_lines(requests, max_file_bytes)
+
+    batch_ids: List[str] = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as fh:
+            batch_ids = json.load(fh).get("batch_ids", [])
+    if len(batch_ids) != len(chunks):
+        batch_ids = []
+        for i, chunk in enumerate(chunks):
+            path = os.path.join(workdir, f"{digest}_{i}.jsonl")
+            atomic_write_bytes(path, b"".join(chunk))
+            try:
+                batch_ids.append(backend.submit(path, {"label": label[:200], "chunk": str(i)}))
+            finally:
+                os.remove(path)  # na de upload niet meer nodig (tot ~BATCH_MAX_FILE_MB per blok)
+        atomic_write_bytes(manifest_path, json.dumps({"label": label, "batch_ids": batch_ids}).encode("utf-8"))
+
+    states: Dict[str, Dict[str, Any]] = {}
+    while True:
+        for batch_id in batch_ids:
+            if states.get(batch_id, {}).get("status") not in _TERMINAL:
+                states[batch_id] = backend.retrieve(batch_id)
+        done = sum(s["completed"] + s["failed"] for s in states.values())
+        total = sum(s["total"] for s in states.values()) or len(requests)
+        pending = [b for b in batch_ids if states[b]["status"] not in _TERMINAL]
+        if on_status is not None:
+            statuses = ", ".join(sorted({s["status"] for s in states.values()}))
+            on_status(f"Batch ({len(batch_ids)}x): {statuses} — {done}/{total} verzoeken verwerkt")
+        if not pending:
+            break
+        if should_stop is not None and should_stop():
+            for batch_id in pending:
+                backend.cancel(batch_id)
+            _cleanup(backend, states, manifest_path)
+            raise RunCancelled()
+        deadline = time.monotonic() + poll_seconds
+        while time.monotonic() < deadline and not (should_stop is not None and should_stop()):
+            time.sleep(min(0.5, poll_seconds))
+
+    answers: Dict[str, str] = {}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    for state in states.values():
+        if state.get("output_file_id"):
+            found, used = parse_results(backend.download(state["output_file_id"]))
+            answers.update(found)
+            for key in usage:
+                usage[key] += used[key]
+    _cleanup(backend, states, manifest_path)  # antwoorden gaan de cache in; een volgende run dient alleen de rest opnieuw in
+    return answers, usage
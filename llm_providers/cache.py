@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .base import LLMClient
+
+
+def cache_key(*, provider: str, model: str, temperature: float, system_prompt: str, user_prompt: str,
+              response_schema: Optional[Dict[str, Any]] = None) -> str:
+    """Content-hash van alles wat de modelrespons bepaalt."""
+    parts: list = [provider, model, round(float(temperature), 4), system_prompt, user_prompt]
+    if response_schema is not None:  # zonder schema blijven bestaande sleutels geldig
+        parts.append(response_schema)
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Schijf-cache (SQLite) voor ruwe LLM-responsen, met eviction op leeftijd en omvang.
+    Veilig te delen tussen threads; meerdere processen kunnen dezelfde database gebruiken (WAL).
+    """
+
+    def __init__(self, directory: str, *, max_entries: int = 200_000, max_age_days: float = 90.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "llm_responses.sqlite")
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+            self._conn.commit()
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def has(self, key: str) -> bool:
+        """Of er een (niet verlopen) antwoord is, zonder hits/misses te tellen."""
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.max_age_seconds
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._conn.commit()
+            self._inserts += 1
+            evict_now = self._inserts % 1000 == 0
+        if evict_now:
+            self.evict()
+
+    def evict(self) -> None:
+        """Verwijder verlopen entries en, boven `max_entries`, de minst recent gebruikte."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedLLMClient(LLMClient):
+    """Wrapper die `classify` eerst in de `ResponseCache` opzoekt; telt hits/misses per wrapper."""
+
+    def __init__(self, inner: LLMClient, cache: ResponseCache):
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+        self.supports_response_schema = inner.supports_response_schema
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        key = cache_key(
+            provider=self.inner.name, model=model, temperature=temperature,
+            system_prompt=system_prompt, user_prompt=user_prompt, response_schema=response_schema,
+        )
+        cached = self.cache.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return cached
+        raw = self.inner.classify(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                                  temperature=temperature, response_schema=response_schema)
+        if raw:
+            self.cache.put(key, raw)
+        return raw
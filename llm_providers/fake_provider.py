@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from utils.tokens import estimate_tokens
+
+from .base import LLMClient
+
+_CODE_RE = re.compile(r"^\* \[([^\]]+)\]", re.MULTILINE)
+_ROW_RE = re.compile(r"^Rij (\d+):", re.MULTILINE)
+
+
+class FakeAPIError(RuntimeError):
+    """Gesimuleerde API-fout met `status_code` (en bij 429 een Retry-After header), zoals de SDK's."""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeLLMClient(LLMClient):
+    """
+    Deterministische lokale `LLMClient` voor benchmarks: wacht `latency` (± `jitter`) seconden
+    en kiest een code uit de kandidaten in de prompt. Met `error_rate` / `rate_limit_rate`
+    faalt een deel van de calls met een 500 / 429; de uitkomst hangt alleen af van `seed`,
+    de prompt en het hoeveelste verzoek met die prompt het is, zodat runs reproduceerbaar zijn.
+    Met `invalid_rate` antwoordt een deel van de calls met een niet-bestaande code; met
+    `structured=True` gedraagt de client zich als een provider met structured output (het
+    antwoord volgt het meegegeven schema en bevat dus altijd een geldige code). De gekozen code
+    en de confidence (0,5–1,0) hangen ook af van `model`, zodat tiers van een cascade verschillen.
+    """
+    name = "fake"
+
+    def __init__(self, *, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 0.05, seed: int = 0,
+                 invalid_rate: float = 0.0, structured: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.invalid_rate = invalid_rate
+        self.supports_response_schema = structured
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        digest = hashlib.sha256(f"{self.seed}\x1f{system_prompt}\x1f{user_prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts[digest] = self._attempts.get(digest, 0) + 1
+        rng = random.Random(f"{digest}:{attempt}")
+
+        delay = self.latency + (rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limited += 1
+            raise FakeAPIError(429, "Rate limit (fake)", retry_after=self.retry_after)
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise FakeAPIError(500, "Internal error (fake)")
+
+        codes = _CODE_RE.findall(system_prompt) + _CODE_RE.findall(user_prompt)
+        rows = _ROW_RE.findall(user_prompt)
+        structured = self.supports_response_schema and response_schema is not None
+
+        def entry(key: str) -> Dict[str, object]:
+            pick = int(hashlib.sha256(f"{digest}:{model}:{key}".encode("utf-8")).hexdigest()[:8], 16)
+            code = codes[pick % len(codes)] if codes else None
+            if not structured and (pick % 10_000) / 10_000 < self.invalid_rate:
+                code = f"X{pick % 1000}"  # bestaat niet in het schema
+            return {"code": code, "argumentatie": "Nep-antwoord (benchmark).", "vraag": None,
+                    "confidence": 0.5 + (pick >> 16) % 51 / 100}
+
+        if rows:
+            entries = [dict(entry(r), rij=int(r)) for r in rows]
+            content = json.dumps({"rijen": entries} if structured else entries)
+        else:
+            content = json.dumps(entry(""))
+        with self._lock:
+            self.prompt_tokens += estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+            self.completion_tokens += estimate_tokens(content)
+        return content
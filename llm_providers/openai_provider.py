@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import os
-from typing import Optional
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
 
 try:
     from openai import OpenAI
@@ -9,28 +10,87 @@ except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
 
 from .base import LLMClient
+from .resilience import CircuitBreaker, call_with_retry, status_code_of
+
+# Eén langlevende client (met HTTP keep-alive/connection pool) en circuit breaker per (api key, base URL)
+_POOL: Dict[Tuple[str, Optional[str]], Tuple["OpenAI", CircuitBreaker]] = {}
+_POOL_LOCK = threading.Lock()
+
+
+def _pooled_client(api_key: str, base_url: Optional[str], timeout: float) -> Tuple["OpenAI", CircuitBreaker]:
+    key = (api_key, base_url)
+    with _POOL_LOCK:
+        if key not in _POOL:
+            # Retries doen we zelf (met jitter, Retry-After en circuit breaker)
+            client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+            _POOL[key] = (client, CircuitBreaker())
+        return _POOL[key]
 
 
 class OpenAIClient(LLMClient):
     name = "openai"
+    supports_response_schema = True
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = 60.0, max_retries: int = 3):
         # Leest sleutel uit argument of uit omgevingsvariabele/Streamlit secrets
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # Optioneel alternatief endpoint (bijv. een lokale stub-server of proxy)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retries = 0
+        self.prompt_tokens = 0      # werkelijk verbruik volgens de API (`usage`)
+        self.completion_tokens = 0
+        self._no_schema_models: Set[str] = set()  # modellen zonder json_schema-ondersteuning
+        self._lock = threading.Lock()
 
-    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0) -> str:
+    def _count_retry(self, _exc: BaseException) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
         if OpenAI is None:
             raise RuntimeError("openai-package niet geïnstalleerd. Voeg 'openai' toe aan requirements.txt")
-        if not (self.api_key or os.getenv("OPENAI_API_KEY")):
+        api_key = self.api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
             raise RuntimeError("Geen OpenAI API key gevonden. Stel OPENAI_API_KEY in via Streamlit secrets of env.")
 
-        client = OpenAI(api_key=self.api_key)
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+        client, breaker = _pooled_client(api_key, self.base_url, self.timeout)
+
+        def create(structured: bool) -> Any:
+            extra: Dict[str, Any] = {}
+            if structured:
+                extra["response_format"] = {"type": "json_schema", "json_schema": response_schema}
+            return call_with_retry(
+                lambda: client.chat.completions.create(
+                    model=model,
+                    temperature=temperature,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    **extra,
+                ),
+                breaker=breaker,
+                max_retries=self.max_retries,
+                on_retry=self._count_retry,
+            )
+
+        structured = response_schema is not None and model not in self._no_schema_models
+        try:
+            resp = create(structured)
+        except Exception as exc:
+            # Oudere modellen kennen geen json_schema (400): onthouden en zonder schema opnieuw
+            if not structured or status_code_of(exc) != 400 or "response_format" not in str(exc):
+                raise
+            with self._lock:
+                self._no_schema_models.add(model)
+            resp = create(False)
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            with self._lock:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
         return resp.choices[0].message.content or ""
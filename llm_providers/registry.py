@@ -0,0 +1,82 @@
+"""
+Register van LLM-providers. Een provider wordt alleen bij naam en als 'module:attribuut'
+bekend gemaakt; de module (en daarmee bijv. de `openai`-package) wordt pas geïmporteerd als
+de provider voor een run wordt gekozen. Naast de ingebouwde providers hieronder worden
+providers uit andere packages gevonden via de entry-point-groep `toedeling.providers`
+(naam -> 'module:Klasse' van een `LLMClient`), bijv. in pyproject.toml:
+
+    [project.entry-points."toedeling.providers"]
+    mijnprovider = "mijn_package.provider:MijnClient"
+"""
+from __future__ import annotations
+
+import importlib
+import threading
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, Dict, List, Optional
+
+from .base import LLMClient
+from .batch import BatchBackend
+
+ENTRY_POINT_GROUP = "toedeling.providers"
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    name: str
+    target: str                          # 'module:attribuut' van de `LLMClient`-klasse
+    label: str = ""                      # weergavenaam in de UI
+    batch_target: Optional[str] = None   # 'module:attribuut' van de `BatchBackend` (None = geen batch-modus)
+
+
+BUILTIN_PROVIDERS: List[ProviderSpec] = [
+    ProviderSpec("openai", "llm_providers.openai_provider:OpenAIClient", "OpenAI",
+                 batch_target="llm_providers.batch:OpenAIBatchBackend"),
+]
+
+_PROVIDERS: Optional[Dict[str, ProviderSpec]] = None
+_LOCK = threading.Lock()
+
+
+def _load(target: str) -> Any:
+    module, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _discover() -> Dict[str, ProviderSpec]:
+    """Ingebouwde providers plus entry points (alleen metadata; er wordt niets geïmporteerd)."""
+    global _PROVIDERS
+    with _LOCK:
+        if _PROVIDERS is None:
+            found = {spec.name: spec for spec in BUILTIN_PROVIDERS}
+            for ep in entry_points(group=ENTRY_POINT_GROUP):
+                found.setdefault(ep.name, ProviderSpec(ep.name, ep.value, ep.name))
+            _PROVIDERS = found
+        return _PROVIDERS
+
+
+def available_providers() -> List[str]:
+    """Namen van alle bekende providers (ingebouwd eerst)."""
+    return list(_discover())
+
+
+def provider_label(name: str) -> str:
+    spec = _discover().get(name)
+    return (spec.label or name) if spec is not None else name
+
+
+def create_client(name: str, **kwargs: Any) -> LLMClient:
+    """Importeer en instantieer de provider `name`."""
+    spec = _discover().get(name)
+    if spec is None:
+        raise RuntimeError(f"Onbekende provider: {name}")
+    return _load(spec.target)(**kwargs)
+
+
+def create_batch_backend(name: str, **kwargs: Any) -> BatchBackend:
+    """Importeer en instantieer het batch-endpoint van provider `name`."""
+    spec = _discover().get(name)
+    if spec is None or spec.batch_target is None:
+        raise RuntimeError(f"Batch-modus niet beschikbaar voor provider: {name}")
+    return _load(spec.batch_target)(**kwargs)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+R = TypeVar("R")
+
+
+class CircuitOpenError(RuntimeError):
+    """De provider is (tijdelijk) als onbeschikbaar gemarkeerd; calls worden direct geweigerd."""
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    Herken een rate-limit (HTTP 429) fout, ongeacht de provider-SDK.
+    """
+    return status_code_of(exc) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    Storingen die bij een nieuwe poging kunnen verdwijnen: 5xx, time-outs en verbindingsfouten.
+    Rate-limits (429) horen er niet bij: die gaan direct naar de dispatcher, die de
+    gelijktijdigheid verlaagt en de call met backoff opnieuw probeert.
+    """
+    if isinstance(exc, CircuitOpenError) or is_rate_limit_error(exc):
+        return False
+    status = status_code_of(exc)
+    if status is not None:
+        return status >= 500
+    name = type(exc).__name__
+    return any(part in name for part in ("Timeout", "Connection", "InternalServer"))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Lees een eventuele 'Retry-After' header (in seconden) uit de fout."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Eenvoudige circuit breaker:
+    - na `failure_threshold` opeenvolgende storingen (5xx/verbinding) gaat het circuit open;
+    - zolang het open is worden calls direct geweigerd (`CircuitOpenError`);
+    - na `reset_timeout` seconden mag één proef-call door (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError("Provider tijdelijk onbeschikbaar (circuit breaker open).")
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def on_rate_limit(self) -> None:
+        """Een rate-limit telt niet als storing, maar beëindigt wel een lopende proef-call."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def call_with_retry(
+    fn: Callable[[], R],
+    *,
+    breaker: Optional[CircuitBreaker] = None,
+    max_retries: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0,
+    on_retry: Optional[Callable[[BaseException], None]] = None,
+) -> R:
+    """
+    Voer `fn` uit met retries op storingen (zie `is_transient_error`): exponentiële backoff
+    met jitter, waarbij een 'Retry-After' header voorrang krijgt en volledig wordt uitgewacht
+    (is die langer dan `max_delay`, dan volgt geen nieuwe poging maar de fout). Storingen tellen
+    mee voor de breaker; rate-limits niet (die zeggen niets over de beschikbaarheid van de
+    provider) en worden ook niet hier herhaald, maar direct doorgegeven aan de aanroeper.
+    """
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = fn()
+        except Exception as exc:
+            transient = is_transient_error(exc)
+            if breaker is not None:
+                if is_rate_limit_error(exc):
+                    breaker.on_rate_limit()
+                elif transient:
+                    breaker.on_failure()
+                else:
+                    # Functionele fout (bijv. 400): de provider zelf is bereikbaar
+                    breaker.on_success()
+            if not transient or attempt >= max_retries or (breaker is not None and breaker.is_open):
+                raise
+            delay = retry_after_seconds(exc)
+            if delay is None:
+                delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            elif delay > max_delay:
+                raise  # eerder opnieuw proberen dan de server toestaat faalt gegarandeerd
+            else:
+                delay += random.random() * base_delay
+            if on_retry is not None:
+                on_retry(exc)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.on_success()
+        return result
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+import pandas as pd
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.utils import get_column_letter
 
@@ -12,11 +13,18 @@ class SheetSpec:
     name: str
     header_row: int
 
+@dataclass
+class RowRecord:
+    """Eén datarij zoals in één leesronde uit het blad gehaald."""
+    row_idx: int             # 1-based rijnummer in het blad
+    context: Dict[str, Any]  # kolomnaam -> waarde (alleen contextkolommen)
+    targets: Optional[Dict[str, Any]] = None  # huidige waarden van de doelkolommen (indien gevraagd)
+
 def read_header(ws: Worksheet, header_row: int) -> Dict[str, int]:
     """Return dict: header_name -> column_index (1-based)."""
     headers: Dict[str, int] = {}
-    for col_idx, cell in enumerate(ws[header_row], start=1):
-        val = cell.value
+    values = next(ws.iter_rows(min_row=header_row, max_row=header_row, values_only=True), ())
+    for col_idx, val in enumerate(values, start=1):
         if val is None:
             continue
         name = str(val).strip()
@@ -24,10 +32,13 @@ def read_header(ws: Worksheet, header_row: int) -> Dict[str, int]:
             headers[name] = col_idx
     return headers
 
-def ensure_target_columns(ws: Worksheet, header_row: int) -> Dict[str, int]:
-    headers = read_header(ws, header_row)
-    max_col = ws.max_column
+def plan_target_columns(headers: Dict[str, int], max_col: int) -> Tuple[Dict[str, int], Dict[int, str]]:
+    """
+    Bepaal de kolommen voor de doelvelden zonder het blad te wijzigen.
+    Retourneert (doelveld -> kolomindex, nieuw aan te maken kolomindex -> headertitel).
+    """
     indices: Dict[str, int] = {}
+    new_headers: Dict[int, str] = {}
     for key, title in TARGET_COLUMNS.items():
         found_idx = None
         for hname, idx in headers.items():
@@ -36,25 +47,54 @@ def ensure_target_columns(ws: Worksheet, header_row: int) -> Dict[str, int]:
                 break
         if found_idx is None:
             max_col += 1
-            ws.cell(row=header_row, column=max_col, value=title)
+            new_headers[max_col] = title
             found_idx = max_col
         indices[key] = found_idx
-    return indices
+    return indices, new_headers
 
-def iter_data_rows(ws: Worksheet, header_row: int):
-    """Yield 1-based row indices for non-empty data rows after the header."""
-    start = header_row + 1
-    for r in range(start, ws.max_row + 1):
-        row_vals = [ws.cell(row=r, column=c).value for c in range(1, ws.max_column + 1)]
-        if all(v in (None, "") for v in row_vals):
-            continue
-        yield r
+@dataclass
+class SheetFrame:
+    """Alle niet-lege datarijen van een blad, kolomsgewijs (originele celwaarden, dtype object)."""
+    row_idx: List[int]                  # 1-based rijnummers
+    context: pd.DataFrame               # contextkolommen
+    targets: Optional[pd.DataFrame]     # huidige waarden van de doelkolommen (indien gevraagd)
+
+    def records(self) -> Iterator[RowRecord]:
+        """Per (niet-lege) rij een `RowRecord`."""
+        columns = list(self.context.columns)
+        values = zip(*(self.context[c].tolist() for c in columns)) if columns else ((),) * len(self.row_idx)
+        targets = self.targets.to_dict("records") if self.targets is not None else None
+        for i, (row_idx, row) in enumerate(zip(self.row_idx, values)):
+            yield RowRecord(
+                row_idx=row_idx,
+                context=dict(zip(columns, row)),
+                targets=targets[i] if targets is not None else None,
+            )
+
+def read_sheet_frame(ws: Worksheet, header_row: int, context_cols: Dict[str, int],
+                     target_cols: Optional[Dict[str, int]] = None) -> SheetFrame:
+    """
+    Lees alle rijen na de header in één keer (`iter_rows(values_only=True)`) als kolommen en
+    laat lege rijen (alle kolommen leeg) weg. Kolommen buiten de breedte van het blad zijn None.
+    """
+    frame = pd.DataFrame(list(ws.iter_rows(min_row=header_row + 1, values_only=True)), dtype=object)
+    row_idx = pd.RangeIndex(header_row + 1, header_row + 1 + len(frame))
+    if len(frame.columns):
+        filled = ~(frame.isna() | frame.eq("")).all(axis=1)
+        frame, row_idx = frame[filled.to_numpy()], row_idx[filled.to_numpy()]
+
+    def columns(cols: Dict[str, int]) -> pd.DataFrame:
+        return pd.DataFrame(
+            {name: frame[idx - 1].to_numpy() if idx - 1 in frame.columns else [None] * len(frame)
+             for name, idx in cols.items()},
+            index=range(len(frame)), dtype=object,
+        )
 
-def build_row_context(ws: Worksheet, header_map: Dict[str, int], row_idx: int) -> Dict[str, Any]:
-    ctx = {}
-    for name, col_idx in header_map.items():
-        ctx[name] = ws.cell(row=row_idx, column=col_idx).value
-    return ctx
+    return SheetFrame(
+        row_idx=row_idx.tolist(),
+        context=columns(context_cols),
+        targets=columns(target_cols) if target_cols else None,
+    )
 
 def write_results(ws: Worksheet, row_idx: int, target_indices: Dict[str, int],
                   code: Optional[str], argument: Optional[str], note: Optional[str]) -> None:
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from config import CACHE_DIR
+from loaders.schema_loader import CodeRule, load_codeschema_excel
+from utils.files import atomic_write_bytes, content_hash, read_bytes
+
+# Versie van het geserialiseerde formaat; ophogen als CodeRule of de parser wijzigt
+SCHEMA_CACHE_VERSION = 1
+
+_MEMO: "OrderedDict[str, Dict[str, List[CodeRule]]]" = OrderedDict()
+_MEMO_SIZE = 8
+_LOCK = threading.Lock()
+
+
+def _artefact_path(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, "schemas", f"{digest}.v{SCHEMA_CACHE_VERSION}.json")
+
+
+def _remember(digest: str, schema: Dict[str, List[CodeRule]]) -> None:
+    with _LOCK:
+        _MEMO[digest] = schema
+        _MEMO.move_to_end(digest)
+        while len(_MEMO) > _MEMO_SIZE:
+            _MEMO.popitem(last=False)
+
+
+def load_codeschema_cached(path_or_file, cache_dir: Optional[str] = CACHE_DIR) -> Dict[str, List[CodeRule]]:
+    """
+    Als `load_codeschema_excel`, maar gecached op de SHA-256 van de bestandsinhoud:
+    eerst in het proces, daarna als compact JSON-artefact in `cache_dir/schemas`.
+    Een gewijzigd schemabestand heeft een andere hash en wordt dus opnieuw ingelezen.
+    """
+    data = read_bytes(path_or_file)
+    digest = content_hash(data)
+
+    with _LOCK:
+        schema = _MEMO.get(digest)
+    if schema is not None:
+        return schema
+
+    path = _artefact_path(cache_dir, digest) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            schema = {cat: [CodeRule(**r) for r in rules] for cat, rules in raw.items()}
+        except Exception:
+            schema = None  # beschadigd artefact: opnieuw parsen
+    if schema is None:
+        schema = load_codeschema_excel(BytesIO(data))
+        if path:
+            payload = {cat: [asdict(r) for r in rules] for cat, rules in schema.items()}
+            atomic_write_bytes(path, json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    _remember(digest, schema)
+    return schema
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 import pandas as pd
@@ -13,6 +14,16 @@ class CodeRule:
     overhead_flag: Optional[str] = None
     clarifying_hint: Optional[str] = None
 
+def schema_fingerprint(rules: List[CodeRule]) -> str:
+    """Stabiele hash van de velden van een codeschema (voor memoisatie en cache-sleutels)."""
+    h = hashlib.sha256()
+    for r in rules:
+        for part in (r.code, r.name, r.description, r.instructions, r.overhead_flag or "", r.clarifying_hint or ""):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x1f")
+        h.update(b"\x1e")
+    return h.hexdigest()
+
 def _first_col_match(cols: List[str], *candidates: str) -> Optional[str]:
     for cand in candidates:
         for c in cols:
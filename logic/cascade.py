@@ -0,0 +1,108 @@
+"""
+Model-cascade: classificeer eerst met een klein, snel model en stuur alleen de onzekere rijen
+(lage confidence, ongeldige code of een verduidelijkingsvraag) door naar een groter model.
+De volgorde van de tiers en hun drempels komen uit `AppSettings.cascade`; `process_workbook`
+voert de cascade uit en houdt per tier `TierStats` bij voor het run-rapport.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import CascadeTier
+from llm_providers.base import LLMClient
+from logic.classifier import ClassificationResult
+
+
+def parse_cascade(text: str) -> List[CascadeTier]:
+    """
+    Cascade uit tekst: 'provider:model:drempel' per tier, gescheiden door komma's, bijv.
+    'openai:gpt-4o-mini:0.8,openai:gpt-4o'. De drempel is optioneel (standaard 0).
+    """
+    tiers: List[CascadeTier] = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        fields_ = [f.strip() for f in part.split(":")]
+        if len(fields_) not in (2, 3) or not all(fields_[:2]):
+            raise ValueError(f"Ongeldige cascade-tier '{part.strip()}' (verwacht provider:model[:drempel])")
+        try:
+            threshold = float(fields_[2]) if len(fields_) == 3 and fields_[2] else 0.0
+        except ValueError:
+            raise ValueError(f"Ongeldige drempel in cascade-tier '{part.strip()}'") from None
+        tiers.append(CascadeTier(fields_[0], fields_[1], threshold))
+    return tiers
+
+
+def needs_escalation(result: ClassificationResult, threshold: float) -> bool:
+    """Onzeker antwoord: confidence onder de drempel of een verduidelijkingsvraag aan de gebruiker."""
+    return result.code is None or result.confidence < threshold or bool(result.vraag)
+
+
+@dataclass
+class TierStats:
+    """Tellers van één tier; wordt vanuit worker-threads bijgewerkt."""
+    provider: str
+    model: str
+    threshold: float
+    calls: int = 0          # API-calls van deze tier (cache-hits niet meegeteld)
+    seconds: float = 0.0    # opgetelde duur van die calls
+    rows: int = 0           # rijen aangeboden aan deze tier
+    accepted: int = 0       # rijen waarvan het antwoord van deze tier is overgenomen
+    escalated: int = 0      # rijen doorgestuurd naar de volgende tier
+    compared: int = 0       # doorgestuurde rijen waarvoor beide tiers een code gaven
+    agreed: int = 0         # ... en de volgende tier dezelfde code koos
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **amounts: float) -> None:
+        with self._lock:
+            for key, amount in amounts.items():
+                setattr(self, key, getattr(self, key) + amount)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Gemiddelde duur per API-call in seconden."""
+        return self.seconds / self.calls if self.calls else None
+
+    @property
+    def agreement_rate(self) -> Optional[float]:
+        """Fractie van de doorgestuurde rijen waarop de volgende tier dezelfde code koos."""
+        return self.agreed / self.compared if self.compared else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider, "model": self.model, "threshold": self.threshold,
+            "calls": self.calls, "seconds": round(self.seconds, 4), "latency": self.latency,
+            "rows": self.rows, "accepted": self.accepted, "escalated": self.escalated,
+            "compared": self.compared, "agreed": self.agreed, "agreement_rate": self.agreement_rate,
+        }
+
+
+class MeteredClient(LLMClient):
+    """Telt de calls en hun duur per tier; zit tussen de provider en een eventuele cache."""
+
+    def __init__(self, inner: LLMClient, stats: TierStats):
+        self.inner = inner
+        self.stats = stats
+        self.name = inner.name
+        self.supports_response_schema = inner.supports_response_schema
+
+    def classify(self, *, model: str, system_prompt: str, user_prompt: str, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        started = time.perf_counter()
+        try:
+            return self.inner.classify(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                                       temperature=temperature, response_schema=response_schema)
+        finally:
+            self.stats.add(calls=1, seconds=time.perf_counter() - started)
+
+
+@dataclass
+class Tier:
+    """Tier zoals `process_workbook` hem uitvoert: (gecachete) client, model, drempel en tellers."""
+    llm: LLMClient
+    model: str
+    threshold: float
+    stats: TierStats
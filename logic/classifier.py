@@ -5,7 +5,11 @@ from typing import List, Dict, Optional, Any, Tuple
 
 from loaders.schema_loader import CodeRule
 from llm_providers.base import LLMClient
-from utils.json_utils import extract_first_json_block
+from logic.prompts import build_repair_prompt
+from logic.structured_output import InvalidAnswer, validate_code
+from utils.json_utils import extract_first_json_block, extract_json_array
+from utils.run_report import RunReport
+from utils.timing import StageTimings, timed
 
 
 @dataclass
@@ -16,19 +20,24 @@ class ClassificationResult:
     confidence: float
 
 
-def rank_candidates(text: str, rules: List[CodeRule], top_k: int = 15) -> List[CodeRule]:
+def rank_candidates(text: str, rules: List[CodeRule], top_k: int = 15, token_budget: int = 0) -> List[CodeRule]:
     """
-    Fuzzy matching UITGESCHAKELD: geef het volledige codeschema door.
-    We houden de functie-naam aan voor compatibiliteit met writers/excel_writer.py.
+    Shortlist van kandidaat-codes voor een rij via de lexicale index van de categorie.
+    Met `top_k` <= 0 en zonder `token_budget` wordt het volledige codeschema doorgegeven.
+    Codes met een verplicht-markering in de instructies zitten altijd in de shortlist.
     """
-    return list(rules)
+    if (top_k <= 0 and token_budget <= 0) or not rules:
+        return list(rules)
+    from logic.retrieval import CandidateIndex  # lokaal i.v.m. circulaire import
+
+    return CandidateIndex.for_rules(rules).shortlist(text, top_k=top_k, token_budget=token_budget)
 
 
 def build_row_text(context: Dict[str, Any]) -> str:
     """
-    Niet gebruikt wanneer fuzzy uit staat; houden we aan voor compatibiliteit.
+    Zoektekst van een rij voor `rank_candidates`: alle gevulde contextwaarden achter elkaar.
     """
-    return ""
+    return " ".join(str(v) for v in context.values() if v is not None and str(v).strip())
 
 
 def pick_code_with_llm(
@@ -37,10 +46,139 @@ def pick_code_with_llm(
     model: str,
     system_prompt: str,
     user_prompt: str,
-    temperature: float = 0.0
+    temperature: float = 0.0,
+    candidates: Optional[List[CodeRule]] = None,
+    response_schema: Optional[Dict[str, Any]] = None,
+    language: str = "nl",
+    report: Optional[RunReport] = None,
+    timings: Optional[StageTimings] = None,
+    first_try: bool = True,
 ) -> ClassificationResult:
-    raw = llm.classify(model=model, system_prompt=system_prompt, user_prompt=user_prompt, temperature=temperature)
-    data = extract_first_json_block(raw) or {}
+    """
+    Classificeer één rij. Met `candidates` wordt de gekozen code gevalideerd; bij een ongeldig
+    antwoord volgt één goedkope reparatie-ronde (vorig antwoord + codelijst, zonder schema en
+    context). Blijft het ongeldig, dan volgt `InvalidAnswer` (de aanroeper valt dan terug).
+    De rij telt één keer mee in `valid_first_try`/`repaired_answers`/`invalid_answers`; met
+    `first_try=False` (los opnieuw na een batch zonder geldig antwoord) telt ook een direct
+    geldig antwoord als hersteld.
+    """
+    with timed(timings, "llm"):
+        raw = llm.classify(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                           temperature=temperature, response_schema=response_schema)
+    with timed(timings, "parse"):
+        result, problem = _validated(extract_first_json_block(raw), candidates)
+    if problem is None:
+        _count(report, "valid_first_try" if first_try else "repaired_answers")
+        return result
+
+    repair_system, repair_user = build_repair_prompt(raw, [problem], candidates or [], language=language)
+    _count(report, "repair_calls")
+    with timed(timings, "llm"):
+        raw = llm.classify(model=model, system_prompt=repair_system, user_prompt=repair_user,
+                           temperature=0.0, response_schema=response_schema)
+    with timed(timings, "parse"):
+        result, problem = _validated(extract_first_json_block(raw), candidates)
+    if problem is None:
+        _count(report, "repaired_answers")
+        return result
+    _count(report, "invalid_answers")
+    raise InvalidAnswer(problem)
+
+
+def pick_codes_with_llm_batch(
+    llm: LLMClient,
+    *,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    n_rows: int,
+    temperature: float = 0.0,
+    candidates: Optional[List[CodeRule]] = None,
+    response_schema: Optional[Dict[str, Any]] = None,
+    language: str = "nl",
+    report: Optional[RunReport] = None,
+    timings: Optional[StageTimings] = None,
+) -> List[Optional[ClassificationResult]]:
+    """
+    Batch-tegenhanger van `pick_code_with_llm`: verwacht een JSON-array met per rij een
+    object met veld `rij` (1-based). Retourneert per rij een resultaat, of None als de rij
+    ontbreekt of onbruikbaar is (die rijen moeten los opnieuw worden geclassificeerd).
+    Rijen met een ongeldige code worden samen in één reparatie-ronde rechtgezet. Net als bij
+    `pick_code_with_llm` tellen de antwoordtellers per rij; rijen die hier None opleveren
+    tellen pas mee bij het losse nieuwe verzoek (`first_try=False`).
+    """
+    with timed(timings, "llm"):
+        raw = llm.classify(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                           temperature=temperature, response_schema=response_schema)
+    with timed(timings, "parse"):
+        entries = _parse_batch(raw, n_rows)
+    results: List[Optional[ClassificationResult]] = [None] * n_rows
+    problems: Dict[int, str] = {}
+    for idx, data in enumerate(entries):
+        if data is None:
+            continue  # ontbreekt: wordt los opnieuw gevraagd
+        result, problem = _validated(data, candidates)
+        if problem is None:
+            results[idx] = result
+        else:
+            problems[idx] = problem
+    _count(report, "valid_first_try", sum(r is not None for r in results))
+    if not problems:
+        return results
+
+    repair_system, repair_user = build_repair_prompt(
+        raw, [f"Rij {idx + 1}: {problem}" for idx, problem in sorted(problems.items())], candidates or [],
+        batch=True, language=language,
+    )
+    _count(report, "repair_calls")
+    with timed(timings, "llm"):
+        raw = llm.classify(model=model, system_prompt=repair_system, user_prompt=repair_user,
+                           temperature=0.0, response_schema=response_schema)
+    with timed(timings, "parse"):
+        repaired = _parse_batch(raw, n_rows)
+    for idx in problems:
+        result, problem = _validated(repaired[idx], candidates) if repaired[idx] is not None else (None, "ontbreekt")
+        results[idx] = result if problem is None else None
+        if problem is None:
+            _count(report, "repaired_answers")
+    return results
+
+
+def _count(report: Optional[RunReport], counter: str, amount: int = 1) -> None:
+    if report is not None and amount:
+        report.add(counter, amount)
+
+
+def _validated(data: Optional[Dict[str, Any]], candidates: Optional[List[CodeRule]]) -> Tuple[ClassificationResult, Optional[str]]:
+    """Resultaat uit een geparst antwoord plus het probleem (None = geldig) na validatie van de code."""
+    if not isinstance(data, dict):
+        return ClassificationResult(None, None, None, 0.0), "antwoord bevat geen geldig JSON-object"
+    result = _result_from_dict(data)
+    if candidates is None:  # alleen controleren dat er een code is
+        code_ok = isinstance(result.code, str) and bool(result.code.strip())
+        return result, None if code_ok else "veld 'code' ontbreekt of is leeg"
+    code, problem = validate_code(result.code, (r.code for r in candidates))
+    result.code = code
+    return result, problem
+
+
+def _parse_batch(raw: str, n_rows: int) -> List[Optional[Dict[str, Any]]]:
+    """Per rij het eerste object uit het antwoord met die `rij` (None = ontbreekt)."""
+    entries = extract_json_array(raw) or []
+    found: List[Optional[Dict[str, Any]]] = [None] * n_rows
+    for pos, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.get("rij", pos + 1)) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < n_rows and found[idx] is None:
+            found[idx] = entry
+    return found
+
+
+def _result_from_dict(data: Dict[str, Any]) -> ClassificationResult:
     code = data.get("code")
     arg = data.get("argumentatie")
     vraag = data.get("vraag")
@@ -67,36 +205,9 @@ def simple_rules_fallback(context: Dict[str, Any], rules: List[CodeRule]) -> Cla
     """
     Eenvoudige offline fallback blijft beschikbaar voor demo/no-API situaties.
     (Geen fuzzy; alleen zeer simpele token-overlap.)
+    Gebruikt de per schema gedeelde `OfflineIndex`; voor hele bladen is
+    `OfflineIndex.classify_many` veel sneller dan deze functie per rij.
     """
-    text = " ".join(str(v).lower() for v in context.values() if v is not None)
-    best: Optional[Tuple[CodeRule, int]] = None
-
-    for r in rules:
-        score = 0
-        for token in (r.name or "").lower().split():
-            if token and token in text:
-                score += 1
-        for token in (r.description or "").lower().split():
-            if token and token in text:
-                score += 1
-        for token in (r.instructions or "").lower().split():
-            if token and token in text:
-                score += 1
-        if best is None or score > best[1]:
-            best = (r, score)
-
-    if best and best[1] > 0:
-        r = best[0]
-        return ClassificationResult(
-            code=r.code,
-            argumentatie=f"Gekozen op basis van overeenkomende termen met '{r.name}'.",
-            vraag=None,
-            confidence=0.3,
-        )
-
-    return ClassificationResult(
-        code=None,
-        argumentatie="Onvoldoende context om een code te kiezen.",
-        vraag="Kunt u toelichten welke code het beste past volgens uw interne rubricering?",
-        confidence=0.0,
-    )
+    from logic.offline_index import OfflineIndex  # lokaal i.v.m. circulaire import
+
+    return OfflineIndex.for_rules(rules).classify(context)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+def normalise_value(value: Any) -> str:
+    """Normaliseer een celwaarde voor vergelijking (hoofdletters, witruimte, 4000.0 == 4000)."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return " ".join(str(value).split()).lower()
+
+
+def resolve_key_columns(headers: Sequence[str], key_columns: Sequence[str]) -> List[str]:
+    """Zoek de geconfigureerde sleutelkolommen (hoofdletterongevoelig) op in de headers van het blad."""
+    by_lc = {h.strip().lower(): h for h in headers}
+    return [by_lc[k.strip().lower()] for k in key_columns if k.strip().lower() in by_lc]
+
+
+def row_key(context: Dict[str, Any], key_columns: Sequence[str]) -> Tuple[str, ...]:
+    """
+    Classificatiesleutel van een rij. Zonder (gevulde) sleutelkolommen telt de volledige
+    context, zodat alleen exact gelijke rijen worden samengevoegd.
+    """
+    if key_columns:
+        key = tuple(normalise_value(context.get(c)) for c in key_columns)
+        if any(key):
+            return key
+    return tuple(f"{k}={normalise_value(v)}" for k, v in context.items())
+
+
+def group_rows(contexts: Sequence[Dict[str, Any]], key_columns: Sequence[str]) -> List[List[int]]:
+    """
+    Groepeer rijen met een gelijke classificatiesleutel.
+    Retourneert per groep de indexen in `contexts`; de eerste index is de representant.
+    """
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for i, context in enumerate(contexts):
+        groups.setdefault(row_key(context, key_columns), []).append(i)
+    return list(groups.values())
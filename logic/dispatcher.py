@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from llm_providers.resilience import is_rate_limit_error, retry_after_seconds
+from utils.progress import RunCancelled
+from utils.timing import profile_worker_initializer
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AdaptiveLimiter:
+    """
+    Begrenst het aantal gelijktijdige calls (AIMD):
+    - bij een 429 wordt de limiet gehalveerd;
+    - na een reeks geslaagde calls groeit de limiet weer met 1, tot het maximum.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.limit = self.max_concurrency
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_concurrency and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+def dispatch_concurrent(
+    items: Sequence[T],
+    call: Callable[[T], R],
+    fallback: Callable[[T, BaseException], R],
+    *,
+    max_concurrency: int = 4,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_retry: Optional[Callable[[BaseException], None]] = None,
+) -> List[R]:
+    """
+    Voert `call` uit voor alle items via een begrensde thread-pool en retourneert
+    de resultaten in dezelfde volgorde als `items`.
+
+    - Rate-limits (429) verlagen de concurrency en worden met backoff opnieuw geprobeerd
+      (`on_retry(fout)` per nieuwe poging); een Retry-After van de server wordt altijd
+      uitgewacht, met jitter erbovenop.
+    - Elke andere fout (of te veel 429's) levert per item `fallback(item, fout)` op.
+    - Zodra `should_stop()` True geeft, worden geen nieuwe calls meer gestart (ook niet na een
+      lopende backoff) en volgt `RunCancelled` (calls die al lopen worden afgemaakt).
+    """
+    if not items:
+        return []
+
+    limiter = AdaptiveLimiter(max_concurrency)
+
+    def run(item: T) -> R:
+        attempt = 0
+        while True:
+            if should_stop is not None and should_stop():
+                raise RunCancelled()
+            limiter.acquire()
+            try:
+                result = call(item)
+            except Exception as exc:
+                limiter.release()
+                if is_rate_limit_error(exc) and attempt < max_retries:
+                    limiter.on_rate_limit()
+                    if on_retry is not None:
+                        on_retry(exc)
+                    delay = retry_after_seconds(exc)
+                    if delay is None:
+                        delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+                    else:
+                        delay += random.random() * base_delay  # nooit vóór de Retry-After van de server
+                    deadline = time.monotonic() + delay
+                    while time.monotonic() < deadline:  # in korte stukken: annuleren wacht niet op de backoff
+                        if should_stop is not None and should_stop():
+                            raise RunCancelled()
+                        time.sleep(max(0.0, min(0.5, deadline - time.monotonic())))
+                    attempt += 1
+                    continue
+                return fallback(item, exc)
+            limiter.release()
+            limiter.on_success()
+            return result
+
+    if limiter.max_concurrency == 1:
+        return [run(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=limiter.max_concurrency, initializer=profile_worker_initializer()) as pool:
+        return list(pool.map(run, items))
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import BATCH_PRICE_FACTOR, COMPLETION_TOKENS_PER_ROW, ESTIMATED_SECONDS_PER_CALL, MODEL_PRICING_USD_PER_1M
+from utils.tokens import has_exact_tokenizer
+
+
+def model_pricing(model: str) -> Optional[Tuple[float, float]]:
+    """Prijs (invoer, uitvoer) in USD per 1M tokens volgens het langste passende voorvoegsel; None = onbekend."""
+    name = model.strip().lower()
+    matches = [prefix for prefix in MODEL_PRICING_USD_PER_1M if name.startswith(prefix)]
+    return MODEL_PRICING_USD_PER_1M[max(matches, key=len)] if matches else None
+
+
+@dataclass
+class SheetEstimate:
+    sheet: str
+    rows: int            # rijen die nog geclassificeerd moeten worden (excl. hervatte/overgeslagen rijen)
+    unique_rows: int     # na ontdubbelen
+    calls: int           # LLM-calls (unieke rijen / batchgrootte)
+    input_tokens: int    # system- + gebruikersprompts van alle calls
+    output_tokens: int   # aanname: `COMPLETION_TOKENS_PER_ROW` per unieke rij
+
+
+class RunEstimate:
+    """
+    Raming van tokens, kosten en looptijd van een volledige run; wordt door `process_workbook`
+    per tabblad gevuld met de prompts zoals ze verstuurd zouden worden. Tokens worden met
+    tiktoken geteld (`exact`), of geschat als de tokenizer niet beschikbaar is.
+    Hervatte rijen van een eerdere run tellen niet mee; cache-hits zijn niet afgetrokken en de
+    coderingen van het bestand zelf worden bij de raming niet geleerd (mapping-store, lokaal
+    model): een bovengrens.
+    Met `batch=True` gelden de prijzen van het batch-endpoint (`BATCH_PRICE_FACTOR`).
+    """
+
+    def __init__(self, model: str, batch: bool = False) -> None:
+        self.model = model
+        self.batch = batch
+        self.exact = has_exact_tokenizer(model)
+        self.sheets: List[SheetEstimate] = []
+        self._lock = threading.Lock()
+
+    def add_sheet(self, sheet: str, *, rows: int, unique_rows: int, calls: int, input_tokens: int) -> None:
+        with self._lock:
+            self.sheets.append(SheetEstimate(sheet, rows, unique_rows, calls, input_tokens,
+                                             unique_rows * COMPLETION_TOKENS_PER_ROW))
+
+    def _total(self, key: str) -> int:
+        with self._lock:
+            return sum(getattr(s, key) for s in self.sheets)
+
+    @property
+    def rows(self) -> int:
+        return self._total("rows")
+
+    @property
+    def unique_rows(self) -> int:
+        return self._total("unique_rows")
+
+    @property
+    def calls(self) -> int:
+        return self._total("calls")
+
+    @property
+    def input_tokens(self) -> int:
+        return self._total("input_tokens")
+
+    @property
+    def output_tokens(self) -> int:
+        return self._total("output_tokens")
+
+    @property
+    def cost_usd(self) -> Optional[float]:
+        """Geraamde API-kosten in USD (None = geen prijs bekend voor dit model)."""
+        pricing = model_pricing(self.model)
+        if pricing is None:
+            return None
+        cost = (self.input_tokens * pricing[0] + self.output_tokens * pricing[1]) / 1_000_000
+        return cost * BATCH_PRICE_FACTOR if self.batch else cost
+
+    def runtime_seconds(self, concurrency: int, seconds_per_call: Optional[float] = None) -> float:
+        """Geraamde looptijd van de LLM-calls bij `concurrency` gelijktijdige calls."""
+        per_call = seconds_per_call if seconds_per_call else ESTIMATED_SECONDS_PER_CALL
+        return math.ceil(self.calls / max(1, concurrency)) * per_call
+
+    def as_dict(self, concurrency: int = 1, seconds_per_call: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "model": self.model, "batch": self.batch, "exact_tokens": self.exact, "rows": self.rows,
+            "unique_rows": self.unique_rows, "calls": self.calls, "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+            "cost_usd": self.cost_usd, "runtime_seconds": self.runtime_seconds(concurrency, seconds_per_call),
+            "sheets": [asdict(s) for s in list(self.sheets)],
+        }
+
+
+def measured_seconds_per_call(llm_seconds: float, llm_calls: int, cache_hits: int) -> Optional[float]:
+    """
+    Gemeten duur per LLM-call uit een steekproef; None als er niets (zuiver) te meten viel,
+    bijv. omdat een deel van de antwoorden uit de cache kwam.
+    """
+    if llm_calls <= 0 or cache_hits > 0 or llm_seconds <= 0:
+        return None
+    return llm_seconds / llm_calls
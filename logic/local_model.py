@@ -0,0 +1,273 @@
+"""
+Lokaal geleerd model per categorie: multinomiale logistische regressie (NumPy, alleen CPU)
+op gehashte bag-of-words-kenmerken van de rijcontext. Het leert van de coderingen die al in
+de klantbestanden staan (`LABEL_COLUMNS`), onthoudt de voorbeelden tussen runs en traint bij
+nieuwe voorbeelden verder vanaf de vorige gewichten. Voorspellingen met een gekalibreerde
+kans vanaf `LOCAL_MODEL_MIN_CONFIDENCE` worden direct overgenomen; de rest gaat naar het LLM.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import (
+    CACHE_DIR,
+    LABEL_COLUMNS,
+    LOCAL_MODEL_MAX_EXAMPLES,
+    LOCAL_MODEL_MIN_CONFIDENCE,
+    LOCAL_MODEL_MIN_EXAMPLES,
+)
+from loaders.schema_loader import CodeRule
+from logic.classifier import ClassificationResult
+from logic.structured_output import validate_code
+from utils.files import atomic_write_bytes
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_LABEL_KEYS = [c.strip().lower() for c in LABEL_COLUMNS]
+_FEATURES = 2 ** 14          # aantal hash-buckets
+_BIAS = 0                    # bucket die elke rij heeft (intercept)
+_MAX_VALUE_LEN = 60          # hele celwaarden tot deze lengte worden ook als kenmerk gebruikt
+_EPOCHS = 10                 # eerste training; daarna (warme start) minder
+_WARM_EPOCHS = 4
+_BATCH = 256
+_LEARNING_RATE = 10.0
+_L2 = 1e-6
+_HOLDOUT = 5                 # elk 5e voorbeeld (op hash) kalibreert de kansen
+
+_MODELS: "OrderedDict[str, LocalModel]" = OrderedDict()
+_MODELS_SIZE = 8
+_MODELS_LOCK = threading.Lock()
+
+Example = Tuple[np.ndarray, str]  # (kenmerk-buckets, code)
+
+
+def features(context: Dict[str, Any]) -> np.ndarray:
+    """
+    Gesorteerde hash-buckets van een rij: woorden en woordparen uit alle contextkolommen,
+    plus korte celwaarden als geheel per kolom (bijv. het grootboeknummer). Labelkolommen
+    doen niet mee.
+    """
+    keys = set()
+    for column, value in context.items():
+        col = column.strip().lower()
+        if value is None or col in _LABEL_KEYS:
+            continue
+        text = str(value).strip().lower()
+        if not text:
+            continue
+        words = _WORD_RE.findall(text)
+        keys.update(words)
+        keys.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        if len(text) <= _MAX_VALUE_LEN:
+            keys.add(f"{col}={text}")
+    buckets = {_BIAS}
+    buckets.update(1 + zlib.crc32(k.encode("utf-8")) % (_FEATURES - 1) for k in keys)
+    return np.array(sorted(buckets), dtype=np.int64)
+
+
+def label_of(context: Dict[str, Any], codes: Sequence[str]) -> Optional[str]:
+    """Geldige code uit de labelkolommen van een rij (eerst 'definitief', dan 'concept', ...)."""
+    by_key = {k.strip().lower(): v for k, v in context.items()}
+    for key in _LABEL_KEYS:
+        value = by_key.get(key)
+        if value is not None and str(value).strip():
+            code, _ = validate_code(str(value), codes)
+            if code is not None:
+                return code
+    return None
+
+
+class LocalModel:
+    """
+    Model van één categorie, gedeeld binnen het proces en bewaard in `CACHE_DIR/local_models`.
+    `learn` voegt voorbeelden toe en traint opnieuw als er iets nieuws bij zat; `predict`
+    geeft alleen zekere voorspellingen. Kalibratie: temperature scaling op een vaste
+    holdout van de voorbeelden, waarop ook precisie en dekking bij de drempel worden gemeten.
+    """
+
+    def __init__(self, category: str, path: Optional[str] = None):
+        self.category = category
+        self.path = path
+        self.examples: "OrderedDict[str, Example]" = OrderedDict()  # digest van de kenmerken -> voorbeeld
+        self.classes: List[str] = []
+        self.weights: Optional[np.ndarray] = None  # buckets x klassen
+        self.temperature = 1.0
+        self.holdout_precision: Optional[float] = None
+        self.holdout_coverage: Optional[float] = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except (OSError, ValueError, KeyError):
+                self.examples.clear()  # beschadigd of verouderd bestand: opnieuw beginnen
+
+    @classmethod
+    def for_category(cls, category: str, directory: str = CACHE_DIR) -> "LocalModel":
+        safe = re.sub(r"[^\w-]+", "_", category)
+        path = os.path.join(directory, "local_models", f"{safe}.npz")
+        with _MODELS_LOCK:
+            model = _MODELS.get(path)
+            if model is None:
+                model = _MODELS[path] = cls(category, path)
+            _MODELS.move_to_end(path)
+            while len(_MODELS) > _MODELS_SIZE:
+                _MODELS.popitem(last=False)
+        return model
+
+    @property
+    def ready(self) -> bool:
+        return self.weights is not None
+
+    def learn(self, contexts: Sequence[Dict[str, Any]], rules: Sequence[CodeRule]) -> int:
+        """Leer van de rijen met een geldige code in een labelkolom; retourneert het aantal nieuwe voorbeelden."""
+        codes = [r.code for r in rules]
+        found: List[Example] = []
+        for context in contexts:
+            code = label_of(context, codes)
+            if code is not None:
+                found.append((features(context), code))
+        if not found:
+            return 0
+        with self._lock:
+            added = 0
+            for feats, code in found:
+                key = hashlib.sha1(feats.tobytes()).hexdigest()
+                previous = self.examples.pop(key, None)
+                self.examples[key] = (feats, code)  # nieuwste label telt (bijv. concept -> definitief)
+                added += previous is None or previous[1] != code
+            while len(self.examples) > LOCAL_MODEL_MAX_EXAMPLES:
+                self.examples.popitem(last=False)
+            if added:
+                self._train()
+                if self.path:
+                    self._save(self.path)
+        return added
+
+    def predict(self, contexts: Sequence[Dict[str, Any]], rules: Sequence[CodeRule]) -> List[Optional[ClassificationResult]]:
+        """Per rij een resultaat als het model zeker genoeg is (en de code in het schema staat), anders None."""
+        weights, classes, temperature = self.weights, self.classes, self.temperature
+        if weights is None or not contexts:
+            return [None] * len(contexts)
+        valid = {r.code for r in rules}
+        best: List[int] = []
+        sure: List[float] = []
+        for start in range(0, len(contexts), _BATCH):
+            probs = _softmax(_logits(weights, [features(c) for c in contexts[start:start + _BATCH]]) / temperature)
+            best.extend(probs.argmax(axis=1).tolist())
+            sure.extend(probs.max(axis=1).tolist())
+        n = len(self.examples)
+        out: List[Optional[ClassificationResult]] = []
+        for k, p in zip(best, sure):
+            if p < LOCAL_MODEL_MIN_CONFIDENCE or classes[k] not in valid:
+                out.append(None)
+                continue
+            out.append(ClassificationResult(
+                code=classes[k],
+                argumentatie=f"Lokaal model (getraind op {n} bestaande coderingen): zekerheid {p:.0%}.",
+                vraag=None,
+                confidence=p,
+            ))
+        return out
+
+    def _train(self) -> None:
+        keys = list(self.examples)
+        classes = sorted({code for _, code in self.examples.values()})
+        if len(keys) < LOCAL_MODEL_MIN_EXAMPLES or len(classes) < 2:
+            self.weights = None
+            return
+        # Warme start: gewichten van bekende klassen overnemen
+        weights = np.zeros((_FEATURES, len(classes)), dtype=np.float32)
+        warm = self.weights is not None
+        if warm:
+            old = {c: j for j, c in enumerate(self.classes)}
+            for j, c in enumerate(classes):
+                if c in old:
+                    weights[:, j] = self.weights[:, old[c]]
+        column = {c: j for j, c in enumerate(classes)}
+        holdout = [k for k in keys if int(k[:8], 16) % _HOLDOUT == 0]
+        train = [k for k in keys if int(k[:8], 16) % _HOLDOUT != 0] or keys
+        X = [self.examples[k][0] for k in train]
+        y = np.array([column[self.examples[k][1]] for k in train], dtype=np.int64)
+
+        rng = np.random.default_rng(len(keys))
+        for epoch in range(_WARM_EPOCHS if warm else _EPOCHS):
+            order = rng.permutation(len(X))
+            rate = _LEARNING_RATE / (1 + epoch)
+            for start in range(0, len(order), _BATCH):
+                batch = order[start:start + _BATCH]
+                rows = [X[i] for i in batch]
+                probs = _softmax(_logits(weights, rows))
+                probs[np.arange(len(batch)), y[batch]] -= 1.0  # gradiënt van de cross-entropy
+                idx = np.concatenate(rows)
+                owner = np.repeat(np.arange(len(rows)), [len(r) for r in rows])
+                np.add.at(weights, idx, (-rate / len(batch)) * probs[owner])
+                weights[idx] *= 1 - rate * _L2
+        self.weights, self.classes = weights, classes
+        self._calibrate([self.examples[k] for k in holdout])
+
+    def _calibrate(self, holdout: List[Example]) -> None:
+        """Temperature scaling op de holdout (minimale log-loss), plus precisie/dekking bij de drempel."""
+        self.temperature, self.holdout_precision, self.holdout_coverage = 1.0, None, None
+        column = {c: j for j, c in enumerate(self.classes)}
+        holdout = [(f, c) for f, c in holdout if c in column]
+        if not holdout:
+            return
+        logits = _logits(self.weights, [f for f, _ in holdout])
+        y = np.array([column[c] for _, c in holdout])
+        best_loss = None
+        for t in np.geomspace(0.05, 4.0, 40):
+            probs = _softmax(logits / t)
+            loss = -np.log(probs[np.arange(len(y)), y] + 1e-12).mean()
+            if best_loss is None or loss < best_loss:
+                best_loss, self.temperature = loss, float(t)
+        probs = _softmax(logits / self.temperature)
+        sure = probs.max(axis=1) >= LOCAL_MODEL_MIN_CONFIDENCE
+        self.holdout_coverage = float(sure.mean())
+        if sure.any():
+            self.holdout_precision = float((probs.argmax(axis=1)[sure] == y[sure]).mean())
+
+    def _save(self, path: str) -> None:
+        feats = [f for f, _ in self.examples.values()]
+        buf = BytesIO()
+        np.savez_compressed(
+            buf,
+            features=np.concatenate(feats) if feats else np.zeros(0, dtype=np.int64),
+            lengths=np.array([len(f) for f in feats], dtype=np.int64),
+            labels=np.array([c for _, c in self.examples.values()], dtype=str),
+            classes=np.array(self.classes, dtype=str),
+            weights=self.weights if self.weights is not None else np.zeros((0, 0), dtype=np.float32),
+        )
+        atomic_write_bytes(path, buf.getvalue())
+
+    def _load(self, path: str) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            offsets = np.cumsum(data["lengths"])[:-1]
+            for feats, code in zip(np.split(data["features"], offsets), data["labels"].tolist()):
+                if len(feats):
+                    self.examples[hashlib.sha1(feats.tobytes()).hexdigest()] = (feats, code)
+            self.classes = data["classes"].tolist()
+            weights = data["weights"]
+            self.weights = weights if weights.shape == (_FEATURES, len(self.classes)) and self.classes else None
+        if self.weights is not None:
+            # Kalibratie opnieuw meten (de holdout volgt uit de voorbeelden)
+            self._calibrate([ex for k, ex in self.examples.items() if int(k[:8], 16) % _HOLDOUT == 0])
+
+
+def _logits(weights: np.ndarray, rows: List[np.ndarray]) -> np.ndarray:
+    """Som van de gewichten van de buckets per rij (elke rij heeft minstens de bias-bucket)."""
+    idx = np.concatenate(rows)
+    starts = np.concatenate(([0], np.cumsum([len(r) for r in rows])[:-1]))
+    return np.add.reduceat(weights[idx], starts, axis=0)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    z = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return z / z.sum(axis=1, keepdims=True)
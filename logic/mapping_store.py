@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import APPROVED_CODE_COLUMN, MAPPING_KEY_COLUMNS
+from loaders.schema_loader import CodeRule
+from logic.classifier import ClassificationResult
+from logic.structured_output import validate_code
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# (omschrijving, grootboekrekening) na normalisatie; grootboek "" = onbekend of n.v.t.
+MappingKey = Tuple[str, str]
+
+
+def normalise_text(value: Any) -> str:
+    """Omschrijving voor de sleutel: kleine letters, alleen woorden ('Huur - gebouwen' == 'huur gebouwen')."""
+    if value is None:
+        return ""
+    return " ".join(_WORD_RE.findall(str(value).lower()))
+
+
+def normalise_ledger(value: Any) -> str:
+    """Grootboekrekening voor de sleutel: 4000.0 == '4000' == ' 4000 '."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "".join(str(value).split()).lower()
+
+
+class MappingStore:
+    """
+    Gedeelde SQLite-store van goedgekeurde coderingen, gevuld uit de kolom 'Codering definitief'
+    van verwerkte klantbestanden. Sleutel: (categorie, genormaliseerde omschrijving of
+    functienaam, genormaliseerde grootboekrekening). Een opzoeking probeert eerst de volledige
+    sleutel en daarna alleen de omschrijving, als alle goedgekeurde codes daarvoor gelijk zijn
+    (grootboeknummers verschillen per klant). Veilig te delen tussen threads en processen (WAL).
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "mappings.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS mappings ("
+                " category TEXT NOT NULL, description TEXT NOT NULL, ledger TEXT NOT NULL,"
+                " code TEXT NOT NULL, source TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (category, description, ledger))"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def key_of(category: str, context: Dict[str, Any]) -> Optional[MappingKey]:
+        """Sleutel van een rij (None als de omschrijving ontbreekt)."""
+        description_col, ledger_col = MAPPING_KEY_COLUMNS.get(category, (None, None))
+        if description_col is None:
+            return None
+        by_key = {k.strip().lower(): v for k, v in context.items()}
+        description = normalise_text(by_key.get(description_col.lower()))
+        if not description:
+            return None
+        ledger = normalise_ledger(by_key.get(ledger_col.lower())) if ledger_col else ""
+        return description, ledger
+
+    def learn(self, category: str, contexts: Sequence[Dict[str, Any]], rules: Sequence[CodeRule], *, source: str) -> int:
+        """
+        Neem de geldige codes uit 'Codering definitief' van `contexts` op (de laatste telt);
+        retourneert het aantal nieuwe of gewijzigde sleutels.
+        """
+        codes = [r.code for r in rules]
+        column = APPROVED_CODE_COLUMN.strip().lower()
+        entries: Dict[MappingKey, str] = {}
+        for context in contexts:
+            value = next((v for k, v in context.items() if k.strip().lower() == column), None)
+            if value is None or not str(value).strip():
+                continue
+            code, _ = validate_code(str(value), codes)
+            key = self.key_of(category, context)
+            if code is not None and key is not None:
+                entries[key] = code
+        if not entries:
+            return 0
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT INTO mappings (category, description, ledger, code, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (category, description, ledger) DO UPDATE SET"
+                " code = excluded.code, source = excluded.source, updated_at = excluded.updated_at"
+                " WHERE mappings.code != excluded.code",
+                [(category, d, l, code, source, now) for (d, l), code in entries.items()],
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def lookup(self, category: str, contexts: Sequence[Dict[str, Any]], rules: Sequence[CodeRule]) -> List[Optional[ClassificationResult]]:
+        """Per rij het overgenomen resultaat (met bronvermelding) of None; codes buiten het schema tellen niet."""
+        valid = {r.code for r in rules}
+        out: List[Optional[ClassificationResult]] = []
+        with self._lock:
+            for context in contexts:
+                key = self.key_of(category, context)
+                found = self._find(category, key) if key is not None else None
+                if found is None or found[0] not in valid:
+                    out.append(None)
+                    continue
+                code, source, exact = found
+                via = f"omschrijving '{key[0]}'" + (f" en grootboekrekening {key[1]}" if exact and key[1] else "")
+                out.append(ClassificationResult(
+                    code=code,
+                    argumentatie=f"Overgenomen uit de goedgekeurde codering ('{APPROVED_CODE_COLUMN}') in {source}, op basis van {via}.",
+                    vraag=None,
+                    confidence=1.0,
+                ))
+        return out
+
+    def _find(self, category: str, key: MappingKey) -> Optional[Tuple[str, str, bool]]:
+        """(code, bron, exacte sleutel?) via de primaire-sleutelindex."""
+        row = self._conn.execute(
+            "SELECT code, source FROM mappings WHERE category = ? AND description = ? AND ledger = ?",
+            (category, key[0], key[1]),
+        ).fetchone()
+        if row is not None:
+            return row[0], row[1], True
+        rows = self._conn.execute(
+            "SELECT code, source FROM mappings WHERE category = ? AND description = ? ORDER BY updated_at DESC",
+            (category, key[0]),
+        ).fetchall()
+        if rows and len({code for code, _ in rows}) == 1:
+            return rows[0][0], rows[0][1], False
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
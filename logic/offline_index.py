@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from loaders.schema_loader import CodeRule, schema_fingerprint
+from logic.classifier import ClassificationResult
+
+_CHUNK_ROWS = 4096
+_WORD_CACHE_SIZE = 65536  # unieke woorden per index waarvan de gevonden termen bewaard blijven
+_INDEX_CACHE: "OrderedDict[str, OfflineIndex]" = OrderedDict()
+_INDEX_CACHE_SIZE = 16
+_INDEX_LOCK = threading.Lock()
+
+
+def row_text(context: Dict[str, Any]) -> str:
+    return " ".join(str(v).lower() for v in context.values() if v is not None)
+
+
+class OfflineIndex:
+    """
+    Offline scorer voor één categorie, eenmalig opgebouwd uit de `CodeRule`-lijst.
+
+    Score van een code = aantal termen uit naam, beschrijving en instructies (met herhaling)
+    dat als substring in de rijtekst voorkomt; gelijk aan de oorspronkelijke heuristiek.
+    Omdat termen geen witruimte bevatten, volstaat het om per uniek woord van de rijtekst
+    eenmalig te bepalen welke termen erin voorkomen (begrensde LRU). De gewichten staan
+    ijl per term (CSR: codes en aantallen); per blok rijen worden de (rij, code)-gewichten van
+    alle gevonden termen met één `np.bincount` opgeteld, zonder dichte rijen x termen-matrix.
+    """
+
+    def __init__(self, rules: Sequence[CodeRule]):
+        self.rules: List[CodeRule] = list(rules)
+        self.vocab: Dict[str, int] = {}
+        entries: List[Tuple[int, int]] = []
+        for ri, r in enumerate(self.rules):
+            for field in (r.name, r.description, r.instructions):
+                for token in (field or "").lower().split():
+                    entries.append((ri, self.vocab.setdefault(token, len(self.vocab))))
+
+        # Per term de codes waarin hij voorkomt, met het aantal keer (CSR over de termen)
+        counts: Dict[Tuple[int, int], int] = {}
+        for ri, ti in entries:
+            counts[(ti, ri)] = counts.get((ti, ri), 0) + 1
+        pairs = sorted(counts)
+        self._term_ptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.add.at(self._term_ptr, np.array([ti + 1 for ti, _ in pairs], dtype=np.int64), 1)
+        np.cumsum(self._term_ptr, out=self._term_ptr)
+        self._term_codes = np.array([ri for _, ri in pairs], dtype=np.int64)
+        self._term_weights = np.array([counts[p] for p in pairs], dtype=np.float32)
+        self._lengths = sorted({len(t) for t in self.vocab})
+        self._terms_in_word = lru_cache(maxsize=_WORD_CACHE_SIZE)(self._find_terms)
+
+    @classmethod
+    def for_rules(cls, rules: Sequence[CodeRule]) -> "OfflineIndex":
+        """Gedeelde index per schema-hash (kleine LRU)."""
+        key = schema_fingerprint(list(rules))
+        with _INDEX_LOCK:
+            index = _INDEX_CACHE.get(key)
+            if index is not None:
+                _INDEX_CACHE.move_to_end(key)
+                return index
+        index = cls(rules)
+        with _INDEX_LOCK:
+            _INDEX_CACHE[key] = index
+            while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+                _INDEX_CACHE.popitem(last=False)
+        return index
+
+    def _find_terms(self, word: str) -> Tuple[int, ...]:
+        found = set()
+        n = len(word)
+        for length in self._lengths:
+            if length > n:
+                break
+            for start in range(n - length + 1):
+                ti = self.vocab.get(word[start:start + length])
+                if ti is not None:
+                    found.add(ti)
+        return tuple(found)
+
+    def matched_terms(self, context: Dict[str, Any]) -> List[int]:
+        found = set()
+        for word in set(row_text(context).split()):
+            found.update(self._terms_in_word(word))
+        return list(found)
+
+    def score(self, contexts: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Scorematrix (rijen x codes) voor alle contexten in één keer (per blok van rijen)."""
+        scores = np.zeros((len(contexts), len(self.rules)), dtype=np.float32)
+        if not self.vocab or not self.rules:
+            return scores
+        n_codes = len(self.rules)
+        for start in range(0, len(contexts), _CHUNK_ROWS):
+            chunk = contexts[start:start + _CHUNK_ROWS]
+            rows: List[int] = []
+            terms: List[int] = []
+            for i, context in enumerate(chunk):
+                matched = self.matched_terms(context)
+                rows.extend([i] * len(matched))
+                terms.extend(matched)
+            if not terms:
+                continue
+            # Alle (rij, term)-paren uitvouwen naar de (rij, code)-gewichten van die term
+            term_idx = np.array(terms, dtype=np.int64)
+            begin = self._term_ptr[term_idx]
+            lengths = self._term_ptr[term_idx + 1] - begin
+            offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            entries = np.repeat(begin, lengths) + offsets
+            flat = np.repeat(np.array(rows, dtype=np.int64), lengths) * n_codes + self._term_codes[entries]
+            summed = np.bincount(flat, weights=self._term_weights[entries], minlength=len(chunk) * n_codes)
+            scores[start:start + len(chunk)] = summed.reshape(len(chunk), n_codes)
+        return scores
+
+    def classify_many(self, contexts: Sequence[Dict[str, Any]]) -> List[ClassificationResult]:
+        scores = self.score(contexts)
+        if not self.rules:
+            return [_no_match() for _ in contexts]
+        best = scores.argmax(axis=1)  # eerste maximum, net als de oorspronkelijke lus
+        best_scores = scores[np.arange(len(contexts)), best]
+        return [
+            _match(self.rules[b]) if s > 0 else _no_match()
+            for b, s in zip(best.tolist(), best_scores.tolist())
+        ]
+
+    def classify(self, context: Dict[str, Any]) -> ClassificationResult:
+        return self.classify_many([context])[0]
+
+
+def _match(r: CodeRule) -> ClassificationResult:
+    return ClassificationResult(
+        code=r.code,
+        argumentatie=f"Gekozen op basis van overeenkomende termen met '{r.name}'.",
+        vraag=None,
+        confidence=0.3,
+    )
+
+
+def _no_match() -> ClassificationResult:
+    return ClassificationResult(
+        code=None,
+        argumentatie="Onvoldoende context om een code te kiezen.",
+        vraag="Kunt u toelichten welke code het beste past volgens uw interne rubricering?",
+        confidence=0.0,
+    )
@@ -1,14 +1,22 @@
 from __future__ import annotations
 
-from typing import List, Dict
-from loaders.schema_loader import CodeRule
+from typing import Any, List, Dict, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from loaders.schema_loader import CodeRule, schema_fingerprint
 import textwrap
 
+# Gecompileerde system-prompts per (taal, categorie, batch, schema-hash)
+_COMPILED_PROMPTS: Dict[Tuple[str, str, bool, str], str] = {}
 
-def build_system_prompt(language: str = "nl") -> str:
+
+def build_system_prompt(language: str = "nl", batch: bool = False) -> str:
     """
     Bouwt de system-prompt die de LLM strak kadert.
+    Met `batch=True` wordt per genummerde rij één JSON-object in een array gevraagd.
     """
+    if batch:
+        return _build_batch_system_prompt(language)
     if language == "nl":
         return textwrap.dedent(
             """
@@ -45,47 +53,240 @@ def build_system_prompt(language: str = "nl") -> str:
         ).strip()
 
 
-def build_user_prompt(row_context: Dict[str, str], candidates: List[CodeRule], category: str) -> str:
-    """
-    Gebruikersprompt: compacte rijcontext + shortlist met kandidaat-codes.
-    """
-    # Compacte context
+def _build_batch_system_prompt(language: str) -> str:
+    if language == "nl":
+        return textwrap.dedent(
+            """
+            Je bent een nauwkeurige data-analist die regels toepast voor het coderen van
+            formatie (PIL), kosten en opbrengsten in de zorg (VVT, GGZ, GHZ).
+            Je volgt het codeschema strikt en motiveert elke keuze kort en bondig (maximaal 2 zinnen).
+            Als informatie ontbreekt of het schema dat vraagt, geef je per rij ÉÉN verduidelijkende vraag.
+
+            Je krijgt meerdere genummerde rijen. Antwoord ALTIJD met een JSON-array met
+            exact één object per rij, in deze vorm:
+            [
+              {
+                "rij": <rijnummer>,
+                "code": "<exacte code uit lijst>",
+                "argumentatie": "<max 2 zinnen>",
+                "vraag": null of "<één vraag>",
+                "confidence": <getal tussen 0 en 1>
+              }
+            ]
+            """
+        ).strip()
+    else:
+        return textwrap.dedent(
+            """
+            You are a meticulous analyst applying a coding scheme for staffing (PIL),
+            costs, and revenues in Dutch healthcare (VVT, GGZ, GHZ).
+            Follow the scheme strictly. Provide a concise rationale per row (max 2 sentences).
+            If information is missing or the scheme requires it, include ONE clarifying question per row.
+
+            You receive several numbered rows. ALWAYS answer with a JSON array containing
+            exactly one object per row, in this shape:
+            [
+              {
+                "rij": <row number>,
+                "code": "<exact code from list>",
+                "argumentatie": "<max 2 sentences>",
+                "vraag": null or "<one question>",
+                "confidence": <number between 0 and 1>
+              }
+            ]
+            """
+        ).strip()
+
+
+_CONTEXT_VALUE_LEN = 300
+_NO_CONTEXT = "- (geen contextwaarden gevonden)"
+_NUMERIC_KINDS = ("integer", "floating", "mixed-integer-float", "decimal", "boolean")  # `infer_dtype`
+
+
+# Rijcontext als dict (kolom -> waarde) of als al gerenderd blok (zie `render_context_blocks`)
+RowContext = Union[Dict[str, Any], str]
+
+
+def _context_block(row_context: RowContext) -> str:
+    """Compacte context: één regel per gevulde kolom, lange waarden afgekapt."""
+    if isinstance(row_context, str):
+        return row_context
     ctx_lines = []
     for k, v in row_context.items():
         if v is None or str(v).strip() == "":
             continue
         sv = str(v)
-        if len(sv) > 300:
-            sv = sv[:300] + "…"
+        if len(sv) > _CONTEXT_VALUE_LEN:
+            sv = sv[:_CONTEXT_VALUE_LEN] + "…"
         ctx_lines.append(f"- {k}: {sv}")
-    ctx_block = "\n".join(ctx_lines) if ctx_lines else "- (geen contextwaarden gevonden)"
-
-    # Kandidaten samenvatten
-    cand_lines = []
-    for r in candidates:
-        desc = (r.description or r.instructions or "").strip()
-        if len(desc) > 280:
-            desc = desc[:280] + "…"
-        name_part = f"{r.name}" if r.name else ""
-        extra = f" | instructies: {r.instructions}" if r.instructions else ""
-        if len(extra) > 160:
-            extra = extra[:160] + "…"
-        cand_lines.append(f"* [{r.code}] {name_part} — {desc}{extra}")
-    cands_block = "\n".join(cand_lines)
-
-    prompt = f"""
-Categorie: {category}
-
-Context van de rij (kolom: waarde):
-{ctx_block}
-
-Mogelijke codes (kandidaten, kies exact één die het beste past):
-{cands_block}
+    return "\n".join(ctx_lines) if ctx_lines else _NO_CONTEXT
+
+
+def _context_line(name: str, value: object) -> str:
+    text = str(value)
+    if not text.strip():
+        return ""
+    if len(text) > _CONTEXT_VALUE_LEN:
+        text = text[:_CONTEXT_VALUE_LEN] + "…"
+    return f"- {name}: {text}"
+
+
+def render_context_blocks(frame: pd.DataFrame) -> List[str]:
+    """
+    `_context_block` voor alle rijen van een blad tegelijk (kolom = kolomnaam, waarden als
+    celwaarde). Per kolom worden lege cellen weggefilterd en de regels gemaakt (getallen in
+    één doorgang, tekst één keer per unieke waarde, inclusief afkappen); daarna worden de
+    regels per rij aaneengeschakeld. Byte-identiek aan `_context_block`.
+    """
+    lines: List[np.ndarray] = []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        missing = pd.isna(values)
+        missing[missing] = np.equal(values[missing], None)  # NaN is geen lege cel ('nan')
+        present = np.flatnonzero(~missing)
+        column = np.full(len(values), "", dtype=object)
+        if len(present):
+            filled = values[present]
+            kind = pd.api.types.infer_dtype(filled)
+            if kind in _NUMERIC_KINDS:
+                # Getallen (bijv. bedragen): nooit leeg en ruim korter dan de limiet
+                column[present] = f"- {name}: " + np.array(list(map(str, filled)), dtype=object)
+            elif kind == "string":
+                # Tekst herhaalt zich vaak (omschrijvingen, kostenplaatsen): elke waarde één keer omzetten
+                codes, uniques = pd.factorize(filled, use_na_sentinel=False)
+                rendered = np.array([_context_line(name, v) for v in uniques], dtype=object)
+                column[present] = rendered[codes]
+            else:
+                column[present] = [_context_line(name, v) for v in filled]
+        lines.append(column)
+    if not lines:
+        return [_NO_CONTEXT] * len(frame)
+    return ["\n".join(filter(None, parts)) or _NO_CONTEXT for parts in zip(*lines)]
 
+
+def candidate_line(r: CodeRule) -> str:
+    """Eén regel van het kandidatenblok voor een code."""
+    desc = (r.description or r.instructions or "").strip()
+    if len(desc) > 280:
+        desc = desc[:280] + "…"
+    name_part = f"{r.name}" if r.name else ""
+    extra = f" | instructies: {r.instructions}" if r.instructions else ""
+    if len(extra) > 160:
+        extra = extra[:160] + "…"
+    return f"* [{r.code}] {name_part} — {desc}{extra}"
+
+
+def _candidates_block(candidates: List[CodeRule]) -> str:
+    """Kandidaten samenvatten: één regel per code."""
+    return "\n".join(candidate_line(r) for r in candidates)
+
+
+_RULES_SINGLE = """
 Regels:
 - Geef JSON met velden: code (exacte code-string uit lijst), argumentatie (max 2 zinnen), vraag (of null), confidence (0..1).
 - Stel enkel een verduidelijkingsvraag als de context onvoldoende is ÓF het bij de gekozen code expliciet hoort (via instructies).
 - Als je sterk twijfelt tussen 2 codes, kies de beste en benoem de twijfel kort in de argumentatie.
 - Geen extra tekst buiten het JSON.
-"""
-    return prompt.strip()
+""".strip()
+
+_RULES_BATCH = """
+Regels:
+- Geef een JSON-array met precies één object per rij, met velden: rij (rijnummer), code (exacte code-string uit lijst), argumentatie (max 2 zinnen), vraag (of null), confidence (0..1).
+- Beoordeel elke rij zelfstandig.
+- Stel enkel een verduidelijkingsvraag als de context onvoldoende is ÓF het bij de gekozen code expliciet hoort (via instructies).
+- Als je sterk twijfelt tussen 2 codes, kies de beste en benoem de twijfel kort in de argumentatie.
+- Geen extra tekst buiten het JSON.
+""".strip()
+
+
+def compile_system_prompt(
+    category: str,
+    rules: Optional[List[CodeRule]] = None,
+    *,
+    language: str = "nl",
+    batch: bool = False,
+) -> str:
+    """
+    Vaste prefix voor alle rijen van een categorie: system-prompt + (optioneel) het volledige
+    codeschema + de antwoordregels. Byte-identiek over rijen heen, zodat prompt-prefix-caching
+    bij de provider werkt; per schema-hash gememoïseerd.
+    Zonder `rules` staan de kandidaten per rij in de gebruikersprompt (shortlist-modus).
+    """
+    fingerprint = schema_fingerprint(rules) if rules else ""
+    key = (language, category, batch, fingerprint)
+    compiled = _COMPILED_PROMPTS.get(key)
+    if compiled is None:
+        parts = [build_system_prompt(language=language, batch=batch), f"Categorie: {category}"]
+        if rules:
+            parts.append(
+                "Mogelijke codes (kies exact één die het beste past):\n" + _candidates_block(rules)
+            )
+        parts.append(_RULES_BATCH if batch else _RULES_SINGLE)
+        compiled = _COMPILED_PROMPTS[key] = "\n\n".join(parts)
+    return compiled
+
+
+def build_user_prompt(row_context: RowContext, candidates: Optional[List[CodeRule]] = None) -> str:
+    """
+    Gebruikersprompt: (optioneel) shortlist met kandidaat-codes, daarna de compacte rijcontext.
+    Het volledige codeschema staat in de system-prompt (zie `compile_system_prompt`).
+    """
+    ctx_block = _context_block(row_context)
+    if not candidates:
+        return f"Context van de rij (kolom: waarde):\n{ctx_block}"
+
+    cands_block = _candidates_block(candidates)
+    return (
+        f"Mogelijke codes (kandidaten, kies exact één die het beste past):\n{cands_block}\n\n"
+        f"Context van de rij (kolom: waarde):\n{ctx_block}"
+    )
+
+
+def build_batch_user_prompt(row_contexts: List[RowContext], candidates: Optional[List[CodeRule]] = None) -> str:
+    """
+    Gebruikersprompt voor meerdere rijen: (optioneel) de kandidaten één keer + genummerde rijcontexten.
+    """
+    rows_block = "\n\n".join(
+        f"Rij {i}:\n{_context_block(ctx)}" for i, ctx in enumerate(row_contexts, start=1)
+    )
+    head = f"Rijen ({len(row_contexts)}; geef precies {len(row_contexts)} objecten terug), kolom: waarde:"
+    if not candidates:
+        return f"{head}\n{rows_block}"
+
+    cands_block = _candidates_block(candidates)
+    return (
+        f"Mogelijke codes (kandidaten, kies per rij exact één die het beste past):\n{cands_block}\n\n"
+        f"{head}\n{rows_block}"
+    )
+
+
+_REPAIR_SYSTEM = {
+    "nl": "Je corrigeert een eerder JSON-antwoord voor het coderen van zorgdata. Kies voor elke code "
+          "exact een code uit de lijst, houd de overige velden zo veel mogelijk gelijk en geef alleen JSON terug.",
+    "en": "You correct an earlier JSON answer for coding healthcare data. For each code choose exactly one "
+          "code from the list, keep the other fields as unchanged as possible and return JSON only.",
+}
+
+
+def build_repair_prompt(
+    previous: str,
+    problems: List[str],
+    candidates: List[CodeRule],
+    *,
+    batch: bool = False,
+    language: str = "nl",
+) -> Tuple[str, str]:
+    """
+    (system, gebruiker) voor één goedkope reparatie-ronde na een ongeldig antwoord: het vorige
+    antwoord, wat eraan mankeert en alleen de codes met hun naam (geen beschrijvingen of rijcontext).
+    """
+    if len(previous) > 1500:
+        previous = previous[:1500] + "…"
+    codes = "\n".join(f"* [{r.code}] {r.name or ''}".rstrip() for r in candidates)
+    shape = ("een JSON-array met per genoemde rij één object (rij, code, argumentatie, vraag, confidence)"
+             if batch else "één JSON-object (code, argumentatie, vraag, confidence)")
+    user = (
+        f"Vorig antwoord:\n{previous}\n\nProblemen:\n" + "\n".join(problems)
+        + f"\n\nMogelijke codes:\n{codes}\n\nGeef het gecorrigeerde antwoord als {shape}."
+    )
+    return _REPAIR_SYSTEM.get(language, _REPAIR_SYSTEM["nl"]), user
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import MANDATORY_INSTRUCTION_MARKERS
+from loaders.schema_loader import CodeRule, schema_fingerprint
+from logic.prompts import candidate_line
+from utils.tokens import estimate_tokens
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MIN_TERM_LEN = 3
+_MIN_SUBSTRING_LEN = 4  # kortere termen moeten exact matchen (geen 'ig' in 'vergadering')
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_INDEX_CACHE: "OrderedDict[str, CandidateIndex]" = OrderedDict()
+_INDEX_CACHE_SIZE = 16
+_INDEX_LOCK = threading.Lock()
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) >= _MIN_TERM_LEN]
+
+
+def is_mandatory(rule: CodeRule) -> bool:
+    """Codes waarvan de instructies een verplicht-markering bevatten, gaan altijd mee in de shortlist."""
+    instr = (rule.instructions or "").lower()
+    return any(marker in instr for marker in MANDATORY_INSTRUCTION_MARKERS)
+
+
+class CandidateIndex:
+    """
+    Lexicale BM25-index over code, naam, beschrijving en instructies van één categorie.
+    Een rijwoord matcht een term als die gelijk is, of (vanaf 4 tekens) erin voorkomt,
+    zodat samenstellingen als 'schoonmaakkosten' de code 'schoonmaak' vinden.
+    """
+
+    def __init__(self, rules: Sequence[CodeRule]):
+        self.rules: List[CodeRule] = list(rules)
+        docs = [_terms(" ".join((r.code, r.name, r.description, r.instructions))) for r in self.rules]
+        self.vocab: Dict[str, int] = {}
+        for doc in docs:
+            for t in doc:
+                self.vocab.setdefault(t, len(self.vocab))
+
+        n_docs = max(1, len(docs))
+        avgdl = max(1.0, sum(len(d) for d in docs) / n_docs)
+        tf = np.zeros((len(self.vocab), len(self.rules)), dtype=np.float32)
+        for di, doc in enumerate(docs):
+            for t in doc:
+                tf[self.vocab[t], di] += 1.0
+        df = (tf > 0).sum(axis=1)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        doc_len = np.array([len(d) for d in docs] or [0], dtype=np.float32)[: len(self.rules)]
+        norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * doc_len / avgdl)
+        self.weights = idf[:, None] * tf * (_BM25_K1 + 1) / (tf + norm[None, :] + 1e-9)
+
+        self.mandatory = [i for i, r in enumerate(self.rules) if is_mandatory(r)]
+        self.costs = [estimate_tokens(candidate_line(r)) + 1 for r in self.rules]
+        self._lengths = sorted({len(t) for t in self.vocab if len(t) >= _MIN_SUBSTRING_LEN})
+        self._word_terms: Dict[str, Tuple[int, ...]] = {}
+
+    @classmethod
+    def for_rules(cls, rules: Sequence[CodeRule]) -> "CandidateIndex":
+        """Gedeelde index per schema-hash (kleine LRU)."""
+        key = schema_fingerprint(list(rules))
+        with _INDEX_LOCK:
+            index = _INDEX_CACHE.get(key)
+            if index is not None:
+                _INDEX_CACHE.move_to_end(key)
+                return index
+        index = cls(rules)
+        with _INDEX_LOCK:
+            _INDEX_CACHE[key] = index
+            while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+                _INDEX_CACHE.popitem(last=False)
+        return index
+
+    def _terms_in_word(self, word: str) -> Tuple[int, ...]:
+        terms = self._word_terms.get(word)
+        if terms is None:
+            found = set()
+            exact = self.vocab.get(word)
+            if exact is not None:
+                found.add(exact)
+            n = len(word)
+            for length in self._lengths:
+                if length >= n:
+                    break
+                for start in range(n - length + 1):
+                    ti = self.vocab.get(word[start:start + length])
+                    if ti is not None:
+                        found.add(ti)
+            terms = self._word_terms[word] = tuple(found)
+        return terms
+
+    def scores(self, text: str) -> np.ndarray:
+        matched = set()
+        for word in set(_WORD_RE.findall(text.lower())):
+            matched.update(self._terms_in_word(word))
+        if not matched:
+            return np.zeros(len(self.rules), dtype=np.float32)
+        return self.weights[list(matched)].sum(axis=0)
+
+    def shortlist(self, text: str, *, top_k: int = 0, token_budget: int = 0) -> List[CodeRule]:
+        """
+        Verplichte codes + best scorende codes, begrensd door `top_k` (aantal, naast de
+        verplichte) en/of `token_budget` (geschatte tokens van het kandidatenblok).
+        Retourneert de codes in schemavolgorde (stabiele prompts).
+        """
+        selected = set(self.mandatory)
+        used = sum(self.costs[i] for i in selected)
+        extra = 0
+        for i in np.argsort(-self.scores(text), kind="stable").tolist():
+            if i in selected:
+                continue
+            if top_k > 0 and extra >= top_k:
+                break
+            if token_budget > 0 and used + self.costs[i] > token_budget:
+                break
+            selected.add(i)
+            used += self.costs[i]
+            extra += 1
+        return [self.rules[i] for i in sorted(selected)]
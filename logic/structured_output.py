@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loaders.schema_loader import CodeRule, schema_fingerprint
+
+# Strict structured output accepteert enums tot enkele honderden waarden; daarboven zonder enum
+MAX_SCHEMA_ENUM = 500
+
+# Gememoïseerde JSON-schema's per (batch, schema-hash)
+_SCHEMAS: Dict[Tuple[bool, str], Dict[str, Any]] = {}
+_BRACKETED_RE = re.compile(r"^\[([^\]]+)\]")
+
+
+class InvalidAnswer(ValueError):
+    """Modelantwoord dat ook na de reparatie-ronde geen geldige code bevat."""
+
+
+def response_schema(rules: List[CodeRule], *, batch: bool = False) -> Dict[str, Any]:
+    """
+    JSON-schema voor structured output met de codes van de categorie als enum. Bewust de hele
+    categorie en niet de shortlist per rij: één vast schema per categorie wordt door de
+    provider één keer gecompileerd; of de code in de shortlist zit controleert `validate_code`.
+    """
+    key = (batch, schema_fingerprint(rules))
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        codes = sorted({r.code for r in rules})
+        code: Dict[str, Any] = {"type": "string"}
+        if len(codes) <= MAX_SCHEMA_ENUM:
+            code["enum"] = codes
+        entry: Dict[str, Any] = {
+            "type": "object",
+            "properties": {
+                "code": code,
+                "argumentatie": {"type": "string"},
+                "vraag": {"type": ["string", "null"]},
+                "confidence": {"type": "number"},
+            },
+            "required": ["code", "argumentatie", "vraag", "confidence"],
+            "additionalProperties": False,
+        }
+        if batch:
+            # De root moet een object zijn; `extract_json_array` pakt de lijst eruit
+            entry["properties"] = {"rij": {"type": "integer"}, **entry["properties"]}
+            entry["required"] = ["rij", *entry["required"]]
+            entry = {"type": "object", "properties": {"rijen": {"type": "array", "items": entry}},
+                     "required": ["rijen"], "additionalProperties": False}
+        schema = _SCHEMAS[key] = {"name": "codering_batch" if batch else "codering", "strict": True, "schema": entry}
+    return schema
+
+
+def validate_code(code: Any, valid_codes: Iterable[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (canonieke code, None) als `code` een geldige code is, anders (None, probleem). Kleine
+    afwijkingen (hoofdletters, spaties, '[CODE] naam' zoals in de kandidatenlijst) worden
+    lokaal rechtgezet zonder extra call.
+    """
+    if not isinstance(code, str) or not code.strip():
+        return None, "veld 'code' ontbreekt of is leeg"
+    valid = list(valid_codes)
+    if code in valid:
+        return code, None
+    text = code.strip()
+    m = _BRACKETED_RE.match(text)
+    if m:
+        text = m.group(1).strip()
+    by_norm = {c.strip().lower(): c for c in valid}
+    canonical = by_norm.get(text.lower())
+    if canonical is not None:
+        return canonical, None
+    return None, f"code '{code}' staat niet in de lijst met mogelijke codes"
@@ -1,14 +1,28 @@
 from __future__ import annotations
 
-import io
+import json
 import os
+import time
+import uuid
+from typing import Optional
+
 import streamlit as st
 
-from config import AppSettings, DEFAULT_HEADER_ROWS
-from writers.excel_writer import process_workbook
+from config import AppSettings, CascadeTier, DEFAULT_HEADER_ROWS, DEFAULT_CONCURRENCY, USE_MAPPINGS
+from jobs import CANCELLED, DONE, QUEUED, Job, input_key, job_manager
+from llm_providers.registry import available_providers, provider_label
+from utils.files import output_path
+from utils.run_report import RunReport, performance_csv
+
+JOB_STATUS_LABELS = {"queued": "in wachtrij", "running": "bezig", "done": "gereed", "cancelled": "geannuleerd", "failed": "mislukt"}
 
 st.set_page_config(page_title="Berenschot Benchmark Toedeling (PoC)", layout="wide")
 
+# Werkruimte van de gebruiker in de URL (`?werkruimte=`): na een refresh (of via een bladwijzer)
+# zijn de eigen jobs weer zichtbaar
+owner_id = st.query_params.get("werkruimte") or st.session_state.get("owner_id") or uuid.uuid4().hex
+st.query_params["werkruimte"] = st.session_state["owner_id"] = owner_id
+
 st.title("🔎 Benchmark Toedeling met AI — Proof of Concept")
 
 st.markdown(
@@ -18,31 +32,77 @@ st.markdown(
 
 with st.sidebar:
     st.header("⚙️ Instellingen")
-    provider = st.selectbox("LLM-provider", ["openai"], index=0, help="De architectuur is modulair: extra providers zijn eenvoudig toe te voegen.")
+    providers = available_providers()
+    provider = st.selectbox("LLM-provider", providers, index=0, format_func=provider_label,
+                            help="Providers komen uit een register (`llm_providers/registry.py` of het entry point `toedeling.providers`) en worden pas bij een run geladen.")
     model = st.text_input("Modelnaam", value="gpt-4o-mini")
+    cascade = None
+    if st.checkbox("Model-cascade (klein model eerst)", value=False, help="Elke rij gaat eerst naar het eerste model; alleen onzekere antwoorden (confidence onder de drempel, ongeldige code of een verduidelijkingsvraag) gaan door naar het volgende model. Het laatste model beslist altijd."):
+        import pandas as pd  # pas nodig met cascade (snellere eerste weergave)
+
+        tiers = st.data_editor(
+            pd.DataFrame([{"Provider": provider, "Model": model, "Drempel": 0.8},
+                          {"Provider": provider, "Model": "gpt-4o", "Drempel": 0.0}]),
+            num_rows="dynamic", hide_index=True, key="cascade_tiers",
+            column_config={
+                "Provider": st.column_config.SelectboxColumn(options=providers, required=True),
+                "Drempel": st.column_config.NumberColumn(min_value=0.0, max_value=1.0, step=0.05, help="Minimale confidence om het antwoord van dit model over te nemen"),
+            },
+        )
+        cascade = [CascadeTier(t.Provider, str(t.Model).strip(), float(t.Drempel) if pd.notna(t.Drempel) else 0.0)
+                   for t in tiers.itertuples() if t.Provider and pd.notna(t.Model) and str(t.Model).strip()] or None
     temperature = st.slider("Creativiteit (temperature)", 0.0, 1.0, 0.1, 0.1)
-    # Fuzzy matching is UIT: geen top_k meer nodig in de UI.
+    concurrency = st.number_input("Gelijktijdige LLM-calls", min_value=1, max_value=64, value=DEFAULT_CONCURRENCY, step=1, help="Wordt automatisch verlaagd wanneer de provider een rate-limit (429) teruggeeft.")
+    batch_size = st.number_input("Rijen per LLM-call (batch)", min_value=1, max_value=50, value=1, step=1, help="Bij >1 wordt het codeschema één keer per prompt meegestuurd voor meerdere rijen. Ontbrekende antwoorden worden per rij opnieuw gevraagd.")
+    top_k = st.number_input("Max. kandidaat-codes per rij (0 = volledig schema)", min_value=0, max_value=300, value=0, step=5, help="Bij >0 krijgt het model per rij alleen de best passende codes (plus codes met [verplicht] in de instructies).")
+    token_budget = st.number_input("Token-budget kandidaten per rij (0 = geen limiet)", min_value=0, max_value=20000, value=0, step=250)
+    use_mappings = st.checkbox("Hergebruik goedgekeurde coderingen", value=USE_MAPPINGS, help="Codes uit de kolom 'Codering definitief' van verwerkte klantbestanden worden bewaard per (categorie, omschrijving/functienaam, grootboekrekening). Rijen die daarin voorkomen krijgen die code direct, met bronvermelding, zonder LLM-call.")
+    local_model = st.checkbox("Lokaal model (leert van bestaande coderingen)", value=False, help="Leert per categorie van de kolommen 'Codering definitief', 'Codering concept' en 'Codering eerdere deelname' (ook over klantbestanden heen). Rijen die het lokale model met hoge zekerheid voorspelt, worden direct gecodeerd; alleen de rest gaat naar het LLM.")
     dry_run = st.checkbox("Offline modus (geen LLM — eenvoudige heuristiek)", value=False)
-    max_preview = st.number_input("Max. rijen in preview (per tab)", min_value=5, max_value=200, value=30, step=5)
+    deduplicate = st.checkbox("Ontdubbel gelijke rijen", value=True, help="Rijen met gelijke sleutelkolommen (bijv. grootboekrekening + omschrijving) worden één keer geclassificeerd; de code geldt voor alle rijen in de groep.")
+    resume = st.checkbox("Hervat / sla ongewijzigde rijen over", value=True, help="Per klantbestand (bestandsnaam) wordt bijgehouden welke rijen al zijn geclassificeerd. Een nieuwe run slaat ongewijzigde rijen over en hergebruikt eerdere antwoorden.")
+    use_cache = st.checkbox("Gebruik antwoord-cache", value=True, help="Identieke prompts worden uit de lokale cache beantwoord (geen API-kosten). Zet uit om alles opnieuw naar het model te sturen.")
+    max_preview = st.number_input("Max. rijen in preview (per tab)", min_value=5, max_value=200, value=30, step=5, help="De preview classificeert per tabblad alleen een steekproef van zoveel unieke rijen en raamt tokens, kosten en looptijd van de volledige run.")
     language = st.selectbox("Taal van de prompts", ["nl", "en"], index=0)
+    output_mode = st.selectbox(
+        "Uitvoermodus", ["openpyxl", "patch"], index=0,
+        format_func=lambda m: {"openpyxl": "Volledig workbook opnieuw opslaan", "patch": "Alleen doelkolommen patchen (grote bestanden)"}[m],
+        help="'Patchen' laat alle andere onderdelen van het bestand (pivots, opmaak, macro's) ongemoeid en gebruikt veel minder geheugen.",
+    )
+    execution_mode = st.selectbox(
+        "Uitvoering", ["interactive", "batch"], index=0,
+        format_func=lambda m: {"interactive": "Direct (losse LLM-calls)", "batch": "Batch-API (goedkoper, tot 24 uur)"}[m],
+        help="Bij 'Batch-API' worden alle prompts in één verzoekbestand ingediend bij het batch-endpoint van de provider; de app wacht tot de batch klaar is en verwerkt dan de antwoorden. Geschikt voor zeer grote bestanden zonder haast.",
+    )
+    profile_run = st.checkbox("cProfile-opname (prestatieanalyse)", value=False, help="Profileert de verwerking (inlezen, prompts, LLM-calls, wegschrijven) voor diepgaande analyse; maakt de run iets trager. Eén geprofileerde run tegelijk per server.")
     st.caption("OpenAI-sleutel wordt automatisch gelezen uit **st.secrets['OPENAI_API_KEY']** of de omgevingsvariabele **OPENAI_API_KEY**.")
 
-    st.info("ℹ️ Fuzzy matching is **uitgeschakeld**. Per rij wordt het **volledige codeschema** meegestuurd naar het model.", icon="ℹ️")
+    if not top_k and not token_budget:
+        st.info("ℹ️ Geen shortlist: per rij wordt het **volledige codeschema** meegestuurd naar het model.", icon="ℹ️")
 
     st.subheader("Header-rij per tabblad (optioneel)")
     hr_pil = st.number_input("Oplegger PIL — header-rij", min_value=1, max_value=50, value=DEFAULT_HEADER_ROWS["oplegger pil"])
     hr_kos = st.number_input("Oplegger kosten — header-rij", min_value=1, max_value=50, value=DEFAULT_HEADER_ROWS["oplegger kosten"])
     hr_opb = st.number_input("Oplegger opbrengsten — header-rij", min_value=1, max_value=50, value=DEFAULT_HEADER_ROWS["oplegger opbrengsten"])
 
-# Omdat fuzzy uit staat, maakt top_k geen verschil meer; zet intern op 0.
-top_k = 0
-
 settings = AppSettings(
     provider_name=provider,
     model=model,
     temperature=temperature,
-    top_k_codes=top_k,   # wordt genegeerd door de no-fuzzy classifier
+    top_k_codes=int(top_k),
+    candidate_token_budget=int(token_budget),
+    concurrency=int(concurrency),
     dry_run=dry_run,
+    use_cache=use_cache,
+    deduplicate=deduplicate,
+    resume=resume,
+    profile_run=profile_run,
+    batch_size=int(batch_size),
+    output_mode=output_mode,
+    execution_mode=execution_mode,
+    cascade=cascade,
+    local_model=local_model,
+    use_mappings=use_mappings,
     max_rows_preview=max_preview,
     system_language=language,
     header_rows_override={
@@ -70,32 +130,271 @@ if preview_btn or run_btn:
     if "OPENAI_API_KEY" in st.secrets:
         os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 
-    # Verwerking
-    with st.spinner("Bezig met verwerken…"):
-        out_bytes = process_workbook(
-            customer_file=customer_file,
-            schema_file=schema_file,
-            header_rows={
-                "oplegger pil": settings.header_row_for("oplegger pil"),
-                "oplegger kosten": settings.header_row_for("oplegger kosten"),
-                "oplegger opbrengsten": settings.header_row_for("oplegger opbrengsten"),
-            },
-            provider_name=settings.provider_name,
-            model=settings.model,
-            temperature=settings.temperature,
-            top_k_codes=settings.top_k_codes,  # ok om door te geven; no-fuzzy negeert dit
-            dry_run=settings.dry_run,
-            language=settings.system_language,
+    customer_bytes, schema_bytes = customer_file.getvalue(), schema_file.getvalue()
+    run_settings = dict(
+        header_rows={
+            "oplegger pil": settings.header_row_for("oplegger pil"),
+            "oplegger kosten": settings.header_row_for("oplegger kosten"),
+            "oplegger opbrengsten": settings.header_row_for("oplegger opbrengsten"),
+        },
+        provider_name=settings.cascade[0].provider if settings.cascade else settings.provider_name,
+        model=settings.cascade[0].model if settings.cascade else settings.model,
+        temperature=settings.temperature,
+        top_k_codes=settings.top_k_codes,
+        candidate_token_budget=settings.candidate_token_budget,
+        dry_run=settings.dry_run,
+        language=settings.system_language,
+        concurrency=settings.concurrency,
+        use_cache=settings.use_cache,
+        deduplicate=settings.deduplicate,
+        batch_size=settings.batch_size,
+        output_mode=settings.output_mode,
+        execution_mode=settings.execution_mode,
+        cascade=settings.cascade,
+        local_model=settings.local_model,
+        use_mappings=settings.use_mappings,
+        resume=settings.resume,
+        sample_rows=int(settings.max_rows_preview) if preview_btn else 0,
+        profile=settings.profile_run,
+    )
+    # Zelfde bestanden en instellingen als een eerdere run in deze sessie: dat resultaat tonen
+    key = input_key(customer_bytes, schema_bytes, run_settings)
+    results = st.session_state.setdefault("results", {})
+    job = job_manager().get(results.get(key))
+    if job is not None and job.reusable:
+        st.info("Deze bestanden zijn met dezelfde instellingen al verwerkt; het bewaarde resultaat wordt getoond.")
+    else:
+        # Verwerking als achtergrond-job; de sessie blijft bruikbaar en een rerun breekt de run niet af
+        job = job_manager().submit(
+            owner=owner_id,
+            label=customer_file.name,
+            customer_bytes=customer_bytes,
+            schema_bytes=schema_bytes,
+            **run_settings,
+        )
+        results[key] = job.id
+    st.session_state["job_id"] = job.id
+
+
+def _fmt_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "–"
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}u {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+def _render_metrics(report: RunReport) -> None:
+    m1, m2, m3, m4, m5, m6 = st.columns(6)
+    m1.metric("Rijen", report.rows)
+    m2.metric("Bespaard (ontdubbeld)", report.calls_saved)
+    m3.metric("Hervat / overgeslagen", report.resumed_rows + report.skipped_rows)
+    m4.metric("LLM-calls", report.llm_calls)
+    m5.metric("Cache-hits", report.cache_hits)
+    m6.metric("Fallbacks", report.fallbacks)
+    if report.shortlist_recall is not None:
+        st.caption(
+            f"Shortlist-recall: {report.shortlist_recall:.0%} van {report.shortlist_audited} steekproefrijen "
+            "(volledig schema) kreeg een code die ook in de shortlist zat."
+        )
+    if report.mapping_rows or report.mapping_learned:
+        st.caption(f"Goedgekeurde coderingen: {report.mapping_rows} rijen direct overgenomen; "
+                   f"{report.mapping_learned} nieuwe of gewijzigde coderingen uit 'Codering definitief' bewaard.")
+    if report.local_rows or report.local_audited:
+        agreement = "" if report.local_agreement_rate is None else (
+            f"; het LLM koos in {report.local_agreement_rate:.0%} van {report.local_audited} steekproefrijen dezelfde code")
+        st.caption(f"Lokaal model: {report.local_rows} van {report.rows} rijen direct gecodeerd{agreement}.")
+    if report.batch_requests:
+        st.caption(f"Batch-API: {report.batch_requests} verzoeken ingediend, {report.batch_failed} zonder antwoord "
+                   "(die rijen vallen terug op de heuristiek).")
+    if report.valid_first_try_rate is not None:
+        st.caption(
+            f"Geldige code bij eerste poging: {report.valid_first_try_rate:.0%}; "
+            f"{report.repaired_answers} hersteld met een reparatie-ronde ({report.repair_calls} calls), "
+            f"{report.invalid_answers} bleef ongeldig (heuristiek)."
+        )
+    if report.cascade:
+        import pandas as pd
+
+        st.dataframe(
+            pd.DataFrame([
+                (t.model, t.threshold, t.rows, t.accepted, t.escalated, t.calls,
+                 None if t.latency is None else round(t.latency, 2),
+                 None if t.agreement_rate is None else f"{t.agreement_rate:.0%}")
+                for t in report.cascade
+            ], columns=["Model", "Drempel", "Rijen", "Overgenomen", "Doorgestuurd", "Calls", "Latency (s)", "Overeenstemming"]),
+            hide_index=True,
         )
+        st.caption("Overeenstemming: hoe vaak het volgende model dezelfde code koos voor de doorgestuurde rijen.")
 
-    st.success("Verwerking gereed.")
+
+def _render_rows(job: Job, limit: int) -> None:
+    """Per tabblad de laatst geclassificeerde rijen (incrementeel bijgewerkt tijdens de run)."""
+    import pandas as pd
+
+    for sheet in job.progress.snapshot():
+        label = f"{sheet.title} — {sheet.done}/{sheet.total}{' (schatting)' if sheet.estimated else ''} rijen"
+        with st.expander(label, expanded=sheet.title == job.progress.current_sheet):
+            recent = list(sheet.outcomes.items())[-limit:]
+            if not recent:
+                st.caption("Nog geen resultaten.")
+                continue
+            st.dataframe(
+                pd.DataFrame(
+                    [(r, text, code, arg, note) for r, (text, code, arg, note) in recent],
+                    columns=["Rij", "Context", "Codering AI", "Argumentatie AI", "Opmerkingen"],
+                ),
+                hide_index=True,
+            )
+
+
+STAGE_LABELS = {
+    "load": "Inlezen workbook + schema", "context": "Rijcontext, ontdubbelen, shortlists",
+    "prompt": "Prompts bouwen*", "llm": "LLM-calls (incl. cache)*", "parse": "JSON-antwoorden parsen*",
+    "classify": "Classificeren (wandklok)", "write": "Resultaten in blad zetten", "save": "Opslaan (wb.save / patch)",
+    "total": "Totaal",
+}
+
+
+def _render_performance(job: Job) -> None:
+    """Inklapbaar prestatiepaneel: tijden per fase en per tabblad, tokens, retries en downloads."""
+    import pandas as pd
+
+    perf = job.performance()
+    with st.expander("⏱️ Prestaties", expanded=False):
+        stages = perf["stages_seconds"]
+        st.dataframe(
+            pd.DataFrame([(STAGE_LABELS.get(k, k), round(v, 3)) for k, v in stages.items()], columns=["Fase", "Seconden"]),
+            hide_index=True,
+        )
+        st.caption("* Opgeteld over alle gelijktijdige worker-threads; kan daardoor groter zijn dan de wandkloktijd.")
+        totals = perf["totals"]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Prompt-tokens", totals["prompt_tokens"])
+        c2.metric("Completion-tokens", totals["completion_tokens"])
+        c3.metric("Retries", totals["retries"])
+        c4.metric("Prompt-bytes", perf["counts"].get("prompt_bytes", 0))
+        if perf["sheets"]:
+            st.markdown("**Per tabblad**")
+            st.dataframe(pd.DataFrame(perf["sheets"]), hide_index=True)
+        d1, d2, d3 = st.columns(3)
+        stem = os.path.splitext(job.label)[0]
+        with d1:
+            st.download_button("📄 Run-rapport (JSON)", data=json.dumps(perf, indent=2, ensure_ascii=False, default=str),
+                               file_name=f"{stem}_run-rapport.json", mime="application/json", key=f"perf-json-{job.id}")
+        with d2:
+            st.download_button("📄 Run-rapport (CSV)", data=performance_csv(perf),
+                               file_name=f"{stem}_run-rapport.csv", mime="text/csv", key=f"perf-csv-{job.id}")
+        if job.profile_raw:
+            with d3:
+                st.download_button("🧪 cProfile (.prof)", data=job.profile_raw, file_name=f"{stem}.prof",
+                                   mime="application/octet-stream", key=f"perf-prof-{job.id}")
+            st.code(job.profile_text or "", language="text")
+        elif job.profile_text:
+            st.caption(job.profile_text)
+
+
+def _render_estimate(job: Job) -> None:
+    """Raming van de volledige run op basis van de preview: tokens, kosten en looptijd."""
+    import pandas as pd
+
+    est = job.estimate_summary()
+    st.subheader("🧮 Raming volledige run")
+    e1, e2, e3, e4, e5 = st.columns(5)
+    e1.metric("Rijen te classificeren", est["rows"])
+    e2.metric("LLM-calls", est["calls"], help=f"{est['unique_rows']} unieke rijen na ontdubbelen")
+    e3.metric("Tokens (in / uit)", f"{est['input_tokens']:,} / {est['output_tokens']:,}".replace(",", "."))
+    e4.metric("Kosten (USD)", "onbekend" if est["cost_usd"] is None else f"$ {est['cost_usd']:.2f}",
+              help="Tegen batch-tarief" if est["batch"] else None)
+    e5.metric("Looptijd", _fmt_duration(est["runtime_seconds"]),
+              help=f"Bij {job.settings.get('concurrency', 1)} gelijktijdige calls")
+    notes = ["invoertokens geteld met tiktoken" if est["exact_tokens"] else "invoertokens geschat (~4 tekens per token; tiktoken niet beschikbaar)",
+             "uitvoertokens geschat per rij",
+             f"{est['seconds_per_call']:.1f} s per call gemeten in de steekproef" if est["seconds_per_call"]
+             else "duur per call aangenomen (niet gemeten)",
+             "zonder aftrek van cache-hits; indicatieve prijzen"]
+    st.caption("Raming: " + "; ".join(notes) + ".")
+    if len(est["sheets"]) > 1:
+        st.dataframe(
+            pd.DataFrame(est["sheets"]).rename(columns={
+                "sheet": "Tabblad", "rows": "Rijen", "unique_rows": "Uniek", "calls": "Calls",
+                "input_tokens": "Invoertokens", "output_tokens": "Uitvoertokens"}),
+            hide_index=True,
+        )
+
+
+def _download(job: Job, label: str) -> None:
+    # Een tussenstand is altijd een patch van het origineel (dus ook .xlsm blijft .xlsm)
+    file_name = output_path(job.label, job.settings.get("output_mode", "openpyxl") if job.status == DONE else "patch")
     st.download_button(
-        "📥 Download aangepast klantbestand",
-        data=out_bytes,
-        file_name="klantbestand_coderingsvoorstel.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        label,
+        data=job.output,  # wordt pas bij klikken opgebouwd (callable: Streamlit 1.52+)
+        file_name=file_name,
+        mime=("application/vnd.ms-excel.sheet.macroEnabled.12" if file_name.lower().endswith(".xlsm")
+              else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+        key=f"download-{job.id}-{job.status}",
     )
 
+
+@st.fragment(run_every=1.0)
+def _live_job_panel(job_id: str, limit: int) -> None:
+    job = job_manager().get(job_id)
+    if job is None or not job.active:
+        st.rerun()  # klaar: volledige pagina opnieuw opbouwen (stopt het pollen)
+    progress = job.progress
+    if job.status == QUEUED:
+        st.info(f"In de wachtrij ({job_manager().queue_position(job)} job(s) gaan voor).")
+    else:
+        text = (f"{progress.rows_completed}/{progress.rows_total} rijen · "
+                f"{(progress.throughput or 0):.1f} rijen/s · verstreken {_fmt_duration(progress.elapsed_seconds)} · "
+                f"resterend ca. {_fmt_duration(progress.eta_seconds)}")
+        if progress.cancelled:
+            text += " · wordt geannuleerd…"
+        st.progress(progress.fraction, text=text)
+        if progress.status:
+            st.caption(f"⏳ {progress.status}")
+    _render_metrics(job.report)
+    c1, c2 = st.columns(2)
+    with c1:
+        if st.button("⏹️ Annuleer", disabled=progress.cancelled, key=f"cancel-{job.id}"):
+            job.cancel()
+    with c2:
+        _download(job, "📥 Download tussenstand")
+    _render_rows(job, limit)
+
+
+session_jobs = job_manager().jobs_for(owner_id)
+if session_jobs:
+    current = job_manager().get(st.session_state.get("job_id")) or session_jobs[-1]
+    if len(session_jobs) > 1:
+        current = st.selectbox(
+            "Job", session_jobs[::-1], index=session_jobs[::-1].index(current),
+            format_func=lambda j: f"{time.strftime('%H:%M:%S', time.localtime(j.created_at))} — {j.label} ({JOB_STATUS_LABELS[j.status]})",
+        )
+    if current.active:
+        _live_job_panel(current.id, int(settings.max_rows_preview))
+    else:
+        if current.status == DONE and current.preview:
+            st.success(f"Preview gereed in {_fmt_duration(current.finished_at - current.created_at)}: "
+                       "een steekproef per tabblad is geclassificeerd.")
+        elif current.status == DONE:
+            st.success(f"Verwerking gereed in {_fmt_duration(current.finished_at - current.created_at)}.")
+        elif current.status == CANCELLED:
+            st.warning("Verwerking geannuleerd; de tussenstand hieronder bevat de rijen die al klaar waren.")
+        else:
+            st.error("Verwerking mislukt.")
+            st.code(current.error or "", language="text")
+        if current.preview and current.status == DONE:
+            _render_estimate(current)
+        _render_metrics(current.report)
+        if current.preview:
+            _download(current, "📥 Download preview (alleen steekproefrijen)")
+        else:
+            _download(current, "📥 Download aangepast klantbestand" if current.status == DONE else "📥 Download tussenstand")
+        _render_performance(current)
+        _render_rows(current, int(settings.max_rows_preview))
+
 st.divider()
 with st.expander("ℹ️ Uitleg & aannames"):
     st.markdown(
@@ -104,8 +403,23 @@ with st.expander("ℹ️ Uitleg & aannames"):
 
 - **Schema-detectie**: het codeschema wordt uit 3 tabbladen gelezen (formatie/kosten/opbrengsten).
 - **Context**: per rij gebruikt de app alle beschikbare kolommen in het Oplegger-blad als context (exclusief de doelkolommen).
-- **Volledig codeschema per rij**: fuzzy matching is uitgeschakeld; het **hele codeschema** wordt aan het model aangeboden voor maximale nauwkeurigheid.
+- **Volledig codeschema of shortlist**: standaard wordt het **hele codeschema** aan het model aangeboden voor maximale nauwkeurigheid. Met een maximum aantal kandidaten of een token-budget kiest een lexicale index (BM25 over code, naam, beschrijving en instructies) per rij de best passende codes; codes met `[verplicht]` in de instructies gaan altijd mee. Een steekproef van de rijen wordt met het volledige schema geclassificeerd om de recall van de shortlist te meten. Het volledige schema staat één keer per categorie vast in de system-prompt (gelijk voor alle rijen), zodat de provider die prefix kan cachen; de rijcontext komt als laatste.
+- **Gelijktijdigheid**: rijen worden per tabblad parallel naar het model gestuurd; bij rate-limits (429) wacht de app en verlaagt ze automatisch het aantal gelijktijdige calls.
+- **Validatie en reparatie**: het antwoord van het model wordt robuust geparst (ook met code-hekken, omringende tekst of een afgebroken antwoord) en de gekozen code wordt gecontroleerd tegen de kandidaten. Bij OpenAI wordt het antwoordformaat bovendien met structured output (JSON-schema met de codes van de categorie als keuzelijst) afgedwongen. Is een code toch ongeldig, dan volgt één korte reparatie-ronde (vorig antwoord plus de codelijst) in plaats van het antwoord weg te gooien.
+- **Goedgekeurde coderingen**: codes in de kolom "Codering definitief" van een verwerkt klantbestand worden lokaal bewaard (SQLite in de cachemap) per categorie, genormaliseerde omschrijving of functienaam en grootboekrekening. Bij elk volgend bestand, ook van een andere klant, krijgen rijen met dezelfde omschrijving (en grootboekrekening, of zonder die als alle goedgekeurde codes voor de omschrijving gelijk zijn) die code direct, met in de argumentatie het bronbestand; daarvoor wordt geen prompt gebouwd.
+- **Lokaal model**: met "Lokaal model" leert de app per categorie van de coderingen die al in de klantbestanden staan ("Codering definitief", "Codering concept", "Codering eerdere deelname"): een logistische regressie op woorden en celwaarden van de rij, volledig lokaal op de CPU. Het model groeit mee met elk verwerkt bestand. Rijen die het met een gekalibreerde zekerheid van minstens `LOCAL_MODEL_MIN_CONFIDENCE` voorspelt, krijgen direct die code (de argumentatie vermeldt het lokale model); een kleine steekproef gaat toch naar het LLM om de overeenstemming te meten.
+- **Model-cascade**: met "Model-cascade" gaat elke rij eerst naar een klein, snel model. Alleen onzekere antwoorden (confidence onder de drempel van dat model, een ongeldige code of een verduidelijkingsvraag) gaan door naar het volgende, grotere model; het laatste model beslist altijd. Per model toont de app het aantal calls, de latency en hoe vaak het volgende model het eens was met de doorgestuurde antwoorden, om de drempels af te stemmen op kosten en nauwkeurigheid.
+- **Batch-API**: met de uitvoering "Batch-API" worden alle prompts van het bestand als JSONL-verzoekbestand ingediend bij het batch-endpoint van de provider (lagere kosten, doorlooptijd tot 24 uur). De app pollt de status (`TOEDELING_BATCH_POLL_SECONDS`), zet de antwoorden in de antwoord-cache en verwerkt daarna de rijen zoals gewoonlijk; rijen zonder antwoord vallen terug op de heuristiek. Een herstart pakt een lopende batch weer op; de preview gebruikt altijd losse calls.
+- **Bewaarde resultaten**: een afgeronde run blijft `TOEDELING_JOB_RETENTION_HOURS` beschikbaar voor download, tabel en rapport, ook na een rerun van de pagina; resultaten groter dan `TOEDELING_RESULT_SPILL_MB` staan zolang op schijf. Dezelfde bestanden met dezelfde instellingen nogmaals verwerken toont direct dat resultaat.
+- **Batches**: met "Rijen per LLM-call" > 1 beoordeelt het model meerdere rijen in één prompt; rijen die in het antwoord ontbreken of onbruikbaar zijn worden los opnieuw gevraagd.
+- **Ontdubbeling**: rijen met gelijke sleutelkolommen per categorie (zie `DEDUP_KEY_COLUMNS` in `config.py`) worden één keer geclassificeerd en krijgen allemaal dezelfde code.
+- **Preview**: "Analyse & Preview" classificeert per tabblad alleen een gelijkmatig verspreide steekproef van max. het ingestelde aantal unieke rijen en raamt voor de volledige run het aantal LLM-calls, de tokens (met tiktoken, anders geschat), de API-kosten (indicatieve prijzen, `MODEL_PRICING_USD_PER_1M` in `config.py`) en de looptijd bij de ingestelde gelijktijdigheid. De antwoorden uit de steekproef worden via het journaal en de cache hergebruikt in de volledige run.
+- **Hervatten**: per klantbestand houdt de app een journaal bij met per rij een vingerafdruk van de context plus schema en model. Bij een nieuwe run (bijv. na een afgebroken run of een maandelijkse herlevering) worden ongewijzigde rijen overgeslagen en alleen nieuwe of gewijzigde rijen naar het model gestuurd.
+- **Achtergrond-jobs**: de verwerking draait op de achtergrond; de pagina toont live de voortgang per tabblad, de doorvoer en de geschatte resterende tijd, plus de laatst geclassificeerde rijen. Een run kan worden geannuleerd en de tussenstand kan op elk moment worden gedownload. Meerdere gebruikers delen een wachtrij (max. `TOEDELING_MAX_JOBS` runs tegelijk).
+- **Prestaties**: na elke run toont het paneel "Prestaties" de tijd per fase (inlezen, context, prompts, LLM-calls, parsen, wegschrijven, opslaan), tokens, retries en cache-hits, ook per tabblad; het rapport is te downloaden als JSON of CSV. Met "cProfile-opname" komt er een profiel (.prof) bij.
+- **Antwoord-cache**: modelantwoorden worden lokaal bewaard op basis van een hash van provider, model, temperature en prompts; een herhaalde run met ongewijzigde rijen kost daardoor geen API-calls.
 - **Uitvoer**: de 3 doelkolommen worden **aangemaakt** als ze ontbreken en anders **overschreven**. Andere data blijft ongewijzigd.
+- **Uitvoermodus "patchen"**: het klantbestand wordt alleen gelezen; in het pakket worden uitsluitend de Oplegger-tabbladen herschreven (doelkolommen), alle andere onderdelen blijven ongewijzigd.
 - **Verduidelijkende vraag**: wordt alleen toegevoegd als de modelrespons die bevat, bijvoorbeeld bij onvoldoende context of wanneer de gekozen code expliciet een aanvullende vraag volgens het schema vereist.
 - **Offline modus**: zonder LLM (checkbox) wordt een eenvoudige, heuristische keuze gemaakt op basis van trefwoorden. Handig voor snelle demo's of als er (tijdelijk) geen API-sleutel beschikbaar is.
         """
@@ -0,0 +1,311 @@
+"""
+Benchmark van `process_workbook` met synthetische codeschema's en Oplegger-workbooks en een
+deterministische nep-LLM (`FakeLLMClient`) met instelbare latency, jitter, fouten en 429's.
+
+Gebruik:
+    python -m tools.benchmark --rows 1000 10000 --codes 50 300 --latency 0.05 --concurrency 8
+    python -m tools.benchmark --rows 100000 --codes 300 --output-mode openpyxl patch --dry-run
+    python -m tools.benchmark --compare .cache/benchmarks/oud.json .cache/benchmarks/nieuw.json
+
+Per case wordt de run in een vers proces gemeten (piek-RSS zonder de datageneratie), met de
+duur per fase (load, context, prompt, classify, write, save), rijen/s en prompt-bytes per rij.
+De resultaten komen als JSON (met commit-hash) in `CACHE_DIR/benchmarks`, of in `--output`.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from openpyxl import Workbook
+
+from config import CACHE_DIR
+from llm_providers.fake_provider import FakeLLMClient
+from loaders.schema_cache import load_codeschema_cached
+from logic.cascade import parse_cascade
+from utils.run_report import RunReport
+from utils.timing import StageTimings
+from writers.excel_writer import process_workbook
+
+STAGES = ("load", "context", "prompt", "llm", "parse", "classify", "write", "save")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_TERMS = [
+    "huur", "gebouwen", "schoonmaak", "energie", "salaris", "sociale lasten", "pensioen", "opleiding",
+    "reiskosten", "catering", "onderhoud", "inventaris", "automatisering", "licenties", "telefonie",
+    "verzekering", "accountant", "advies", "werving", "uitzendkrachten", "zorgverzekeraar", "wlz",
+    "subsidie", "huuropbrengst", "parkeren", "restaurant", "verhuur", "vervoer", "afschrijving",
+    "rente", "beveiliging", "afval", "water", "porto", "drukwerk", "kantoorartikelen", "medische middelen",
+]
+_FUNCTIONS = [
+    "Verzorgende IG", "Helpende", "Verpleegkundige", "Teamleider", "Schoonmaker", "Kok", "Receptionist",
+    "Manager zorg", "Controller", "HR-adviseur", "Activiteitenbegeleider", "Fysiotherapeut", "Facilitair medewerker",
+]
+
+
+# --- synthetische data -------------------------------------------------------------------
+def synthetic_schema(path: str, n_codes: int, seed: int = 0) -> None:
+    """Codeschema met `n_codes` codes per categorie (formatie, kosten, opbrengsten)."""
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for sheet, prefix in (("Formatiecodes", "F"), ("Kostencodes", "K"), ("Opbrengstencodes", "O")):
+        ws = wb.create_sheet(sheet)
+        ws.append(["Code", "Naam", "Beschrijving", "Instructies"])
+        for i in range(n_codes):
+            words = rng.sample(_TERMS, 3)
+            ws.append([
+                f"{prefix}{i:04d}",
+                f"{words[0]} {words[1]}",
+                f"Kosten en baten voor {words[0]}, {words[1]} en {words[2]} (code {i}).",
+                "[verplicht] bij twijfel" if i == 0 else f"Gebruik voor {words[2]}.",
+            ])
+    wb.save(path)
+
+
+def synthetic_customer(path: str, n_rows: int, unique_ratio: float = 0.3, seed: int = 0,
+                       label_ratio: float = 0.0, n_codes: int = 50) -> None:
+    """
+    Klantbestand met de Oplegger-tabbladen kosten (60% van de rijen), opbrengsten (15%) en
+    PIL (25%); ongeveer `unique_ratio` van de rijen is uniek (de rest zijn herhalingen).
+    Met `label_ratio` > 0 heeft die fractie van de rijen een 'Codering eerdere deelname'
+    (afgeleid van het eerste woord van de omschrijving of de functienaam, dus leerbaar).
+    """
+    rng = random.Random(seed)
+    labels = random.Random(seed + 1)  # eigen generator: zonder labels blijft het bestand gelijk
+
+    def label(prefix: str, key: int) -> List[Optional[str]]:
+        if label_ratio <= 0:
+            return []
+        return [f"{prefix}{key % n_codes:04d}" if labels.random() < label_ratio else None]
+
+    # Geen write_only: dat laat de <dimension> weg, die Excel-bestanden wel altijd hebben
+    wb = Workbook()
+    info = wb.active
+    info.title = "Info"
+    info.append(["Synthetisch klantbestand voor benchmarks"])
+
+    def pool(size: int, make) -> List[Tuple[Any, ...]]:
+        return [make(i) for i in range(max(1, size))]
+
+    for title, share, column in (("Oplegger kosten", 0.60, "Omschrijving kosten"),
+                                 ("Oplegger opbrengsten", 0.15, "Omschrijving opbrengsten")):
+        n = int(n_rows * share)
+        ws = wb.create_sheet(title)
+        ws.append([title])
+        ws.append([])
+        ws.append([])
+        ws.append(["Grootboekrekening", column, "Kostenplaatsnummer", "Kostenplaatsomschrijving", "Bedrag (x €1.000)",
+                   *(["Codering eerdere deelname"] if label_ratio > 0 else [])])
+        variants = pool(int(n * unique_ratio), lambda i: (4000 + i, " ".join(rng.sample(_TERMS, 2)) + f" {i}"))
+        for i in range(n):
+            ledger, text = variants[rng.randrange(len(variants))]
+            ws.append([ledger, text, 100 + i % 50, f"Afdeling {i % 50}", round(rng.uniform(0, 500), 2),
+                       *label(title[9].upper(), next(j for j, t in enumerate(_TERMS) if text.startswith(t + " ")))])
+
+    n = n_rows - int(n_rows * 0.60) - int(n_rows * 0.15)
+    ws = wb.create_sheet("Oplegger PIL")
+    ws.append(["Personeelsnummer", "Functienaam", "Afdeling / locatie", "Team", "Kostenplaatsomschrijving",
+               "Overhead of primair proces?", "Gemiddelde bezetting (fte)",
+               *(["Codering eerdere deelname"] if label_ratio > 0 else [])])
+    variants = pool(int(n * unique_ratio), lambda i: (rng.choice(_FUNCTIONS), f"Locatie {i % 40}", f"Team {i}"))
+    for i in range(n):
+        function, location, team = variants[rng.randrange(len(variants))]
+        ws.append([10000 + i, function, location, team, f"Afdeling {i % 50}",
+                   rng.choice(["Overhead", "Primair proces"]), round(rng.uniform(0.2, 1.0), 2),
+                   *label("F", _FUNCTIONS.index(function))])
+    wb.save(path)
+
+
+# --- meten -------------------------------------------------------------------------------
+def _rss_mb() -> Optional[float]:
+    """Huidig RSS (Linux /proc), of None als dat niet beschikbaar is."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024  # macOS: bytes, Linux: KiB
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Eén benchmark-run (bedoeld voor een vers proces); retourneert de meetwaarden."""
+    llm = FakeLLMClient(latency=case["latency"], jitter=case["jitter"], error_rate=case["error_rate"],
+                        rate_limit_rate=case["rate_limit_rate"], seed=case["seed"],
+                        invalid_rate=case["invalid_rate"], structured=case["structured"])
+    timings, report = StageTimings(), RunReport()
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    out = process_workbook(
+        customer_file=case["customer_path"],
+        schema_file=case["schema_path"],
+        header_rows={"oplegger pil": 1, "oplegger kosten": 4, "oplegger opbrengsten": 4},
+        provider_name="fake",
+        model="fake",
+        temperature=0.0,
+        top_k_codes=case["top_k"],
+        dry_run=case["dry_run"],
+        language="nl",
+        concurrency=case["concurrency"],
+        use_cache=False,
+        deduplicate=case["deduplicate"],
+        batch_size=case["batch_size"],
+        output_mode=case["output_mode"],
+        resume=False,
+        use_mappings=False,  # net als cache en journaal: geen gedeelde staat tussen metingen
+        report=report,
+        timings=timings,
+        llm_client=llm,
+        cascade=parse_cascade(case["cascade"]) if case["cascade"] else None,
+        local_model=case["local_model"],
+    )
+    wall = time.perf_counter() - started
+    measured = timings.as_dict()
+    rows = report.rows
+    return {
+        **{k: v for k, v in case.items() if not k.endswith("_path")},
+        "wall_seconds": round(wall, 4),
+        "rows_per_second": round(rows / wall, 1) if wall > 0 else None,
+        "stages": {stage: round(measured["seconds"].get(stage, 0.0), 4) for stage in STAGES},
+        "prompt_bytes": measured["counts"].get("prompt_bytes", 0),
+        "prompt_bytes_per_row": round(measured["counts"].get("prompt_bytes", 0) / rows, 1) if rows else 0,
+        "output_bytes": len(out.getvalue()),
+        "rss_before_mb": round(rss_before, 1) if rss_before is not None else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "fake_llm": {"calls": llm.calls, "errors": llm.errors, "rate_limited": llm.rate_limited},
+        "report": report.as_dict(),
+    }
+
+
+def _git_info() -> Dict[str, Any]:
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True,
+                                  timeout=10, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def _case_key(case: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (case["rows"], case["codes"], case["batch_size"], case["output_mode"], case["concurrency"],
+            case["top_k"], case["dry_run"])
+
+
+def compare(old_path: str, new_path: str) -> str:
+    """Vergelijk twee resultaatbestanden per case (rijen/s en duur per fase)."""
+    with open(old_path, encoding="utf-8") as fh:
+        old = json.load(fh)
+    with open(new_path, encoding="utf-8") as fh:
+        new = json.load(fh)
+    old_cases = {_case_key(c): c for c in old["cases"]}
+    lines = [f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}"]
+    for case in new["cases"]:
+        base = old_cases.get(_case_key(case))
+        label = (f"rows={case['rows']} codes={case['codes']} batch={case['batch_size']} "
+                 f"mode={case['output_mode']} conc={case['concurrency']} top_k={case['top_k']}"
+                 f"{' dry-run' if case['dry_run'] else ''}")
+        if base is None:
+            lines.append(f"{label}: nieuw ({case['rows_per_second']} rijen/s)")
+            continue
+        delta = (case["rows_per_second"] / base["rows_per_second"] - 1) * 100 if base["rows_per_second"] else 0.0
+        stages = ", ".join(f"{s} {base['stages'].get(s, 0):.2f}->{case['stages'].get(s, 0):.2f}s" for s in STAGES)
+        lines.append(f"{label}: {base['rows_per_second']} -> {case['rows_per_second']} rijen/s ({delta:+.1f}%); "
+                     f"piek-RSS {base['peak_rss_mb']} -> {case['peak_rss_mb']} MB; {stages}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark van process_workbook met synthetische data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000], help="Totaal aantal rijen (1k-100k)")
+    parser.add_argument("--codes", type=int, nargs="+", default=[50], help="Codes per categorie (10-300)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1])
+    parser.add_argument("--output-mode", nargs="+", choices=["openpyxl", "patch"], default=["openpyxl"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=0)
+    parser.add_argument("--unique-ratio", type=float, default=0.3, help="Fractie unieke rijen")
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="Alleen de offline heuristiek (geen nep-LLM)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconden per nep-LLM-call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Fractie antwoorden met een niet-bestaande code")
+    parser.add_argument("--structured", action="store_true", help="Nep-LLM met structured output (altijd geldige codes)")
+    parser.add_argument("--cascade", default="", metavar="PROVIDER:MODEL:DREMPEL,...",
+                        help="Model-cascade met de nep-LLM per tier, bijv. 'fake:klein:0.8,fake:groot'")
+    parser.add_argument("--label-ratio", type=float, default=0.0,
+                        help="Fractie rijen met een bestaande codering (trainingsdata voor het lokale model)")
+    parser.add_argument("--local-model", action="store_true", help="Lokaal model vóór de nep-LLM")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Pad van het JSON-resultaat")
+    parser.add_argument("--compare", nargs=2, metavar=("OUD", "NIEUW"), help="Vergelijk twee resultaatbestanden")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(compare(*args.compare))
+        return 0
+
+    meta = {**_git_info(), "python": platform.python_version(), "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory(prefix="toedeling-bench-") as tmp:
+        schemas: Dict[int, str] = {}
+        customers: Dict[Tuple[int, int], str] = {}
+        for rows, codes, batch_size, output_mode in itertools.product(args.rows, args.codes, args.batch_size, args.output_mode):
+            if codes not in schemas:
+                schemas[codes] = os.path.join(tmp, f"schema_{codes}.xlsx")
+                synthetic_schema(schemas[codes], codes, seed=args.seed)
+                load_codeschema_cached(schemas[codes])  # alle cases laden het schema uit de cache
+            customer = (rows, codes if args.label_ratio > 0 else 0)  # labels verwijzen naar de codes
+            if customer not in customers:
+                customers[customer] = os.path.join(tmp, f"klant_{rows}_{customer[1]}.xlsx")
+                synthetic_customer(customers[customer], rows, unique_ratio=args.unique_ratio, seed=args.seed,
+                                   label_ratio=args.label_ratio, n_codes=codes)
+            case = dict(rows=rows, codes=codes, batch_size=batch_size, output_mode=output_mode,
+                        concurrency=args.concurrency, top_k=args.top_k, unique_ratio=args.unique_ratio,
+                        deduplicate=not args.no_dedup, dry_run=args.dry_run, latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                        invalid_rate=args.invalid_rate, structured=args.structured, cascade=args.cascade,
+                        local_model=args.local_model, label_ratio=args.label_ratio,
+                        seed=args.seed, customer_path=customers[customer], schema_path=schemas[codes])
+            # Vers proces per case: piek-RSS en caches van eerdere cases tellen niet mee
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_case, case).result()
+            results.append(result)
+            stages = " ".join(f"{s}={result['stages'][s]:.2f}" for s in STAGES)
+            print(f"rows={rows} codes={codes} batch={batch_size} mode={output_mode}: "
+                  f"{result['rows_per_second']} rijen/s, {result['wall_seconds']:.2f}s, "
+                  f"piek {result['peak_rss_mb']} MB, {result['prompt_bytes_per_row']} prompt-B/rij, "
+                  f"geldig 1e poging {result['report']['valid_first_try_rate']} | {stages}",
+                  file=sys.stderr)
+            for tier in result["report"]["cascade"]:
+                print(f"  tier {tier['model']} (drempel {tier['threshold']}): {tier['calls']} calls, "
+                      f"{tier['accepted']} geaccepteerd, {tier['escalated']} doorgestuurd, "
+                      f"overeenstemming {tier['agreement_rate']}", file=sys.stderr)
+
+    output = args.output or os.path.join(
+        CACHE_DIR, "benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}_{meta['commit'] or 'onbekend'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "cases": results}, fh, indent=2)
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
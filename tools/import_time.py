@@ -0,0 +1,102 @@
+"""
+Importtijd van de app, gemeten met `python -X importtime` in een vers proces per fase:
+
+- `startup`: wat `main_app.py` bij de eerste weergave importeert (Streamlit, jobs, register);
+- `run`: wat er bij de eerste run bij komt (writer, loaders, de gekozen provider).
+
+Per fase de totale importtijd, de zwaarste top-level packages en welke van de zware packages
+(`HEAVY`) geladen zijn. Met `--check` faalt het script (exitcode 1) als de startfase een zwaar
+package importeert, bijv. omdat een provider of writer weer bovenaan een module geïmporteerd wordt.
+
+Gebruik:
+    python -m tools.import_time
+    python -m tools.import_time --repeat 5 --top 15 --check
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES: Dict[str, List[str]] = {
+    "startup": ["streamlit", "config", "jobs", "llm_providers.registry", "utils.run_report"],
+    "run": ["writers.excel_writer", "llm_providers.openai_provider"],
+}
+HEAVY = ("pandas", "numpy", "openpyxl", "openai", "tiktoken")
+
+
+def measure(modules: List[str], preload: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Importeer `modules` in een vers proces (na `preload`, dat niet meetelt) en retourneer de
+    totale importtijd in seconden, de cumulatieve tijd per top-level package en de geladen
+    zware packages (ook als ze indirect geïmporteerd worden).
+    """
+    code = "import importlib, sys\n"
+    for name in preload or []:
+        code += f"importlib.import_module({name!r})\n"
+    code += "sys.stderr.write('--start--\\n')\n"
+    for name in modules:
+        code += f"importlib.import_module({name!r})\n"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_DIR,
+                          capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=REPO_DIR))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import mislukt")
+    lines = proc.stderr.split("--start--\n", 1)[-1].splitlines()
+    packages: Dict[str, float] = defaultdict(float)
+    loaded = set()
+    total = 0.0
+    for line in lines:
+        # "import time:      self [us] |      cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:].rstrip()  # na de vaste spatie: inspringing = geneste import
+        loaded.add(name.strip().split(".")[0])
+        if name == name.lstrip():  # alleen imports op het hoogste niveau (cumulatief, dus niets dubbel)
+            seconds = int(cumulative) / 1e6
+            packages[name.split(".")[0]] += seconds
+            total += seconds
+    return {"seconds": total, "packages": dict(packages), "heavy": sorted(loaded.intersection(HEAVY))}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importtijd van de app (start en eerste run).")
+    parser.add_argument("--repeat", type=int, default=3, help="Metingen per fase (de mediaan telt)")
+    parser.add_argument("--top", type=int, default=10, help="Aantal zwaarste packages per fase")
+    parser.add_argument("--check", action="store_true", help="Exitcode 1 als de startfase een zwaar package importeert")
+    parser.add_argument("--output", help="Pad van het JSON-resultaat")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Any] = {}
+    preload: List[str] = []
+    for phase, modules in PHASES.items():
+        runs = [measure(modules, preload) for _ in range(max(1, args.repeat))]
+        median = sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2]
+        heavy = median["heavy"]
+        results[phase] = {"modules": modules, "seconds": round(statistics.median(r["seconds"] for r in runs), 4),
+                          "packages": median["packages"], "heavy": heavy}
+        print(f"{phase}: {results[phase]['seconds']:.3f}s ({', '.join(modules)})"
+              + (f" — zware packages: {', '.join(heavy)}" if heavy else ""))
+        for name, seconds in sorted(median["packages"].items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {seconds:8.3f}s  {name}")
+        preload += modules  # de runfase meet alleen wat er na de start nog bij komt
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(args.output)
+    if args.check and results["startup"]["heavy"]:
+        print(f"Startfase importeert zware packages: {', '.join(results['startup']['heavy'])}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Lokale stand-in voor de OpenAI Chat Completions API (en de Files/Batch API voor de
+batch-modus), om de provider-laag (pooling, retries, circuit breaker) zonder echte API-calls
+te testen.
+
+Gebruik:
+    python -m tools.stub_openai_server --port 8765 --error-rate 0.1 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run main_app.py
+
+of vanuit Python: `server, base_url = start_stub_server()` (draait in een achtergrond-thread).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from email.policy import default as email_policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+CODE_RE = re.compile(r"^\* \[([^\]]+)\]", re.MULTILINE)
+ROW_RE = re.compile(r"^Rij (\d+):", re.MULTILINE)
+
+
+@dataclass
+class StubOptions:
+    latency: float = 0.0
+    error_rate: float = 0.0        # kans op een 500
+    rate_limit_rate: float = 0.0   # kans op een 429 (met Retry-After)
+    retry_after: float = 0.1
+    down: bool = False             # altijd 503 (provider-storing)
+    batch_delay: float = 0.5       # seconden voordat een batch wordt verwerkt
+    seed: int = 0
+
+
+def _answer(messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Deterministisch antwoord: de eerste kandidaat-code uit de prompts. Met een json_schema
+    response_format komt een batch-antwoord in het object-veld `rijen`, zoals bij de echte API.
+    """
+    text = "\n".join(str(m.get("content", "")) for m in messages)
+    codes = CODE_RE.findall(text)
+    code = codes[0] if codes else None
+    entry = {"code": code, "argumentatie": "Stub-antwoord.", "vraag": None, "confidence": 0.5}
+    rows = ROW_RE.findall(text)
+    if rows:
+        entries = [dict(entry, rij=int(r)) for r in rows]
+        structured = (response_format or {}).get("type") == "json_schema"
+        return json.dumps({"rijen": entries} if structured else entries)
+    return json.dumps(entry)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubServer"
+
+    def log_message(self, *args: Any) -> None:  # stil
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        raw = self.rfile.read(length)
+        self.server.count("requests")
+        path = self.path.rstrip("/")
+
+        if path.endswith("/files"):
+            self._send(200, self.server.add_file(*_multipart_file(self.headers.get("Content-Type", ""), raw)))
+            return
+        payload = json.loads(raw or b"{}")
+        if path.endswith("/batches"):
+            self._send(200, self.server.create_batch(payload))
+            return
+        m = re.search(r"/batches/([^/]+)/cancel$", path)
+        if m:
+            batch = self.server.cancel_batch(m.group(1))
+            self._send(200 if batch else 404, batch or {"error": {"message": "Onbekende batch"}})
+            return
+        if not path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Onbekend pad {self.path}"}})
+            return
+        status, body, headers = self.server.complete(payload)
+        self._send(status, body, headers)
+
+    def do_DELETE(self) -> None:
+        m = re.search(r"/files/([^/]+)$", self.path.rstrip("/"))
+        if m and self.server.files.pop(m.group(1), None) is not None:
+            self._send(200, {"id": m.group(1), "object": "file", "deleted": True})
+            return
+        self._send(404, {"error": {"message": f"Onbekend pad {self.path}"}})
+
+    def do_GET(self) -> None:
+        path = self.path.rstrip("/")
+        m = re.search(r"/files/([^/]+)/content$", path)
+        if m and m.group(1) in self.server.files:
+            data = self.server.files[m.group(1)]["data"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        m = re.search(r"/batches/([^/]+)$", path)
+        if m and m.group(1) in self.server.batches:
+            self._send(200, self.server.batch_state(m.group(1)))
+            return
+        self._send(404, {"error": {"message": f"Onbekend pad {self.path}"}})
+
+
+def _multipart_file(content_type: str, body: bytes) -> Tuple[str, bytes, str]:
+    """(bestandsnaam, inhoud, purpose) uit een multipart/form-data upload."""
+    msg = BytesParser(policy=email_policy).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    filename, data, purpose = "upload.jsonl", b"", ""
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name == "file":
+            filename = part.get_filename() or filename
+            data = part.get_payload(decode=True) or b""
+        elif name == "purpose":
+            purpose = (part.get_payload(decode=True) or b"").decode()
+    return filename, data, purpose
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], options: StubOptions):
+        super().__init__(address, _Handler)
+        self.options = options
+        self.stats: Dict[str, int] = {"requests": 0, "rate_limited": 0, "errors": 0}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._rng = random.Random(options.seed)
+        self._lock = threading.Lock()
+
+    # --- chat completions -----------------------------------------------------------------
+    def complete(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """(status, body, headers) van één chat completion, met de ingestelde storingen."""
+        opts = self.options
+        if opts.latency:
+            time.sleep(opts.latency)
+        if opts.down:
+            return 503, {"error": {"message": "Service unavailable (stub)"}}, {}
+        roll = self.roll()
+        if roll < opts.rate_limit_rate:
+            self.count("rate_limited")
+            return 429, {"error": {"message": "Rate limit (stub)"}}, {"Retry-After": str(opts.retry_after)}
+        if roll < opts.rate_limit_rate + opts.error_rate:
+            self.count("errors")
+            return 500, {"error": {"message": "Internal error (stub)"}}, {}
+
+        messages = payload.get("messages", [])
+        content = _answer(messages, payload.get("response_format"))
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }, {}
+
+    # --- files + batches (Batch API) -------------------------------------------------------
+    def add_file(self, filename: str, data: bytes, purpose: str) -> Dict[str, Any]:
+        with self._lock:
+            file_id = f"file-stub{len(self.files) + 1}"
+            self.files[file_id] = {"data": data, "info": {
+                "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose or "batch", "status": "processed"}}
+        return self.files[file_id]["info"]
+
+    def create_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch aanmaken; de verzoeken worden na `batch_delay` seconden op de achtergrond verwerkt."""
+        with self._lock:
+            batch_id = f"batch_stub{len(self.batches) + 1}"
+            lines = self.files[payload["input_file_id"]]["data"].decode("utf-8").splitlines()
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": payload.get("endpoint"),
+                "input_file_id": payload["input_file_id"], "completion_window": payload.get("completion_window", "24h"),
+                "status": "validating", "created_at": int(time.time()), "metadata": payload.get("metadata"),
+                "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": sum(1 for line in lines if line.strip()), "completed": 0, "failed": 0},
+            }
+        threading.Thread(target=self._run_batch, args=(batch_id, lines), daemon=True).start()
+        return self.batch_state(batch_id)
+
+    def _run_batch(self, batch_id: str, lines: List[str]) -> None:
+        time.sleep(self.options.batch_delay)
+        with self._lock:
+            if self.batches[batch_id]["status"] != "validating":
+                return  # geannuleerd
+            self.batches[batch_id]["status"] = "in_progress"
+        output, errors = [], []
+        for n, line in enumerate(lines):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            status, body, _ = self.complete(request.get("body") or {})
+            entry = {"id": f"batch_req_{n}", "custom_id": request.get("custom_id"),
+                     "response": {"status_code": status, "request_id": f"req_{n}", "body": body}, "error": None}
+            (output if status == 200 else errors).append(json.dumps(entry))
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "cancelled":
+                return
+            counts = batch["request_counts"]
+            counts["completed"], counts["failed"] = len(output), len(errors)
+            if output:
+                batch["output_file_id"] = self._store_locked("\n".join(output) + "\n", "batch_output")
+            if errors:
+                batch["error_file_id"] = self._store_locked("\n".join(errors) + "\n", "batch_error")
+            batch["status"] = "completed"
+
+    def _store_locked(self, text: str, purpose: str) -> str:
+        file_id = f"file-stub{len(self.files) + 1}"
+        data = text.encode("utf-8")
+        self.files[file_id] = {"data": data, "info": {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}}
+        return file_id
+
+    def batch_state(self, batch_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.batches[batch_id]))
+
+    def cancel_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] not in ("completed", "failed", "expired"):
+                batch["status"] = "cancelled"
+        return self.batch_state(batch_id)
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_stub_server(port: int = 0, **options: Any) -> Tuple[StubServer, str]:
+    """Start de stub-server in een achtergrond-thread; retourneert (server, base_url)."""
+    server = StubServer(("127.0.0.1", port), StubOptions(**options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.base_url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokale stub voor de OpenAI Chat Completions API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--down", action="store_true")
+    parser.add_argument("--batch-delay", type=float, default=0.5, help="Seconden voordat een batch wordt verwerkt")
+    args = parser.parse_args()
+    server = StubServer(("127.0.0.1", args.port), StubOptions(
+        latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, down=args.down, batch_delay=args.batch_delay,
+    ))
+    print(f"Stub-server actief op {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: geen vergrendeling
+    fcntl = None  # type: ignore
+
+# (tabblad, rij) -> (fingerprint, code, argumentatie, vraag)
+Entry = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def row_fingerprint(context: Dict[str, Any], version: str) -> str:
+    """
+    Vingerafdruk van de invoer van één rij: de contextwaarden plus een versie-string die
+    schema, model en andere uitkomst-bepalende instellingen samenvat.
+    """
+    payload = json.dumps([version, sorted((k, str(v)) for k, v in context.items() if v not in (None, ""))],
+                         ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class JournalBusy(RuntimeError):
+    """Een andere run (thread of proces) schrijft al in dit journaal."""
+
+
+def journal_path(directory: str, workbook_name: str) -> str:
+    """
+    Eén journaal per klantbestand(snaam), zodat een nieuwe levering van hetzelfde bestand het
+    terugvindt. Staat er een map in de naam (pad van de CLI), dan telt die mee:
+    'a/Uitvraag.xlsx' en 'b/Uitvraag.xlsx' krijgen elk een eigen journaal.
+    """
+    folder, base = os.path.split(workbook_name)
+    stem = os.path.splitext(base)[0] or "workbook"
+    safe = re.sub(r"[^\w.-]+", "_", stem)[:100]
+    if folder:
+        safe += "_" + hashlib.sha256(os.path.abspath(folder).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(directory, "checkpoints", f"{safe}.jsonl")
+
+
+class CheckpointJournal:
+    """
+    Append-only journaal (JSONL) van geclassificeerde rijen. Elke regel wordt direct
+    weggeschreven, zodat een afgebroken run later kan hervatten; de laatste regel per
+    (tabblad, rij) telt.
+
+    Eén schrijver per journaal: zolang het open is, houdt het een exclusieve `flock` op
+    `<pad>.lock`. Een tweede run (ook in een ander proces) krijgt `JournalBusy`, zodat het
+    compacteren (`os.replace`) nooit regels van een andere run wegschrijft.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[Tuple[str, int], Entry] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock_fh = open(path + ".lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_fh.close()
+                raise JournalBusy(f"Checkpoint-journaal in gebruik: {path}") from None
+        lines = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    lines += 1
+                    try:
+                        e = json.loads(line)
+                        self.entries[(e["sheet"], int(e["row"]))] = (e["fp"], e.get("code"), e.get("arg"), e.get("note"))
+                    except Exception:
+                        continue  # bijv. een half geschreven laatste regel na een crash
+        if lines > 2 * len(self.entries) + 100:
+            self._compact()
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def _compact(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for (sheet, row), entry in self.entries.items():
+                fh.write(self._line(sheet, row, entry))
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _line(sheet: str, row: int, entry: Entry) -> str:
+        fp, code, arg, note = entry
+        return json.dumps({"sheet": sheet, "row": row, "fp": fp, "code": code, "arg": arg, "note": note},
+                          ensure_ascii=False) + "\n"
+
+    def lookup(self, sheet: str, row: int, fingerprint: str) -> Optional[Entry]:
+        """Journaalregel voor deze rij, maar alleen als de vingerafdruk ongewijzigd is."""
+        entry = self.entries.get((sheet, row))
+        return entry if entry is not None and entry[0] == fingerprint else None
+
+    def record(self, sheet: str, row: int, fingerprint: str,
+               code: Optional[str], argument: Optional[str], note: Optional[str]) -> None:
+        entry: Entry = (fingerprint, code, argument, note)
+        with self._lock:
+            self.entries[(sheet, row)] = entry
+            self._fh.write(self._line(sheet, row, entry))
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+            self._lock_fh.close()  # geeft de flock vrij
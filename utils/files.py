@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+
+OUTPUT_SUFFIX = "_coderingsvoorstel"
+
+
+def read_bytes(file_or_path) -> bytes:
+    """Inhoud van een pad, bytes of (Streamlit-)upload als bytes."""
+    if isinstance(file_or_path, (bytes, bytearray)):
+        return bytes(file_or_path)
+    if hasattr(file_or_path, "getvalue"):
+        return file_or_path.getvalue()
+    if hasattr(file_or_path, "read"):
+        file_or_path.seek(0)
+        return file_or_path.read()
+    with open(file_or_path, "rb") as fh:
+        return fh.read()
+
+
+def output_path(path: str, output_mode: str, suffix: str = OUTPUT_SUFFIX) -> str:
+    """Naam van het uitvoerbestand bij klantbestand `path`."""
+    stem, ext = os.path.splitext(path)
+    # openpyxl bewaart geen macro's; alleen de patch-modus kan .xlsm als .xlsm teruggeven
+    return f"{stem}{suffix}{ext if output_mode == 'patch' else '.xlsx'}"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Schrijf via een tijdelijk bestand + rename, zodat lezers nooit een half bestand zien."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
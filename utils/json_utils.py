@@ -2,25 +2,125 @@ from __future__ import annotations
 
 import json
 import re
-from typing import Any, Optional
+from typing import Any, Iterator, List, Optional
+
+_DECODER = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*([\s\S]*?)(?:```|$)")
+_MAX_CUTS = 5  # aantal afkappunten dat bij een afgebroken antwoord wordt geprobeerd
+
+
+def _strip_fences(text: str) -> str:
+    """Inhoud van een ```json ... ```-blok (ook als het afsluitende hek ontbreekt)."""
+    m = _FENCE_RE.search(text)
+    return m.group(1) if m else text
+
+
+def iter_json_values(text: str) -> Iterator[Any]:
+    """
+    Alle volledige JSON-objecten/-arrays in de tekst, van links naar rechts (met geneste
+    haakjes en accolades in strings). Omringende tekst en code-hekken worden overgeslagen.
+    """
+    i = 0
+    while True:
+        starts = [p for p in (text.find("{", i), text.find("[", i)) if p >= 0]
+        if not starts:
+            return
+        start = min(starts)
+        try:
+            value, end = _DECODER.raw_decode(text, start)
+        except ValueError:
+            i = start + 1
+            continue
+        yield value
+        i = end
+
+
+def complete_truncated(text: str, start: int = 0) -> Optional[Any]:
+    """
+    Parse een afgebroken JSON-waarde vanaf `start` (bijv. een gestreamd of op max_tokens
+    afgekapt antwoord): open strings en haakjes worden gesloten; lukt dat niet, dan wordt
+    teruggevallen op het laatste volledige element. None als er niets bruikbaars overblijft.
+    """
+    stack: List[str] = []
+    in_str = escaped = False
+    cuts: List[tuple] = []  # (positie van een komma, sluittekens op dat punt)
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack.pop() != ch or not stack:
+                return None  # ongeldig, of al volledig (dan vindt `iter_json_values` het)
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+    if not stack:
+        return None
+    closers = "".join(reversed(stack))
+    tail = text[start:]
+    candidates = [tail + ('"' if in_str else "") + closers, tail.rstrip().rstrip(",") + closers]
+    candidates += [text[start:pos] + closing for pos, closing in reversed(cuts[-_MAX_CUTS:])]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
 
-JSON_BLOCK_RE = re.compile(r"\{[\s\S]*?\}", re.MULTILINE)
 
 def extract_first_json_block(text: str) -> Optional[dict[str, Any]]:
-    """Zoekt naar de eerste JSON-achtige blok in de tekst en probeert te parsen."""
+    """
+    Eerste JSON-object in de tekst: het hele antwoord, een ```json-blok, een object tussen
+    andere tekst of (als het antwoord is afgebroken) het aangevulde begin ervan.
+    """
     if not text:
         return None
-    # Probeer eerst direct json
     try:
-        return json.loads(text)
-    except Exception:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
         pass
-    # Zoek blok
-    m = JSON_BLOCK_RE.search(text)
-    if not m:
+    body = _strip_fences(text)
+    for value in iter_json_values(body):
+        if isinstance(value, dict):
+            return value
+    start = body.find("{")
+    data = complete_truncated(body, start) if start >= 0 else None
+    return data if isinstance(data, dict) else None
+
+
+def extract_json_array(text: str) -> Optional[List[Any]]:
+    """
+    Zoekt naar een JSON-array in de tekst (ook als die in een object met één lijst-veld zit,
+    zoals bij structured output); een afgebroken array levert de volledige elementen op.
+    """
+    if not text:
         return None
-    snippet = m.group(0)
+
+    def as_list(data: Any) -> Optional[List[Any]]:
+        if isinstance(data, dict):
+            lists = [v for v in data.values() if isinstance(v, list)]
+            data = lists[0] if len(lists) == 1 else None
+        return data if isinstance(data, list) else None
+
     try:
-        return json.loads(snippet)
-    except Exception:
-        return None
+        return as_list(json.loads(text))
+    except ValueError:
+        pass
+    body = _strip_fences(text)
+    for value in iter_json_values(body):
+        found = as_list(value)
+        if found is not None:
+            return found
+    starts = [p for p in (body.find("{"), body.find("[")) if p >= 0]
+    return as_list(complete_truncated(body, min(starts))) if starts else None
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# rij -> (rijtekst, code, argumentatie, vraag)
+RowOutcome = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+class RunCancelled(Exception):
+    """De run is op verzoek van de gebruiker afgebroken."""
+
+
+@dataclass
+class SheetProgress:
+    """Voortgang en tussenresultaten van één Oplegger-tabblad."""
+    title: str
+    total: int                       # (geschat) aantal te verwerken rijen
+    estimated: bool = True           # True zolang het blad nog niet is ingelezen
+    done: int = 0
+    header_row: int = 1
+    target_indices: Dict[str, int] = field(default_factory=dict)
+    new_headers: Dict[int, str] = field(default_factory=dict)
+    outcomes: Dict[int, RowOutcome] = field(default_factory=dict)
+
+
+class RunProgress:
+    """
+    Thread-safe voortgang van één `process_workbook`-run: per tabblad het aantal verwerkte
+    rijen en de tussenresultaten (voor een incrementele weergave en een tussentijdse download),
+    plus doorvoer, ETA en een annuleer-vlag.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.sheets: Dict[str, SheetProgress] = {}
+        self.current_sheet: Optional[str] = None
+        self.status: Optional[str] = None  # vrije statustekst, bijv. van een lopende batch
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._timed_done = 0          # rijen die echt verwerkt zijn (excl. hervat/overgeslagen)
+        self._first_work_at: Optional[float] = None
+
+    # --- annuleren ---------------------------------------------------------------------
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise RunCancelled()
+
+    # --- bijwerken (vanuit `process_workbook` en worker-threads) ------------------------
+    def set_status(self, text: Optional[str]) -> None:
+        self.status = text
+
+    def estimate_sheet(self, title: str, rows: int) -> None:
+        with self._lock:
+            self.sheets.setdefault(title, SheetProgress(title=title, total=max(0, rows)))
+
+    def start_sheet(self, title: str, total: int, *, header_row: int,
+                    target_indices: Dict[str, int], new_headers: Dict[int, str]) -> None:
+        with self._lock:
+            sheet = self.sheets.setdefault(title, SheetProgress(title=title, total=total))
+            sheet.total, sheet.estimated = total, False
+            sheet.header_row = header_row
+            sheet.target_indices = dict(target_indices)
+            sheet.new_headers = dict(new_headers)
+            self.current_sheet = title
+
+    def rows_done(self, title: str, outcomes: Iterable[Tuple[int, RowOutcome]], *, timed: bool = True) -> None:
+        now = time.monotonic()
+        with self._lock:
+            sheet = self.sheets[title]
+            n = 0
+            for row_idx, outcome in outcomes:
+                sheet.outcomes[row_idx] = outcome
+                n += 1
+            self._count(sheet, n, timed, now)
+
+    def rows_skipped(self, title: str, n: int) -> None:
+        """Rijen die niets hoeven (ongewijzigd en al ingevuld); tellen mee als verwerkt."""
+        with self._lock:
+            self._count(self.sheets[title], n, False, time.monotonic())
+
+    def _count(self, sheet: SheetProgress, n: int, timed: bool, now: float) -> None:
+        sheet.done += n
+        if timed and n:
+            if self._first_work_at is None:
+                self._first_work_at = now
+            self._timed_done += n
+
+    # --- uitlezen (vanuit de UI) -------------------------------------------------------
+    @property
+    def rows_total(self) -> int:
+        with self._lock:
+            return sum(s.total for s in self.sheets.values())
+
+    @property
+    def rows_completed(self) -> int:
+        with self._lock:
+            return sum(s.done for s in self.sheets.values())
+
+    @property
+    def fraction(self) -> float:
+        total = self.rows_total
+        return min(1.0, self.rows_completed / total) if total else 0.0
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Verwerkte rijen per seconde sinds de eerste echte classificatie."""
+        with self._lock:
+            if self._first_work_at is None or not self._timed_done:
+                return None
+            elapsed = time.monotonic() - self._first_work_at
+            return self._timed_done / elapsed if elapsed > 0 else None
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        rate = self.throughput
+        if not rate:
+            return None
+        return max(0, self.rows_total - self.rows_completed) / rate
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def snapshot(self) -> List[SheetProgress]:
+        """Kopie van de voortgang per tabblad (veilig om buiten de lock te gebruiken)."""
+        with self._lock:
+            return [
+                SheetProgress(title=s.title, total=s.total, estimated=s.estimated, done=s.done,
+                              header_row=s.header_row, target_indices=dict(s.target_indices),
+                              new_headers=dict(s.new_headers), outcomes=dict(s.outcomes))
+                for s in self.sheets.values()
+            ]
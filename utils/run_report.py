@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import csv
+import io
+import threading
+from dataclasses import dataclass, field, fields
+from typing import Any, ClassVar, Dict, List, Optional
+
+
+@dataclass
+class RunReport:
+    """Tellers van één verwerkingsrun; wordt door `process_workbook` gevuld."""
+    rows: int = 0
+    unique_rows: int = 0
+    resumed_rows: int = 0
+    skipped_rows: int = 0
+    llm_calls: int = 0
+    fallbacks: int = 0
+    batch_retries: int = 0
+    shortlist_audited: int = 0
+    shortlist_audit_hits: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0           # herhaalde API-calls na tijdelijke fouten (provider + rate-limits)
+    # Antwoordkwaliteit per door het LLM geclassificeerde rij (ook bij batch_size > 1), elke rij één keer:
+    valid_first_try: int = 0   # eerste antwoord meteen een geldige code
+    repaired_answers: int = 0  # geldig na de reparatie-ronde of het losse nieuwe verzoek na een batch
+    invalid_answers: int = 0   # ook na reparatie ongeldig (heuristiek als vangnet)
+    repair_calls: int = 0
+    batch_requests: int = 0    # verzoeken in het batch-bestand (batch-modus)
+    batch_failed: int = 0      # daarvan zonder antwoord (rij valt terug op de heuristiek)
+    mapping_rows: int = 0      # rijen direct gecodeerd uit de mapping-store (goedgekeurde coderingen)
+    mapping_learned: int = 0   # nieuwe of gewijzigde goedgekeurde coderingen in de mapping-store
+    local_rows: int = 0        # rijen direct gecodeerd door het lokale model
+    local_audited: int = 0     # zekere voorspellingen die ter controle toch naar het LLM gingen
+    local_audit_agreed: int = 0  # ... waarop het LLM dezelfde code koos
+    cascade: List[Any] = field(default_factory=list)  # `TierStats` per tier van de model-cascade
+
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @property
+    def calls_saved(self) -> int:
+        """Aantal classificaties bespaard door ontdubbeling van gelijke rijen."""
+        return self.rows - self.unique_rows - self.resumed_rows - self.skipped_rows
+
+    @property
+    def shortlist_recall(self) -> Optional[float]:
+        """Fractie van de gecontroleerde rijen waarvan de gekozen code in de shortlist zat."""
+        if not self.shortlist_audited:
+            return None
+        return self.shortlist_audit_hits / self.shortlist_audited
+
+    @property
+    def valid_first_try_rate(self) -> Optional[float]:
+        """Fractie van de LLM-geclassificeerde rijen met meteen een geldige code in het eerste antwoord."""
+        answers = self.valid_first_try + self.repaired_answers + self.invalid_answers
+        return self.valid_first_try / answers if answers else None
+
+    @property
+    def local_agreement_rate(self) -> Optional[float]:
+        """Fractie van de gecontroleerde voorspellingen van het lokale model waarop het LLM het eens was."""
+        if not self.local_audited:
+            return None
+        return self.local_audit_agreed / self.local_audited
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        """Thread-safe ophogen van een teller (wordt vanuit worker-threads aangeroepen)."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out = {f.name: getattr(self, f.name) for f in fields(self)}
+        out["cascade"] = [tier.as_dict() for tier in self.cascade]
+        out["calls_saved"] = self.calls_saved
+        out["shortlist_recall"] = self.shortlist_recall
+        out["total_tokens"] = self.total_tokens
+        out["valid_first_try_rate"] = self.valid_first_try_rate
+        out["local_agreement_rate"] = self.local_agreement_rate
+        return out
+
+
+def performance_report(report: RunReport, timings: Dict[str, Any], meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Prestatierapport van één run (voor download als JSON): instellingen/omgeving (`meta`),
+    de tellers uit `report`, de fase-tijden en tellers uit `StageTimings.as_dict()` en de
+    uitsplitsing per tabblad.
+    """
+    return {
+        "meta": dict(meta or {}),
+        "totals": report.as_dict(),
+        "stages_seconds": {k: round(v, 4) for k, v in timings.get("seconds", {}).items()},
+        "counts": dict(timings.get("counts", {})),
+        "sheets": list(timings.get("sheets", [])),
+    }
+
+
+def performance_csv(perf: Dict[str, Any]) -> str:
+    """Het prestatierapport als CSV: één regel per tabblad plus een regel 'Totaal'."""
+    totals = dict(perf["totals"])
+    for i, tier in enumerate(totals.pop("cascade", []), start=1):
+        totals.update({f"tier{i}_{key}": tier[key] for key in ("calls", "latency", "accepted", "escalated", "agreement_rate")})
+    totals.update({f"{stage}_s": seconds for stage, seconds in perf["stages_seconds"].items()})
+    totals.update(perf["counts"])
+    rows = [dict(sheet) for sheet in perf["sheets"]] + [dict(totals, sheet="Totaal", category="")]
+    columns: List[str] = ["sheet", "category"]
+    for row in rows:
+        columns.extend(k for k in row if k not in columns)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
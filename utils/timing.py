@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+
+class StageTimings:
+    """
+    Opgetelde duur per fase van een run (load, context, prompt, classify, write, save) plus
+    eenvoudige tellers zoals prompt-bytes. Thread-safe: fases die in worker-threads lopen
+    (bijv. 'prompt', 'llm', 'parse') tellen op over alle threads. `sheets` bevat per tabblad
+    de uitsplitsing van tijden en tellers (zie `process_workbook`).
+    """
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.sheets: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def add_sheet(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.sheets.append(record)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"seconds": dict(self.seconds), "counts": dict(self.counts), "sheets": list(self.sheets)}
+
+
+def timed(timings: Optional[StageTimings], name: str) -> ContextManager[None]:
+    """`timings.stage(name)`, of een no-op als er niet gemeten wordt."""
+    return timings.stage(name) if timings is not None else nullcontext()
+
+
+_PROFILING = threading.Lock()  # één cProfile-opname tegelijk per proces
+_current = threading.local()   # actieve ProfileCapture van de aanroepende thread
+
+
+def profile_worker_initializer() -> Optional[Callable[[], None]]:
+    """
+    `initializer` voor een `ThreadPoolExecutor`: draait de aanroepende thread onder een
+    `ProfileCapture`, dan profileren de workers van de pool mee; anders None.
+    """
+    capture = getattr(_current, "capture", None)
+    return capture._enable_worker if capture is not None else None
+
+
+class ProfileCapture:
+    """
+    Contextmanager die het blok onder cProfile uitvoert; daarna staan in `text` de top-`top`
+    functies op cumulatieve tijd en in `raw` de statistieken in het .prof-formaat (bijv. voor
+    snakeviz). Ook beschikbaar als het blok met een fout (of annulering) eindigt. Worker-threads
+    van pools met `profile_worker_initializer()` (de LLM-calls) krijgen een eigen profiler; hun
+    statistieken worden samengevoegd. Er loopt maximaal één opname tegelijk: is er al een
+    actief, dan draait het blok zonder profiler en meldt `text` dat.
+    """
+
+    def __init__(self, top: int = 40) -> None:
+        self.top = top
+        self.text = ""
+        self.raw = b""
+        self.active = False
+        self._profiler = cProfile.Profile()
+        self._workers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ProfileCapture":
+        if not _PROFILING.acquire(blocking=False):
+            self.text = "Geen cProfile-opname: er loopt al een andere geprofileerde run."
+            return self
+        self.active = True
+        _current.capture = self
+        self._profiler.enable()
+        return self
+
+    def _enable_worker(self) -> None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # Python 3.12+: de profiler van de aanroepende thread ziet alle threads al
+        with self._lock:
+            self._workers.append(profiler)
+
+    def __exit__(self, *exc: Any) -> None:
+        if not self.active:
+            return
+        try:
+            self._profiler.disable()
+            _current.capture = None
+            stats = pstats.Stats(self._profiler)
+            with self._lock:
+                workers, self._workers = self._workers, []
+            for profiler in workers:
+                profiler.create_stats()  # de pool is al gesloten: de worker-threads zijn klaar
+                stats.add(profiler)
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(self.top)
+            self.text = out.getvalue()
+            self.raw = marshal.dumps(stats.stats)  # zelfde formaat als pstats.Stats.dump_stats
+        finally:
+            self.active = False
+            _PROFILING.release()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional
+
+# Encoder per model; None = tiktoken (of het BPE-bestand, bijv. offline) niet beschikbaar
+_ENCODERS: Dict[str, Optional[Any]] = {}
+_ENCODERS_LOCK = threading.Lock()
+_DEFAULT_ENCODING = "o200k_base"  # gpt-4o(-mini) en nieuwer
+
+
+def estimate_tokens(text: str) -> int:
+    """Snelle schatting van het aantal tokens (~4 tekens per token voor NL/EN tekst)."""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def _encoder(model: str) -> Optional[Any]:
+    with _ENCODERS_LOCK:
+        if model not in _ENCODERS:
+            try:
+                import tiktoken
+
+                try:
+                    _ENCODERS[model] = tiktoken.encoding_for_model(model)
+                except KeyError:  # onbekend model: encoding van de huidige OpenAI-modellen
+                    _ENCODERS[model] = tiktoken.get_encoding(_DEFAULT_ENCODING)
+            except Exception:
+                _ENCODERS[model] = None
+        return _ENCODERS[model]
+
+
+def has_exact_tokenizer(model: str) -> bool:
+    """True als `count_tokens` voor dit model met tiktoken telt (anders: schatting)."""
+    return _encoder(model) is not None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Aantal tokens volgens tiktoken; valt terug op `estimate_tokens` als tiktoken niet beschikbaar is."""
+    if not text:
+        return 0
+    encoder = _encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
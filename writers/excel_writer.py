@@ -1,36 +1,366 @@
 from __future__ import annotations
 
+import json
+import os
+import time
 from io import BytesIO
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from openpyxl import load_workbook
 from openpyxl.workbook.workbook import Workbook
 
-from config import SHEET_CODEMAP, TARGET_COLUMNS
+from config import (
+    SHEET_CODEMAP,
+    TARGET_COLUMNS,
+    DEDUP_KEY_COLUMNS,
+    SHORTLIST_AUDIT_RATE,
+    LOCAL_MODEL_AUDIT_RATE,
+    CACHE_DIR,
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_AGE_DAYS,
+    BATCH_POLL_SECONDS,
+    USE_MAPPINGS,
+    CascadeTier,
+)
 from loaders.customer_workbook import (
     read_header,
-    ensure_target_columns,
-    iter_data_rows,
+    plan_target_columns,
+    read_sheet_frame,
     write_results,
 )
-from loaders.schema_loader import load_codeschema_excel, CodeRule
-from logic.prompts import build_system_prompt, build_user_prompt
+from loaders.schema_loader import CodeRule, schema_fingerprint
+from loaders.schema_cache import load_codeschema_cached
+from logic.prompts import (
+    RowContext,
+    build_batch_user_prompt,
+    build_user_prompt,
+    compile_system_prompt,
+    render_context_blocks,
+)
 from logic.classifier import (
     rank_candidates,
     build_row_text,
     pick_code_with_llm,
-    simple_rules_fallback,
+    pick_codes_with_llm_batch,
+    ClassificationResult,
 )
+from logic.offline_index import OfflineIndex
+from logic.estimate import RunEstimate
+from logic.cascade import MeteredClient, Tier, TierStats, needs_escalation
+from logic.local_model import LocalModel
+from logic.mapping_store import MappingStore
+from logic.structured_output import response_schema
+from logic.dispatcher import dispatch_concurrent
+from logic.dedup import group_rows, resolve_key_columns
+from writers.xlsx_patch import SheetPatch, patch_workbook
 from llm_providers.base import LLMClient
-from llm_providers.openai_provider import OpenAIClient
+from llm_providers.cache import CachedLLMClient, ResponseCache, cache_key
+from llm_providers.batch import BatchBackend, UnansweredClient, chat_request, run_batch
+from llm_providers.registry import create_batch_backend, create_client
+from utils.checkpoint import CheckpointJournal, JournalBusy, journal_path, row_fingerprint
+from utils.files import read_bytes
+from utils.progress import RunProgress
+from utils.run_report import RunReport
+from utils.timing import StageTimings
+from utils.tokens import count_tokens
+
+_CACHES: Dict[str, ResponseCache] = {}
+_MAPPINGS: Dict[str, MappingStore] = {}
 
 
 def _select_provider(name: str) -> LLMClient:
+    """Kies en instantieer de LLM-provider (zie `llm_providers.registry`; pas nu wordt hij geïmporteerd)."""
+    return create_client(name)
+
+
+def _response_cache(directory: str = CACHE_DIR) -> ResponseCache:
+    """Eén gedeelde `ResponseCache` per map binnen het proces."""
+    if directory not in _CACHES:
+        _CACHES[directory] = ResponseCache(directory, max_entries=CACHE_MAX_ENTRIES, max_age_days=CACHE_MAX_AGE_DAYS)
+    return _CACHES[directory]
+
+
+def _mapping_store(directory: str = CACHE_DIR) -> MappingStore:
+    """Eén gedeelde `MappingStore` per map binnen het proces."""
+    if directory not in _MAPPINGS:
+        _MAPPINGS[directory] = MappingStore(directory)
+    return _MAPPINGS[directory]
+
+
+def _match_sheet(title: str) -> Optional[str]:
+    """Sleutel uit `SHEET_CODEMAP` die in de tabbladnaam voorkomt (None = irrelevant tabblad)."""
+    name_l = title.strip().lower()
+    for key in SHEET_CODEMAP:
+        if key in name_l:
+            return key
+    return None
+
+
+Row = Tuple[int, Dict[str, Any], Optional[List[CodeRule]]]  # (rij-index, context, shortlist of None = volledig schema)
+
+
+def _prompt_context(row: Row, blocks: Optional[Dict[int, str]]) -> RowContext:
+    """Vooraf gerenderd contextblok van de rij (zie `render_context_blocks`), anders de context zelf."""
+    return blocks[row[0]] if blocks is not None else row[1]
+
+
+def _batch_candidates(batch: List[Row]) -> Optional[List[CodeRule]]:
+    """Kandidaten van een batch: vereniging van de shortlists van de rijen (None = volledig schema)."""
+    if not all(row[2] is not None for row in batch):
+        return None
+    seen: Dict[str, CodeRule] = {}
+    for row in batch:
+        for rule in row[2]:
+            seen.setdefault(rule.code, rule)
+    return list(seen.values())
+
+
+Prompt = Tuple[str, str, Optional[Dict[str, Any]]]  # (system-prompt, gebruikersprompt, antwoordschema)
+
+
+def _plan_prompts(
+    rows: List[Row],
+    rules: List[CodeRule],
+    *,
+    category: str,
+    language: str,
+    batch_size: int,
+    structured: bool,
+    blocks: Optional[Dict[int, str]] = None,
+) -> List[Prompt]:
+    """
+    De prompts die `_classify_rows` voor `rows` zou versturen; zonder reparaties en de losse
+    herkansingen van ontbrekende batchrijen (die pas na de antwoorden bekend zijn).
+    """
+    if batch_size <= 1:
+        schema = response_schema(rules) if structured else None
+        system_prompt = compile_system_prompt(category, rules, language=language)
+        shortlist_system_prompt = compile_system_prompt(category, language=language)
+        return [(system_prompt if row[2] is None else shortlist_system_prompt, build_user_prompt(_prompt_context(row, blocks), row[2]), schema)
+                for row in rows]
+    schema = response_schema(rules, batch=True) if structured else None
+    prompts: List[Prompt] = []
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        candidates = _batch_candidates(batch)
+        system_prompt = compile_system_prompt(category, rules if candidates is None else None, language=language, batch=True)
+        prompts.append((system_prompt, build_batch_user_prompt([_prompt_context(row, blocks) for row in batch], candidates), schema))
+    return prompts
+
+
+def _estimate_prompts(prompts: List[Prompt], model: str) -> int:
+    """Invoertokens van `prompts` (de vaste system-prompts één keer geteld per variant)."""
+    system_tokens: Dict[str, int] = {}
+    tokens = 0
+    for system_prompt, user_prompt, _ in prompts:
+        if system_prompt not in system_tokens:
+            system_tokens[system_prompt] = count_tokens(system_prompt, model)
+        tokens += system_tokens[system_prompt] + count_tokens(user_prompt, model)
+    return tokens
+
+
+def _classify_rows(
+    llm: Optional[LLMClient],
+    rows: List[Row],
+    rules: List[CodeRule],
+    *,
+    category: str,
+    model: str,
+    temperature: float,
+    language: str,
+    concurrency: int,
+    batch_size: int,
+    report: RunReport,
+    on_result: Optional[Callable[[Row, ClassificationResult], None]] = None,
+    on_progress: Optional[Callable[[Row, ClassificationResult], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    timings: Optional[StageTimings] = None,
+    accept: Optional[Callable[[Row, ClassificationResult], bool]] = None,
+    blocks: Optional[Dict[int, str]] = None,
+) -> List[Optional[ClassificationResult]]:
+    """
+    Classificeer rijen en retourneer de resultaten in dezelfde volgorde.
+    - Zonder LLM: eenvoudige heuristiek, voor alle rijen in één keer gescoord.
+    - `batch_size` > 1: meerdere rijen per call; ontbrekende of onbruikbare rijen
+      worden daarna los opnieuw geclassificeerd, zodat er nooit rijen verloren gaan.
+    - `on_result` wordt direct aangeroepen voor elke rij die een modelantwoord kreeg
+      (niet voor fallbacks), bijv. om een checkpoint-journaal bij te werken.
+    - `on_progress` wordt aangeroepen voor elke afgeronde rij (ook fallbacks); zodra
+      `should_stop()` True geeft, worden geen nieuwe calls gestart (`RunCancelled`).
+    - Met `accept` (model-cascade) krijgen rijen waarvan het antwoord niet wordt geaccepteerd,
+      of die zouden terugvallen op de heuristiek, None; voor die rijen volgen geen callbacks.
+    - `blocks`: vooraf gerenderde contextblokken per rij-index (anders per prompt opgebouwd).
+    """
+    offline = OfflineIndex.for_rules(rules)
+    timings = timings if timings is not None else StageTimings()
+
+    def count_retry(_exc: BaseException) -> None:
+        report.add("retries")
+
+    def finish(row: Row, result: ClassificationResult) -> ClassificationResult:
+        if on_progress is not None:
+            on_progress(row, result)
+        return result
+
+    def fallback(row: Row, _exc: Optional[BaseException] = None) -> ClassificationResult:
+        if accept is not None:
+            return _ESCALATE  # de volgende tier probeert het
+        # Robuust: bij fout terugvallen op heuristiek
+        report.add("fallbacks")
+        return finish(row, offline.classify(row[1]))
+
+    if llm is None:
+        report.add("fallbacks", len(rows))
+        return [finish(row, result) for row, result in zip(rows, offline.classify_many([row[1] for row in rows]))]
+
+    # Vast antwoordschema per categorie (codes als enum) voor providers met structured output
+    structured = getattr(llm, "supports_response_schema", False)
+    schema = response_schema(rules) if structured else None
+
+    # Vaste prefix per categorie; alleen shortlists gaan per rij mee in de gebruikersprompt
+    system_prompt = compile_system_prompt(category, rules, language=language)
+    shortlist_system_prompt = compile_system_prompt(category, language=language)
+    # Omvang van de vaste system-prompts één keer bepalen (niet per call opnieuw coderen)
+    prompt_bytes = {p: len(p.encode("utf-8")) for p in (system_prompt, shortlist_system_prompt)}
+
+    def classify(row: Row, first_try: bool = True) -> ClassificationResult:
+        with timings.stage("prompt"):
+            user_prompt = build_user_prompt(_prompt_context(row, blocks), row[2])
+            row_system_prompt = system_prompt if row[2] is None else shortlist_system_prompt
+            timings.count("prompt_bytes", prompt_bytes[row_system_prompt] + len(user_prompt.encode("utf-8")))
+        report.add("llm_calls")
+        result = pick_code_with_llm(
+            llm,
+            model=model,
+            system_prompt=row_system_prompt,
+            user_prompt=user_prompt,
+            temperature=temperature,
+            candidates=row[2] if row[2] is not None else rules,
+            response_schema=schema,
+            language=language,
+            report=report,
+            timings=timings,
+            first_try=first_try,
+        )
+        if accept is not None and not accept(row, result):
+            return _ESCALATE
+        if on_result is not None:
+            on_result(row, result)
+        return finish(row, result)
+
+    if batch_size <= 1:
+        results = dispatch_concurrent(rows, classify, fallback, max_concurrency=concurrency,
+                                      should_stop=should_stop, on_retry=count_retry)
+        return [None if r is _ESCALATE else r for r in results]
+
+    batch_schema = response_schema(rules, batch=True) if structured else None
+    batch_system_prompt = compile_system_prompt(category, rules, language=language, batch=True)
+    shortlist_batch_system_prompt = compile_system_prompt(category, language=language, batch=True)
+    prompt_bytes.update((p, len(p.encode("utf-8"))) for p in (batch_system_prompt, shortlist_batch_system_prompt))
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+    def classify_batch(batch: List[Row]) -> List[Optional[ClassificationResult]]:
+        candidates = _batch_candidates(batch)
+        with timings.stage("prompt"):
+            user_prompt = build_batch_user_prompt([_prompt_context(row, blocks) for row in batch], candidates)
+            batch_prompt = batch_system_prompt if candidates is None else shortlist_batch_system_prompt
+            timings.count("prompt_bytes", prompt_bytes[batch_prompt] + len(user_prompt.encode("utf-8")))
+        report.add("llm_calls")
+        results = pick_codes_with_llm_batch(
+            llm,
+            model=model,
+            system_prompt=batch_prompt,
+            user_prompt=user_prompt,
+            n_rows=len(batch),
+            temperature=temperature,
+            candidates=candidates if candidates is not None else rules,
+            response_schema=batch_schema,
+            language=language,
+            report=report,
+            timings=timings,
+        )
+        for i, (row, result) in enumerate(zip(batch, results)):
+            if result is not None and accept is not None and not accept(row, result):
+                results[i] = _ESCALATE
+            elif result is not None:
+                if on_result is not None:
+                    on_result(row, result)
+                finish(row, result)
+        return results
+
+    def batch_failed(batch: List[Row], _exc: BaseException) -> List[Optional[ClassificationResult]]:
+        return [None] * len(batch)
+
+    batch_results = dispatch_concurrent(batches, classify_batch, batch_failed, max_concurrency=concurrency,
+                                        should_stop=should_stop, on_retry=count_retry)
+    results: List[Optional[ClassificationResult]] = [r for chunk in batch_results for r in chunk]
+
+    # Rijen zonder bruikbaar antwoord los opnieuw proberen
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        report.add("batch_retries", len(missing))
+        retried = dispatch_concurrent([rows[i] for i in missing], lambda row: classify(row, first_try=False), fallback,
+                                      max_concurrency=concurrency, should_stop=should_stop, on_retry=count_retry)
+        for i, r in zip(missing, retried):
+            results[i] = r
+    return [None if r is _ESCALATE else r for r in results]
+
+
+# Markeert in `_classify_rows` een rij die naar de volgende tier van de cascade gaat
+_ESCALATE = ClassificationResult(code=None, argumentatie=None, vraag=None, confidence=0.0)
+
+
+def _classify_cascade(
+    tiers: List[Tier],
+    rows: List[Row],
+    rules: List[CodeRule],
+    *,
+    on_result: Optional[Callable[[Row, ClassificationResult], None]] = None,
+    on_progress: Optional[Callable[[Row, ClassificationResult], None]] = None,
+    **options: Any,
+) -> List[ClassificationResult]:
     """
-    Kies en instantieer de LLM-provider (modulair). Voeg hier eenvoudig extra providers toe.
+    Model-cascade over `_classify_rows`: elke tier classificeert de rijen die de vorige tiers
+    niet zeker genoeg wisten (zie `needs_escalation`); de laatste tier beslist altijd (met de
+    heuristiek als vangnet). Callbacks volgen alleen voor het uiteindelijke antwoord. Per tier
+    wordt bijgehouden hoe vaak de volgende tier dezelfde code koos als de doorgestuurde.
     """
-    if name == "openai":
-        return OpenAIClient()
-    raise RuntimeError(f"Onbekende provider: {name}")
+    results: List[Optional[ClassificationResult]] = [None] * len(rows)
+    pending = list(range(len(rows)))
+    previous: Dict[int, Optional[str]] = {}  # rij-index -> code van de vorige tier voor doorgestuurde rijen
+    answered: Dict[int, Optional[str]] = {}  # rij-index -> geaccepteerde modelcode (geen fallback)
+
+    def record(row: Row, result: ClassificationResult) -> None:
+        answered[row[0]] = result.code
+        if on_result is not None:
+            on_result(row, result)
+    for level, tier in enumerate(tiers):
+        last = level == len(tiers) - 1
+        current: Dict[int, Optional[str]] = {}
+
+        def accept(row: Row, result: ClassificationResult, tier: Tier = tier,
+                   current: Dict[int, Optional[str]] = current) -> bool:
+            if needs_escalation(result, tier.threshold):
+                current[row[0]] = result.code
+                return False
+            return True
+
+        outcome = _classify_rows(
+            tier.llm, [rows[i] for i in pending], rules, model=tier.model,
+            on_result=record, on_progress=on_progress, accept=None if last else accept, **options,
+        )
+        escalated: List[int] = []
+        for i, result in zip(pending, outcome):
+            if result is None:
+                escalated.append(i)
+            else:
+                results[i] = result
+            key = rows[i][0]
+            code = answered.get(key, current.get(key))
+            if previous.get(key) is not None and code is not None:
+                tiers[level - 1].stats.add(compared=1, agreed=int(code == previous[key]))
+        tier.stats.add(rows=len(pending), accepted=len(pending) - len(escalated), escalated=len(escalated))
+        pending, previous = escalated, current
+    return results  # type: ignore[return-value]
 
 
 def process_workbook(
@@ -44,38 +374,321 @@ def process_workbook(
     top_k_codes: int,
     dry_run: bool,
     language: str,
+    concurrency: int = 8,
+    use_cache: bool = True,
+    deduplicate: bool = True,
+    batch_size: int = 1,
+    output_mode: str = "openpyxl",
+    candidate_token_budget: int = 0,
+    resume: bool = True,
+    journal_name: Optional[str] = None,
+    report: Optional[RunReport] = None,
+    progress: Optional[RunProgress] = None,
+    timings: Optional[StageTimings] = None,
+    llm_client: Optional[LLMClient] = None,
+    sample_rows: int = 0,
+    estimate: Optional[RunEstimate] = None,
+    execution_mode: str = "interactive",
+    batch_backend: Optional[BatchBackend] = None,
+    batch_poll_seconds: float = BATCH_POLL_SECONDS,
+    cascade: Optional[List[CascadeTier]] = None,
+    local_model: bool = False,
+    use_mappings: bool = USE_MAPPINGS,
 ) -> BytesIO:
     """
     Verwerkt het klantbestand:
-    - Leest codeschema (formatie/kosten/opbrengsten)
+    - Leest codeschema (formatie/kosten/opbrengsten); gecached op bestandshash
     - Loopt door relevante 'Oplegger'-tabbladen
+    - Classificeert de rijen per tabblad gelijktijdig (max. `concurrency` LLM-calls tegelijk)
+    - Classificeert rijen met gelijke sleutelkolommen (`DEDUP_KEY_COLUMNS`) maar één keer
+    - Beperkt met `top_k_codes` en/of `candidate_token_budget` de kandidaat-codes per rij tot een
+      shortlist (0 = volledig schema); een steekproef meet hoe vaak de gekozen code erin zat
+    - Stuurt met `batch_size` > 1 meerdere rijen per LLM-call (schema één keer per prompt)
+    - Hergebruikt eerdere modelantwoorden uit de schijf-cache (tenzij `use_cache=False`)
+    - Houdt (met LLM en `resume=True`) per rij een checkpoint-journaal bij met een vingerafdruk
+      van context + schema/model; een herhaalde run slaat ongewijzigde rijen over en hergebruikt
+      de eerder gevonden antwoorden (journaal per `journal_name`, standaard de bestandsnaam; draait
+      hetzelfde journaal al in een andere run, dan werkt deze run zonder journaal)
+    - Vult optioneel `report` met tellers van de run
+    - Publiceert optioneel in `progress` de voortgang en tussenresultaten per tabblad; na
+      `progress.cancel()` stopt de run zo snel mogelijk met `RunCancelled` (al gevonden
+      antwoorden staan dan in het journaal en in `progress`)
+    - Telt in `timings` de duur per fase op (load, context, prompt, classify, write, save)
+    - Gebruikt `llm_client` in plaats van de provider `provider_name` (bijv. een nep-client
+      voor benchmarks)
+    - Classificeert met `sample_rows` > 0 per tabblad alleen een gelijkmatig verspreide
+      steekproef van max. zoveel unieke rijen (preview); de overige rijen blijven leeg
+    - Vult optioneel `estimate` met de calls en tokens die een volledige run nog kost; de
+      mapping-store en het lokale model leren dan niet van dit bestand
+    - Verstuurt met `execution_mode="batch"` alle prompts in één keer via het batch-endpoint
+      van de provider (JSONL-verzoekbestand, pollen elke `batch_poll_seconds`); de antwoorden
+      gaan de antwoord-cache in (ook met `use_cache=False`) en worden daarna per rij verwerkt
+      zoals een gewone run.
+      Rijen zonder antwoord in de batch vallen terug op de heuristiek
+    - Gebruikt met `cascade` (meer dan één tier) de eerste tier in plaats van `provider_name` /
+      `model` en stuurt alleen onzekere antwoorden door naar de volgende tier(s); de tellers
+      per tier staan in `report.cascade`. In batch-modus gaat alleen de eerste tier via het
+      batch-endpoint, de doorgestuurde rijen daarna als losse calls
+    - Traint met `local_model=True` per categorie een lokaal model op de bestaande coderingen
+      in het bestand (`LABEL_COLUMNS`, incrementeel over runs heen) en codeert de rijen die
+      het met hoge gekalibreerde kans voorspelt direct; alleen de rest gaat naar het LLM. Een
+      steekproef (`LOCAL_MODEL_AUDIT_RATE`) gaat toch naar het LLM om de overeenstemming te meten
+    - Neemt met `use_mappings` (standaard `config.USE_MAPPINGS`: aan) de codes uit 'Codering
+      definitief' op in de gedeelde `MappingStore` en codeert rijen waarvan (omschrijving,
+      grootboekrekening) daar al een goedgekeurde code heeft direct, vóór het lokale model en
+      het LLM (met bronvermelding)
     - Schrijft 'Codering AI', 'Argumentatie AI', 'Opmerkingen/aannames vanuit Berenschot'
     - Retourneert een BytesIO met het aangepaste workbook
+
+    `output_mode`:
+    - "openpyxl": workbook volledig laden en opnieuw opslaan (standaard);
+    - "patch": workbook alleen streamend lezen (read-only) en uitsluitend de sheet-XML van de
+      Oplegger-tabbladen herschrijven; alle andere onderdelen blijven byte-voor-byte gelijk.
     """
-    wb: Workbook = load_workbook(customer_file)
-    schema = load_codeschema_excel(schema_file)
+    if output_mode not in ("openpyxl", "patch"):
+        raise ValueError(f"Onbekende output_mode: {output_mode}")
+    if execution_mode not in ("interactive", "batch"):
+        raise ValueError(f"Onbekende execution_mode: {execution_mode}")
+    patch_mode = output_mode == "patch"
+    if cascade:
+        provider_name, model = cascade[0].provider, cascade[0].model
+    timings = timings if timings is not None else StageTimings()
+    run_started = time.perf_counter()
+    patches: Optional[Dict[str, SheetPatch]] = None
+    with timings.stage("load"):
+        if patch_mode:
+            source = read_bytes(customer_file)
+            wb: Workbook = load_workbook(BytesIO(source), read_only=True)
+            patches = {}
+        else:
+            wb = load_workbook(customer_file)
+        schema = load_codeschema_cached(schema_file)
+    report = report if report is not None else RunReport()
 
     # Provider (modulair)
     llm: Optional[LLMClient] = None
-    if not dry_run:
+    if llm_client is not None:
+        llm = None if dry_run else llm_client
+    elif not dry_run:
         try:
             llm = _select_provider(provider_name)
         except Exception:
             # Val veilig terug op offline modus als de provider faalt (bijv. geen API-sleutel)
             llm = None
+    provider = llm
 
-    system_prompt = build_system_prompt(language=language)
+    # Model-cascade: een client per tier, met eigen tellers (calls en latency) tussen provider en cache
+    providers: List[LLMClient] = [provider] if provider is not None else []
+    escalation: List[Tuple[CascadeTier, MeteredClient]] = []
+    if llm is not None and cascade and len(cascade) > 1:
+        llm = first_tier = MeteredClient(llm, TierStats(provider_name, model, cascade[0].threshold))
+        for spec in cascade[1:]:
+            client = llm_client if llm_client is not None else _select_provider(spec.provider)
+            if all(client is not p for p in providers):
+                providers.append(client)
+            escalation.append((spec, MeteredClient(client, TierStats(spec.provider, spec.model, spec.threshold))))
 
+    # Checkpoint-journaal (alleen zinvol met LLM: offline is de heuristiek snel genoeg)
+    name = journal_name or getattr(customer_file, "name", None)
+    if name is None and isinstance(customer_file, (str, os.PathLike)):
+        name = os.fspath(customer_file)
+    journal: Optional[CheckpointJournal] = None
+    if llm is not None and resume and name:
+        try:
+            journal = CheckpointJournal(journal_path(CACHE_DIR, str(name)))
+        except JournalBusy:
+            journal = None  # hetzelfde bestand draait al elders: deze run zonder hervatten
+
+    sheet_options: Dict[str, Any] = dict(
+        header_rows=header_rows, provider_name=provider_name, model=model, temperature=temperature,
+        language=language, top_k_codes=top_k_codes, candidate_token_budget=candidate_token_budget,
+        concurrency=concurrency, batch_size=batch_size, deduplicate=deduplicate, local_model=local_model,
+        mappings=_mapping_store() if use_mappings else None, source_name=os.path.basename(str(name or "")),
+        cascade_key=[(t.provider, t.model, t.threshold) for t in cascade] if escalation else None,
+    )
+
+    cached_llm: Optional[CachedLLMClient] = None
+    if llm is not None and execution_mode == "batch":
+        # Eerst alle prompts via het batch-endpoint; daarna beantwoordt de cache elke call
+        cache = _response_cache()
+        try:
+            with timings.stage("batch"):
+                _run_batch(wb, schema, llm, journal, report, progress, cache, sheet_options,
+                           backend=batch_backend or _select_batch_backend(provider_name),
+                           label=str(name or ""), poll_seconds=batch_poll_seconds)
+        except BaseException:
+            if journal is not None:
+                journal.close()
+            raise
+        llm = cached_llm = CachedLLMClient(UnansweredClient(llm), cache)
+    elif llm is not None and use_cache:
+        llm = cached_llm = CachedLLMClient(llm, _response_cache())
+
+    caches: List[CachedLLMClient] = [cached_llm] if cached_llm is not None else []
+    tiers: Optional[List[Tier]] = None
+    if escalation:
+        tiers = [Tier(llm, model, cascade[0].threshold, first_tier.stats)]
+        for spec, client in escalation:
+            stats = client.stats
+            if use_cache:
+                client = CachedLLMClient(client, _response_cache())
+                caches.append(client)
+            tiers.append(Tier(client, spec.model, spec.threshold, stats))
+        report.cascade = [tier.stats for tier in tiers]
+
+    def counters() -> Dict[str, float]:
+        """Cumulatieve tellers en fase-tijden, voor de uitsplitsing per tabblad."""
+        values: Dict[str, float] = {key: getattr(report, key) for key in _SHEET_COUNTERS}
+        values["cache_hits"] = sum(c.hits for c in caches)
+        values["cache_misses"] = sum(c.misses for c in caches)
+        for key in ("prompt_tokens", "completion_tokens"):
+            values[key] = sum(getattr(p, key, 0) for p in providers)
+        values["retries"] = report.retries + sum(getattr(p, "retries", 0) for p in providers)
+        measured = timings.as_dict()
+        values["prompt_bytes"] = measured["counts"].get("prompt_bytes", 0)
+        values.update({f"{stage}_s": seconds for stage, seconds in measured["seconds"].items()})
+        return values
+
+    try:
+        _process_sheets(
+            wb, schema, llm, journal, report, progress, timings, counters,
+            patches=patches, sample_rows=sample_rows, estimate=estimate, tiers=tiers, **sheet_options,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        for cached in caches:
+            report.add("cache_hits", cached.hits)
+            report.add("cache_misses", cached.misses)
+        # Tokenverbruik volgens de provider(s) (alleen werkelijke API-calls, geen cache-hits)
+        for p in providers:
+            report.add("prompt_tokens", getattr(p, "prompt_tokens", 0))
+            report.add("completion_tokens", getattr(p, "completion_tokens", 0))
+            report.add("retries", getattr(p, "retries", 0))
+        if patch_mode:
+            wb.close()
+
+    # Schrijf terug naar bytes
+    with timings.stage("save"):
+        if patch_mode:
+            out = patch_workbook(source, patches)
+        else:
+            out = BytesIO()
+            wb.save(out)
+            out.seek(0)
+    timings.add("total", time.perf_counter() - run_started)
+    return out
+
+
+def _select_batch_backend(name: str) -> BatchBackend:
+    """Batch-endpoint van de provider (zie `_select_provider`)."""
+    return create_batch_backend(name)
+
+
+def _run_batch(
+    wb: Workbook,
+    schema: Dict[str, List[CodeRule]],
+    provider: LLMClient,
+    journal: Optional[CheckpointJournal],
+    report: RunReport,
+    progress: Optional[RunProgress],
+    cache: ResponseCache,
+    sheet_options: Dict[str, Any],
+    *,
+    backend: BatchBackend,
+    label: str,
+    poll_seconds: float,
+) -> None:
+    """
+    Batch-modus: verzamel de prompts van alle tabbladen (zoals een gewone run ze zou sturen,
+    zonder rijen die het journaal al heeft), dien de nog niet gecachete prompts in één batch
+    in en zet de antwoorden in de cache. De `custom_id` is de cache-sleutel van de prompt,
+    zodat gelijke prompts één verzoek zijn en de gewone run de antwoorden per rij terugvindt.
+    """
+    prompts: List[Prompt] = []
+    _process_sheets(wb, schema, provider, journal, RunReport(), None, StageTimings(), lambda: {},
+                    patches={}, plan=prompts, **sheet_options)
+    model, temperature = sheet_options["model"], sheet_options["temperature"]
+    requests: Dict[str, Dict[str, Any]] = {}
+    for system_prompt, user_prompt, schema_ in prompts:
+        key = cache_key(provider=provider.name, model=model, temperature=temperature, system_prompt=system_prompt,
+                        user_prompt=user_prompt, response_schema=schema_)
+        if key not in requests and not cache.has(key):
+            requests[key] = chat_request(key, model=model, temperature=temperature, system_prompt=system_prompt,
+                                         user_prompt=user_prompt, response_schema=schema_)
+    if progress is not None:
+        progress.set_status(f"Batch: {len(requests)} verzoeken indienen ({len(prompts) - len(requests)} al in de cache)")
+    answers, usage = run_batch(
+        list(requests.values()), backend, workdir=os.path.join(CACHE_DIR, "batches"), label=label,
+        poll_seconds=poll_seconds,
+        should_stop=(lambda: progress.cancelled) if progress is not None else None,
+        on_status=progress.set_status if progress is not None else None,
+    )
+    for key, content in answers.items():
+        cache.put(key, content)
+    report.add("batch_requests", len(requests))
+    report.add("batch_failed", len(requests) - len(answers))
+    report.add("prompt_tokens", usage["prompt_tokens"])
+    report.add("completion_tokens", usage["completion_tokens"])
+    if progress is not None:
+        progress.set_status(None)
+
+
+# Tellers uit `RunReport` die per tabblad worden uitgesplitst
+_SHEET_COUNTERS = ("rows", "unique_rows", "resumed_rows", "skipped_rows", "llm_calls", "fallbacks", "batch_retries",
+                   "valid_first_try", "repaired_answers", "invalid_answers", "repair_calls", "local_rows",
+                   "mapping_rows")
+
+
+def _process_sheets(
+    wb: Workbook,
+    schema: Dict[str, List[CodeRule]],
+    llm: Optional[LLMClient],
+    journal: Optional[CheckpointJournal],
+    report: RunReport,
+    progress: Optional[RunProgress],
+    timings: StageTimings,
+    counters: Callable[[], Dict[str, float]],
+    *,
+    header_rows: Dict[str, int],
+    patches: Optional[Dict[str, SheetPatch]],
+    provider_name: str,
+    model: str,
+    temperature: float,
+    language: str,
+    top_k_codes: int,
+    candidate_token_budget: int,
+    concurrency: int,
+    batch_size: int,
+    deduplicate: bool,
+    sample_rows: int = 0,
+    estimate: Optional[RunEstimate] = None,
+    plan: Optional[List[Prompt]] = None,
+    tiers: Optional[List[Tier]] = None,
+    local_model: bool = False,
+    mappings: Optional[MappingStore] = None,
+    source_name: str = "",
+    cascade_key: Optional[List[Tuple[str, str, float]]] = None,
+) -> None:
+    """Classificeer alle Oplegger-tabbladen van `wb` (zie `process_workbook`)."""
+    patch_mode = patches is not None
     # Voor snelle lookup van target-kolomtitels (om ze uit de context te filteren)
     target_titles_lc = {v.strip().lower() for v in TARGET_COLUMNS.values()}
 
+    # Eerste schatting van de omvang (uit de dimensie van elk blad) voor voortgang en ETA
+    if progress is not None:
+        for ws in wb.worksheets:
+            key = _match_sheet(ws.title)
+            if key and schema.get(SHEET_CODEMAP[key]):
+                header_row = header_rows.get(ws.title.strip().lower(), header_rows.get(key, 1))
+                progress.estimate_sheet(ws.title, (ws.max_row or 0) - header_row)
+
     for ws in wb.worksheets:
+        if progress is not None:
+            progress.check_cancelled()
+        started = time.perf_counter()
         name_l = ws.title.strip().lower()
-        match_key: Optional[str] = None
-        for key in SHEET_CODEMAP:
-            if key in name_l:
-                match_key = key
-                break
+        match_key = _match_sheet(ws.title)
         if not match_key:
             continue  # Irrelevant tabblad
 
@@ -85,12 +698,23 @@ def process_workbook(
             # Geen regels beschikbaar voor deze categorie -> sla over
             continue
 
+        before = counters()
+
         # Header-rij bepalen (met fallback op 1)
         header_row = header_rows.get(name_l, header_rows.get(match_key, 1))
 
         # Header inlezen en target-kolommen garanderen
         header_map = read_header(ws, header_row)
-        target_indices = ensure_target_columns(ws, header_row)
+        if patch_mode:
+            max_col = ws.max_column or max((len(v) for v in ws.iter_rows(values_only=True)), default=0)
+            target_indices, new_headers = plan_target_columns(header_map, max_col)
+            patch = patches[ws.title] = SheetPatch()
+            for col_idx, title in new_headers.items():
+                patch.set(header_row, col_idx, title)
+        else:
+            target_indices, new_headers = plan_target_columns(header_map, ws.max_column)
+            for col_idx, title in new_headers.items():
+                ws.cell(row=header_row, column=col_idx, value=title)
 
         # Contextkolommen = alle headers behalve de 3 doelkolommen
         context_cols: Dict[str, int] = {
@@ -99,34 +723,208 @@ def process_workbook(
             if col_name.strip().lower() not in target_titles_lc
         }
 
-        for r in iter_data_rows(ws, header_row):
-            # Bouw context uit de rij
-            context: Dict[str, Any] = {
-                k: ws.cell(row=r, column=idx).value for k, idx in context_cols.items()
-            }
+        # Verzamel eerst alle rijen van het tabblad (één leesronde over het blad)
+        rows: List[Row] = []
+        fingerprints: Dict[int, str] = {}
+        resumed: List[Tuple[int, ClassificationResult]] = []
+        n_skipped = 0
+        labelled: List[Dict[str, Any]] = []  # rijen met mogelijk een bestaande codering (ook overgeslagen rijen)
+        version = json.dumps([provider_name, model, temperature, language, category, schema_fingerprint(rules),
+                              top_k_codes, candidate_token_budget] + ([cascade_key] if cascade_key else []))
+        # Kolomsgewijs inlezen; de contextblokken voor de prompts worden per blad in één keer gemaakt
+        frame = read_sheet_frame(ws, header_row, context_cols, target_indices if journal else None)
+        blocks = dict(zip(frame.row_idx, render_context_blocks(frame.context)))
+        for rec in frame.records():
+            if local_model or mappings is not None:
+                labelled.append(rec.context)
+            if journal is not None:
+                fp = fingerprints[rec.row_idx] = row_fingerprint(rec.context, version)
+                entry = journal.lookup(ws.title, rec.row_idx, fp)
+                if entry is not None:
+                    report.add("rows")
+                    if rec.targets and rec.targets.get("codering_ai") not in (None, ""):
+                        # Ongewijzigd en al ingevuld: niets te doen
+                        report.add("skipped_rows")
+                        n_skipped += 1
+                    else:
+                        # Eerder (bijv. in een afgebroken run) geclassificeerd: antwoord hergebruiken
+                        report.add("resumed_rows")
+                        resumed.append((rec.row_idx, ClassificationResult(
+                            code=entry[1], argumentatie=entry[2], vraag=entry[3], confidence=1.0)))
+                    continue
+            rows.append((rec.row_idx, rec.context, None))
 
-            # Kandidaten shortlist via fuzzy matching
-            text_for_rank = build_row_text(context)
-            candidates = rank_candidates(text_for_rank, rules, top_k=top_k_codes) if rules else []
+        # Ontdubbelen: één representant per groep gelijkwaardige rijen
+        if deduplicate:
+            key_cols = resolve_key_columns(list(context_cols), DEDUP_KEY_COLUMNS.get(category, []))
+            groups = group_rows([row[1] for row in rows], key_cols)
+        else:
+            groups = [[i] for i in range(len(rows))]
+        representatives = [rows[g[0]] for g in groups]
 
-            # Kies code via LLM of via eenvoudige fallback
-            if llm is None:
-                result = simple_rules_fallback(context, candidates if candidates else rules)
-            else:
-                user_prompt = build_user_prompt(context, candidates if candidates else rules, category=category)
-                try:
-                    result = pick_code_with_llm(
-                        llm,
-                        model=model,
-                        system_prompt=system_prompt,
-                        user_prompt=user_prompt,
-                        temperature=temperature,
-                    )
-                except Exception:
-                    # Robuust: bij fout terugvallen op heuristiek
-                    result = simple_rules_fallback(context, candidates if candidates else rules)
-
-            # Schrijf resultaat in de juiste kolommen
+        # Groepen met een antwoord zonder LLM (mapping-store of lokaal model)
+        direct: List[Tuple[List[int], ClassificationResult]] = []
+
+        # Goedgekeurde coderingen: eerst de 'Codering definitief' van dit blad opnemen, dan opzoeken.
+        # Een raming (preview) leest de gedeelde stores alleen; opnemen en leren doet pas de echte run.
+        if mappings is not None:
+            if estimate is None:
+                report.add("mapping_learned", mappings.learn(category, labelled, rules, source=f"'{source_name}' ({ws.title})"))
+            hits = mappings.lookup(category, [row[1] for row in representatives], rules)
+            direct.extend((groups[i], hit) for i, hit in enumerate(hits) if hit is not None)
+            report.add("mapping_rows", sum(len(g) for g, _ in direct))
+            keep = [i for i, hit in enumerate(hits) if hit is None]
+            groups = [groups[i] for i in keep]
+            representatives = [representatives[i] for i in keep]
+
+        # Lokaal model: leer van de bestaande coderingen en codeer zekere rijen direct; een
+        # steekproef daarvan gaat ter controle toch naar het LLM (overeenstemming)
+        n_mapped = len(direct)
+        local_audits: Dict[int, Optional[str]] = {}  # rij-index representant -> code van het lokale model
+        if local_model:
+            model_ = LocalModel.for_category(category)
+            if estimate is None:
+                model_.learn(labelled, rules)
+            predictions = model_.predict([row[1] for row in representatives], rules)
+            audit_every = round(1 / LOCAL_MODEL_AUDIT_RATE) if llm is not None and LOCAL_MODEL_AUDIT_RATE > 0 else 0
+            keep = []
+            n_sure = 0
+            for i, prediction in enumerate(predictions):
+                if prediction is not None:
+                    n_sure += 1
+                    if not (audit_every and n_sure % audit_every == 0):
+                        direct.append((groups[i], prediction))
+                        continue
+                    local_audits[representatives[i][0]] = prediction.code
+                keep.append(i)
+            groups = [groups[i] for i in keep]
+            representatives = [representatives[i] for i in keep]
+        n_local = sum(len(g) for g, _ in direct[n_mapped:])
+        n_direct = sum(len(g) for g, _ in direct)
+
+        # Preview: alleen een gelijkmatig over het blad verspreide steekproef van de unieke rijen
+        sampled = list(range(len(groups)))
+        if 0 < sample_rows < len(groups):
+            sampled = [i * len(groups) // sample_rows for i in range(sample_rows)]
+        n_sampled = sum(len(groups[i]) for i in sampled)
+
+        if progress is not None:
+            progress.start_sheet(ws.title, n_sampled + n_direct + len(resumed) + n_skipped, header_row=header_row,
+                                 target_indices=target_indices, new_headers=new_headers)
+            progress.rows_skipped(ws.title, n_skipped)
+            progress.rows_done(ws.title, [(r, _outcome(None, result)) for r, result in resumed], timed=False)
+
+        # Kandidaten-shortlist per representant (alleen met top_k of token-budget);
+        # een deel wordt ter controle met het volledige schema geclassificeerd (recall-meting)
+        audits: Dict[int, set] = {}
+        if (llm is not None or estimate is not None) and (top_k_codes > 0 or candidate_token_budget > 0):
+            audit_every = round(1 / SHORTLIST_AUDIT_RATE) if SHORTLIST_AUDIT_RATE > 0 else 0
+            n_short = 0
+            for i, (r, context, _) in enumerate(representatives):
+                candidates = rank_candidates(
+                    build_row_text(context), rules, top_k=top_k_codes, token_budget=candidate_token_budget
+                )
+                if len(candidates) >= len(rules):
+                    continue
+                if audit_every and n_short % audit_every == 0:
+                    audits[i] = {c.code for c in candidates}
+                else:
+                    representatives[i] = (r, context, candidates)
+                n_short += 1
+
+        # Raming voor de volledige run: alle unieke rijen, met de prompts zoals ze verstuurd worden
+        if estimate is not None:
+            prompts = _plan_prompts(representatives, rules, category=category, language=language,
+                                    batch_size=batch_size, structured=False, blocks=blocks)
+            estimate.add_sheet(ws.title, rows=len(rows), unique_rows=len(groups), calls=len(prompts),
+                               input_tokens=_estimate_prompts(prompts, model))
+
+        # Batch-modus, eerste ronde: alleen de prompts verzamelen (niets classificeren of schrijven)
+        if plan is not None:
+            plan.extend(_plan_prompts(representatives, rules, category=category, language=language, batch_size=batch_size,
+                                      structured=getattr(llm, "supports_response_schema", False), blocks=blocks))
+            continue
+
+        if len(sampled) < len(groups):
+            audits = {j: audits[i] for j, i in enumerate(sampled) if i in audits}
+            groups = [groups[i] for i in sampled]
+            representatives = [representatives[i] for i in sampled]
+
+        # Elk modelantwoord direct journaliseren voor alle rijen in de groep
+        members = {rows[g[0]][0]: [rows[i][0] for i in g] for g in groups}
+
+        def record_result(row: Row, result: ClassificationResult, sheet: str = ws.title,
+                          members: Dict[int, List[int]] = members, fingerprints: Dict[int, str] = fingerprints) -> None:
+            for r in members[row[0]]:
+                journal.record(sheet, r, fingerprints[r], result.code, result.argumentatie, result.vraag)
+
+        contexts = {row[0]: row[1] for row in rows}
+
+        def publish(row: Row, result: ClassificationResult, sheet: str = ws.title,
+                    members: Dict[int, List[int]] = members, contexts: Dict[int, Dict[str, Any]] = contexts) -> None:
+            progress.rows_done(sheet, [(r, _outcome(contexts[r], result)) for r in members[row[0]]])
+
+        # Direct gecodeerde rijen: journaliseren en publiceren zoals een modelantwoord
+        for group, result in direct:
+            if journal is not None:
+                for i in group:
+                    journal.record(ws.title, rows[i][0], fingerprints[rows[i][0]], result.code, result.argumentatie, result.vraag)
+            if progress is not None:
+                progress.rows_done(ws.title, [(rows[i][0], _outcome(rows[i][1], result)) for i in group], timed=False)
+
+        timings.add("context", time.perf_counter() - started)
+
+        # Kies code via LLM (per rij of in batches) of via eenvoudige fallback
+        started = time.perf_counter()
+        classify_options: Dict[str, Any] = dict(
+            category=category,
+            temperature=temperature,
+            language=language,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            report=report,
+            on_result=record_result if journal is not None else None,
+            on_progress=publish if progress is not None else None,
+            should_stop=(lambda: progress.cancelled) if progress is not None else None,
+            timings=timings,
+            blocks=blocks,
+        )
+        if tiers:
+            rep_results = _classify_cascade(tiers, representatives, rules, **classify_options)
+        else:
+            rep_results = _classify_rows(llm, representatives, rules, model=model, **classify_options)
+        timings.add("classify", time.perf_counter() - started)
+
+        for i, codes in audits.items():
+            if rep_results[i].code is not None:
+                report.add("shortlist_audited")
+                report.add("shortlist_audit_hits", int(rep_results[i].code in codes))
+
+        for row, result in zip(representatives, rep_results):
+            if row[0] in local_audits and result.code is not None:
+                report.add("local_audited")
+                report.add("local_audit_agreed", int(result.code == local_audits[row[0]]))
+
+        # Resultaat van de representant geldt voor alle rijen in de groep
+        results: List[Optional[ClassificationResult]] = [None] * len(rows)
+        for group, result in list(zip(groups, rep_results)) + direct:
+            for i in group:
+                results[i] = result
+
+        report.add("rows", n_sampled + n_direct)
+        report.add("unique_rows", len(groups) + len(direct))
+        report.add("local_rows", n_local)
+
+        # Schrijf resultaten in rijvolgorde in de juiste kolommen
+        started = time.perf_counter()
+        written = [(row[0], result) for row, result in zip(rows, results) if result is not None] + resumed
+        written.sort(key=lambda item: item[0])
+        for r, result in written:
+            if patch_mode:
+                patch.set(r, target_indices["codering_ai"], result.code)
+                patch.set(r, target_indices["argumentatie_ai"], result.argumentatie)
+                patch.set(r, target_indices["opmerkingen"], result.vraag)
+                continue
             write_results(
                 ws,
                 row_idx=r,
@@ -135,9 +933,14 @@ def process_workbook(
                 argument=result.argumentatie,
                 note=result.vraag,
             )
+        timings.add("write", time.perf_counter() - started)
 
-    # Schrijf terug naar bytes
-    out = BytesIO()
-    wb.save(out)
-    out.seek(0)
-    return out
+        after = counters()
+        timings.add_sheet({"sheet": ws.title, "category": category,
+                           **{key: round(value - before.get(key, 0), 4) for key, value in after.items()}})
+
+
+def _outcome(context: Optional[Dict[str, Any]], result: ClassificationResult) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+    """Tussenresultaat van één rij voor `RunProgress` (rijtekst ingekort voor de weergave)."""
+    text = build_row_text(context)[:200] if context else ""
+    return text, result.code, result.argumentatie, result.vraag
@@ -0,0 +1,246 @@
+"""
+Gerichte xlsx-writer: past alleen de sheet-XML van de Oplegger-tabbladen aan en kopieert
+alle andere onderdelen van het pakket ongewijzigd. Zo blijven onderdelen die openpyxl niet
+modelleert (pivot-caches, slicers, macro's, ...) behouden en is het geheugengebruik begrensd
+door het grootste gepatchte tabblad in plaats van het hele workbook.
+"""
+from __future__ import annotations
+
+import posixpath
+import re
+import shutil
+import zipfile
+from dataclasses import dataclass, field
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import IO, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+_SPOOL_MAX = 16 * 1024 * 1024
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_CELL_REF_RE = re.compile(r"^([A-Z]+)(\d+)$")
+_ATTR_R_RE = re.compile(r'\br="([^"]*)"')
+
+
+@dataclass
+class SheetPatch:
+    """Te schrijven celwaarden voor één tabblad: rij -> (kolom -> tekst), beide 1-based."""
+    cells: Dict[int, Dict[int, str]] = field(default_factory=dict)
+
+    def set(self, row: int, column: int, value: Optional[str]) -> None:
+        if value is not None:
+            self.cells.setdefault(row, {})[column] = str(value)
+
+
+def _sheet_parts(zin: zipfile.ZipFile) -> Dict[str, str]:
+    """Map tabbladnaam -> pad van het sheet-XML-onderdeel in het pakket."""
+    workbook_xml = zin.read("xl/workbook.xml").decode("utf-8")
+    rels_xml = zin.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+    targets: Dict[str, str] = {}
+    for rel in re.finditer(r"<(?:\w+:)?Relationship\b[^>]*>", rels_xml):
+        tag = rel.group(0)
+        rid = re.search(r'\bId="([^"]+)"', tag)
+        target = re.search(r'\bTarget="([^"]+)"', tag)
+        if rid and target:
+            t = target.group(1)
+            path = t.lstrip("/") if t.startswith("/") else posixpath.normpath(posixpath.join("xl", t))
+            targets[rid.group(1)] = path
+
+    parts: Dict[str, str] = {}
+    for sheet in re.finditer(r"<(?:\w+:)?sheet\b[^>]*>", workbook_xml):
+        tag = sheet.group(0)
+        name = re.search(r'\bname="([^"]*)"', tag)
+        rid = re.search(r'\b\w+:id="([^"]+)"', tag)
+        if name and rid and rid.group(1) in targets:
+            parts[_unescape(name.group(1))] = targets[rid.group(1)]
+    return parts
+
+
+def _unescape(text: str) -> str:
+    return (text.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+            .replace("&apos;", "'").replace("&amp;", "&"))
+
+
+def _inline_cell(prefix: str, ref: str, value: str, style: Optional[str]) -> str:
+    text = escape(_ILLEGAL_XML_RE.sub("", value))
+    s_attr = f' s="{style}"' if style else ""
+    return (f'<{prefix}c r="{ref}"{s_attr} t="inlineStr"><{prefix}is>'
+            f'<{prefix}t xml:space="preserve">{text}</{prefix}t></{prefix}is></{prefix}c>')
+
+
+def _patch_row(prefix: str, row_xml: str, row_idx: int, updates: Dict[int, str],
+               cell_re: "re.Pattern[str]") -> Tuple[str, bool]:
+    """
+    Voeg cellen in / vervang cellen in één <row>. Retourneert (nieuwe XML, formule-overschreven).
+    """
+    open_end = row_xml.index(">") + 1
+    open_tag = row_xml[:open_end]
+    if open_tag.endswith("/>"):
+        open_tag, body = open_tag[:-2].rstrip() + ">", ""
+    else:
+        body = row_xml[open_end:row_xml.rindex("<")]
+    # 'spans' is een optimalisatiehint; na toevoegen van cellen klopt die niet meer
+    open_tag = re.sub(r'\sspans="[^"]*"', "", open_tag)
+
+    cells: List[Tuple[int, str]] = []
+    col = 0
+    for m in cell_re.finditer(body):
+        r_attr = _ATTR_R_RE.search(m.group(0)[: m.group(0).index(">")])
+        ref = _CELL_REF_RE.match(r_attr.group(1)) if r_attr else None
+        col = column_index_from_string(ref.group(1)) if ref else col + 1
+        cells.append((col, m.group(0)))
+
+    formula_replaced = False
+    existing = {c: xml for c, xml in cells}
+    out: List[Tuple[int, str]] = [(c, xml) for c, xml in cells if c not in updates]
+    for c, value in updates.items():
+        old = existing.get(c)
+        style = None
+        if old is not None:
+            head = old[: old.index(">")]
+            s_attr = re.search(r'\bs="([^"]*)"', head)
+            style = s_attr.group(1) if s_attr else None
+            formula_replaced = formula_replaced or f"<{prefix}f" in old
+        out.append((c, _inline_cell(prefix, f"{get_column_letter(c)}{row_idx}", value, style)))
+    out.sort(key=lambda item: item[0])
+    return f"{open_tag}{''.join(xml for _, xml in out)}</{prefix}row>", formula_replaced
+
+
+def _patch_sheet_xml(xml: str, patch: SheetPatch, out: IO[bytes]) -> bool:
+    """
+    Schrijf de aangepaste sheet-XML naar `out`. Alleen rijen met updates worden ontleed;
+    de rest wordt ongewijzigd doorgeschreven. Retourneert True als er een formule is overschreven.
+    """
+    root = re.search(r"<(?:(\w+):)?worksheet\b", xml)
+    prefix = f"{root.group(1)}:" if root and root.group(1) else ""
+    p = re.escape(prefix)
+    row_re = re.compile(rf"<{p}row\b[^>]*?(?:/>|>.*?</{p}row>)", re.DOTALL)
+    cell_re = re.compile(rf"<{p}c\b[^>]*?(?:/>|>.*?</{p}c>)", re.DOTALL)
+
+    # Dimensie bijwerken met de nieuwe kolommen/rijen
+    max_row = max(patch.cells, default=0)
+    max_col = max((c for cols in patch.cells.values() for c in cols), default=0)
+
+    def fix_dimension(m: "re.Match[str]") -> str:
+        ref = m.group(1)
+        start, _, end = ref.partition(":")
+        end_m = _CELL_REF_RE.match(end or start)
+        if not end_m:
+            return m.group(0)
+        end_col = max(column_index_from_string(end_m.group(1)), max_col)
+        end_row = max(int(end_m.group(2)), max_row)
+        return m.group(0).replace(ref, f"{start}:{get_column_letter(end_col)}{end_row}")
+
+    xml = re.sub(rf'<{p}dimension\b[^>]*\bref="([^"]*)"', fix_dimension, xml, count=1)
+
+    def new_row(r: int) -> str:
+        cells = "".join(
+            _inline_cell(prefix, f"{get_column_letter(c)}{r}", v, None) for c, v in sorted(patch.cells[r].items())
+        )
+        return f'<{prefix}row r="{r}">{cells}</{prefix}row>'
+
+    sd_open = re.search(rf"<{p}sheetData\b[^>]*?(/?)>", xml)
+    if sd_open is None:
+        out.write(xml.encode("utf-8"))
+        return False
+    if sd_open.group(1):  # <sheetData/>
+        body = "".join(new_row(r) for r in sorted(patch.cells))
+        out.write(xml[: sd_open.start()].encode("utf-8"))
+        out.write(f"<{prefix}sheetData>{body}</{prefix}sheetData>".encode("utf-8"))
+        out.write(xml[sd_open.end():].encode("utf-8"))
+        return False
+
+    sd_close = xml.index(f"</{prefix}sheetData>", sd_open.end())
+    out.write(xml[: sd_open.end()].encode("utf-8"))
+
+    pending = sorted(patch.cells)
+    pi = 0
+    formula_replaced = False
+    pos = sd_open.end()
+    row_idx = 0
+    for m in row_re.finditer(xml, sd_open.end(), sd_close):
+        r_attr = _ATTR_R_RE.search(m.group(0)[: m.group(0).index(">")])
+        row_idx = int(r_attr.group(1)) if r_attr else row_idx + 1
+        out.write(xml[pos: m.start()].encode("utf-8"))
+        # Nieuwe rijen die vóór deze rij horen
+        while pi < len(pending) and pending[pi] < row_idx:
+            out.write(new_row(pending[pi]).encode("utf-8"))
+            pi += 1
+        if pi < len(pending) and pending[pi] == row_idx:
+            row_xml, replaced = _patch_row(prefix, m.group(0), row_idx, patch.cells[row_idx], cell_re)
+            formula_replaced = formula_replaced or replaced
+            out.write(row_xml.encode("utf-8"))
+            pi += 1
+        else:
+            out.write(m.group(0).encode("utf-8"))
+        pos = m.end()
+    out.write(xml[pos:sd_close].encode("utf-8"))
+    while pi < len(pending):
+        out.write(new_row(pending[pi]).encode("utf-8"))
+        pi += 1
+    out.write(xml[sd_close:].encode("utf-8"))
+    return formula_replaced
+
+
+def _drop_calc_chain(name: str, data: bytes) -> bytes:
+    """Verwijder verwijzingen naar xl/calcChain.xml (Excel bouwt die zelf opnieuw op)."""
+    text = data.decode("utf-8")
+    if name == "[Content_Types].xml":
+        text = re.sub(r'<(?:\w+:)?Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', "", text)
+    else:
+        text = re.sub(r'<(?:\w+:)?Relationship\b[^>]*Target="[^"]*calcChain\.xml"[^>]*/>', "", text)
+    return text.encode("utf-8")
+
+
+def _clone_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    """Nieuwe ZipInfo met dezelfde metadata (de bron-ZipInfo blijft onaangeroerd)."""
+    clone = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    clone.compress_type = info.compress_type
+    clone.external_attr = info.external_attr
+    clone.create_system = info.create_system
+    clone.comment = info.comment
+    return clone
+
+
+def patch_workbook(source, patches: Dict[str, SheetPatch]) -> BytesIO:
+    """
+    Retourneert een kopie van het xlsx-pakket `source` (pad, bytes of file-object) waarin
+    alleen de opgegeven tabbladen (naam -> `SheetPatch`) zijn aangepast.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    out = BytesIO()
+    with zipfile.ZipFile(source) as zin:
+        parts = _sheet_parts(zin)
+        by_part = {parts[name]: patch for name, patch in patches.items() if name in parts and patch.cells}
+
+        # Eerst de gepatchte tabbladen (één tegelijk in het geheugen, resultaat gespooled)
+        patched: Dict[str, IO[bytes]] = {}
+        formula_replaced = False
+        for part, patch in by_part.items():
+            spool = SpooledTemporaryFile(max_size=_SPOOL_MAX)
+            formula_replaced = _patch_sheet_xml(zin.read(part).decode("utf-8"), patch, spool) or formula_replaced
+            spool.seek(0)
+            patched[part] = spool
+
+        drop_calc_chain = formula_replaced and "xl/calcChain.xml" in zin.namelist()
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                if drop_calc_chain and info.filename == "xl/calcChain.xml":
+                    continue
+                target = _clone_info(info)
+                if info.filename in patched:
+                    with zout.open(target, "w", force_zip64=True) as dst:
+                        shutil.copyfileobj(patched[info.filename], dst)
+                    patched[info.filename].close()
+                elif drop_calc_chain and info.filename in ("[Content_Types].xml", "xl/_rels/workbook.xml.rels"):
+                    zout.writestr(target, _drop_calc_chain(info.filename, zin.read(info)))
+                else:
+                    # Ongewijzigd kopiëren (gestreamd, inhoud byte-voor-byte gelijk)
+                    with zin.open(info) as src, zout.open(target, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                        shutil.copyfileobj(src, dst)
+    out.seek(0)
+    return out